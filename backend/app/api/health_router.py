@@ -0,0 +1,86 @@
+# app/api/health_router.py
+
+import asyncio
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.admission import admission
+from app.core.config import settings
+from app.core.db import DB, AsyncDB
+from app.core.db_executor import db_executor
+from app.core.warmup import warmup
+from app.modules.calidad.calidad_router import service as calidad_service
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+# El ping no pasa por el control de admisión: mide la BD, no la cola
+db = AsyncDB(admission=None)
+
+
+# ============================================================
+# Liveness: el proceso y el event loop responden. No toca la BD, así
+# una caída de SQL Server no provoca reinicios en cadena.
+# ============================================================
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+# ============================================================
+# Readiness: la instancia puede recibir tráfico. Requiere que el
+# calentamiento haya terminado y que un SELECT 1 por el pool y el
+# executor ODBC (el mismo camino que una petición) vuelva dentro de
+# HEALTH_DB_TIMEOUT. Responde 503 en caso contrario.
+# ============================================================
+@router.get("/ready")
+async def ready():
+    db_status = await _ping()
+    pool = DB.pool_stats()
+    executor = db_executor.stats()
+
+    is_ready = warmup.done and db_status["ok"]
+    body = {
+        "status": "ready" if is_ready else "not_ready",
+        "warmup": warmup.status(),
+        "db": db_status,
+        "pool": {
+            "size": pool["size"],
+            "idle": pool["idle"],
+            "in_use": pool["in_use"],
+            "max_size": pool["max_size"],
+            "utilization": round(pool["in_use"] / pool["max_size"], 3),
+        },
+        "read_replica": DB.read_status(),
+        "admission": admission.stats(),
+        "executor": {
+            "queued": executor["queued"],
+            "active": executor["active"],
+            "max_workers": executor["max_workers"],
+        },
+        "board_cache": calidad_service.service.board_cache.stats(),
+    }
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
+
+async def _ping() -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            db.select("SELECT 1", name="health.ping"), settings.HEALTH_DB_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return {
+            "ok": False,
+            "round_trip_ms": None,
+            "error": f"Sin respuesta en {settings.HEALTH_DB_TIMEOUT}s",
+        }
+    except Exception as e:
+        return {"ok": False, "round_trip_ms": None, "error": repr(e)}
+
+    return {
+        "ok": True,
+        "round_trip_ms": round((time.perf_counter() - start) * 1000, 2),
+        "error": None,
+    }
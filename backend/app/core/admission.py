@@ -0,0 +1,258 @@
+# app/core/admission.py
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.metrics import registry
+from app.errors.errors import ServiceUnavailableError
+
+# ============================================================
+# Control de admisión hacia la base de datos
+#
+# Limita cuántas operaciones de BD corren a la vez en el executor ODBC
+# (`limit`) y dónde esperan las demás: una cola acotada por carril en el
+# event loop, antes de ocupar un hilo. Tres carriles de peticiones:
+#
+# - "write" (iniciar, finalizar, comentarios, lotes): tiene `write_reserved`
+#   cupos que las lecturas no pueden usar y, al liberarse un cupo, pasa
+#   antes que cualquier lectura en espera.
+# - "read": todo lo demás que consulta la BD.
+# - "stream" (exportación): ocupa su cupo hasta terminar de enviar la
+#   respuesta, así que tiene su propio tope (`stream_limit`) dentro de
+#   los cupos de lectura y es el último en recibir un cupo libre.
+#
+# Si la cola del carril está llena, o el cupo no llega dentro de
+# `max_wait` (o del plazo de la petición), se responde 503 con
+# Retry-After de inmediato en lugar de acumular peticiones hasta que el
+# cliente se rinda. Un solo controlador por proceso (un event loop).
+#
+# El trabajo de BD sin petición (refresco del snapshot, captura de
+# planes, calentamiento) corre en hilos del executor y usa un carril de
+# fondo aparte: un semáforo de `background_limit` cupos (`background()`).
+# En total hay como máximo `limit + background_limit` operaciones de BD.
+# ============================================================
+READ = "read"
+WRITE = "write"
+STREAM = "stream"
+BACKGROUND = "background"
+
+# Carril admitido en el contexto actual (lo copian los hilos del executor)
+_held: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "db_admission_lane", default=None
+)
+
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "db_admission_wait_seconds", "Espera por un cupo de BD", ("lane",)
+)
+ADMISSION_REJECTED = registry.counter(
+    "db_admission_rejected_total",
+    "Operaciones rechazadas con 503 (queue_full / timeout)",
+    ("lane", "reason"),
+)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limit: int,
+        read_queue: int,
+        write_queue: int,
+        write_reserved: int = 0,
+        max_wait: float = 5.0,
+        stream_limit: int = 1,
+        stream_queue: int = 0,
+        background_limit: int = 1,
+    ):
+        self.limit = limit
+        self.write_reserved = min(max(write_reserved, 0), max(limit - 1, 0))
+        self.max_wait = max_wait
+        self.stream_limit = min(max(stream_limit, 1), max(limit - self.write_reserved, 1))
+        self._queue_size = {READ: read_queue, WRITE: write_queue, STREAM: stream_queue}
+        self._waiters: Dict[str, deque] = {lane: deque() for lane in self._queue_size}
+        self._active = {READ: 0, WRITE: 0, STREAM: 0}
+        # Duración media de una operación admitida (EWMA), para Retry-After
+        self._hold_avg = 0.05
+
+        self.background_limit = max(background_limit, 1)
+        self._background = threading.BoundedSemaphore(self.background_limit)
+        self._background_lock = threading.Lock()
+        self._background_active = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    # ----------------------------------------
+    # API
+    # ----------------------------------------
+    @asynccontextmanager
+    async def slot(self, lane: str):
+        """Ocupa un cupo del carril `lane` mientras dura el bloque."""
+        await self.acquire(lane)
+        started = time.monotonic()
+        token = _held.set(lane)
+        try:
+            yield
+        finally:
+            _held.reset(token)
+            if lane != STREAM:
+                held = time.monotonic() - started
+                self._hold_avg += 0.1 * (held - self._hold_avg)
+            self.release(lane)
+
+    @contextmanager
+    def background(self, detached: bool = False):
+        """
+        Cupo del carril de fondo para trabajo de BD en un hilo del executor.
+        Si el contexto ya tiene un cupo (la petición que lo llama, o un
+        bloque `background` externo) no toma otro. `detached=True` es para
+        trabajo que sobrevive a la petición que lo disparó: el cupo de esa
+        petición no cuenta. Espera a lo sumo lo que queda del plazo.
+        """
+        held = _held.get()
+        if not self.enabled or held == BACKGROUND or (held and not detached):
+            yield
+            return
+
+        wait = deadline.remaining()
+        if not self._background.acquire(timeout=None if wait is None else max(wait, 0)):
+            ADMISSION_REJECTED.inc(BACKGROUND, "timeout")
+            raise ServiceUnavailableError(
+                detail=f"Sin cupo de {BACKGROUND} tras {wait:.1f}s",
+                retry_after=self._retry_after(),
+            )
+        with self._background_lock:
+            self._background_active += 1
+        token = _held.set(BACKGROUND)
+        try:
+            yield
+        finally:
+            _held.reset(token)
+            with self._background_lock:
+                self._background_active -= 1
+            self._background.release()
+
+    async def acquire(self, lane: str):
+        if not self.enabled:
+            return
+        start = time.monotonic()
+        if self._can_run(lane) and not self._waiters[lane]:
+            self._active[lane] += 1
+            ADMISSION_WAIT_SECONDS.observe(0.0, lane)
+            return
+
+        waiters = self._waiters[lane]
+        if len(waiters) >= self._queue_size[lane]:
+            ADMISSION_REJECTED.inc(lane, "queue_full")
+            raise ServiceUnavailableError(
+                detail=f"Cola de {lane} llena ({len(waiters)} en espera)",
+                retry_after=self._retry_after(),
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        wait = deadline.bounded(self.max_wait)
+        try:
+            await asyncio.wait((future,), timeout=wait)
+        except BaseException:
+            self._abandon(lane, future)
+            raise
+
+        if not future.done():
+            self._abandon(lane, future)
+            ADMISSION_REJECTED.inc(lane, "timeout")
+            raise ServiceUnavailableError(
+                detail=f"Sin cupo de {lane} tras {wait:.1f}s",
+                retry_after=self._retry_after(),
+            )
+        # release() ya contó el cupo para este carril
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, lane)
+
+    def release(self, lane: str):
+        if not self.enabled:
+            return
+        self._active[lane] -= 1
+        self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "write_reserved": self.write_reserved,
+            "stream_limit": self.stream_limit,
+            "background_limit": self.background_limit,
+            "active": {**self._active, BACKGROUND: self._background_active},
+            "queued": {lane: len(w) for lane, w in self._waiters.items()},
+            "queue_size": dict(self._queue_size),
+        }
+
+    # ----------------------------------------
+    # Internos
+    # ----------------------------------------
+    def _can_run(self, lane: str) -> bool:
+        if sum(self._active.values()) >= self.limit:
+            return False
+        if lane == WRITE:
+            return True
+        reads = self._active[READ] + self._active[STREAM]
+        if reads >= self.limit - self.write_reserved:
+            return False
+        return lane != STREAM or self._active[STREAM] < self.stream_limit
+
+    def _wake(self):
+        """Entrega los cupos libres: escrituras, lecturas y al final streams."""
+        for lane in (WRITE, READ, STREAM):
+            waiters = self._waiters[lane]
+            while waiters and self._can_run(lane):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self._active[lane] += 1
+                future.set_result(None)
+
+    def _abandon(self, lane: str, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # El cupo llegó justo al rendirse: devolverlo
+            self.release(lane)
+            return
+        future.cancel()
+        try:
+            self._waiters[lane].remove(future)
+        except ValueError:
+            pass
+
+    def _retry_after(self) -> int:
+        queued = sum(len(w) for w in self._waiters.values())
+        return max(1, math.ceil(self._hold_avg * (queued + 1) / max(self.limit, 1)))
+
+
+admission = AdmissionController(
+    limit=settings.DB_ADMISSION_LIMIT,
+    read_queue=settings.DB_ADMISSION_READ_QUEUE,
+    write_queue=settings.DB_ADMISSION_WRITE_QUEUE,
+    write_reserved=settings.DB_ADMISSION_WRITE_RESERVED,
+    max_wait=settings.DB_ADMISSION_MAX_WAIT,
+    stream_limit=settings.DB_ADMISSION_STREAM_LIMIT,
+    stream_queue=settings.DB_ADMISSION_STREAM_QUEUE,
+    background_limit=settings.DB_ADMISSION_BACKGROUND_LIMIT,
+)
+
+
+def _admission_metrics():
+    stats = admission.stats()
+    yield "db_admission_active", "gauge", "Operaciones de BD admitidas por carril", {
+        (("lane", lane),): value for lane, value in stats["active"].items()
+    }
+    yield "db_admission_queued", "gauge", "Operaciones en espera de cupo por carril", {
+        (("lane", lane),): value for lane, value in stats["queued"].items()
+    }
+
+
+registry.register_collector(_admission_metrics)
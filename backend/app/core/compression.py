@@ -0,0 +1,205 @@
+# app/core/compression.py
+
+import zlib
+from typing import Optional
+
+# Brotli es opcional: sin el paquete solo se ofrece gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ============================================================
+# Compresión de respuestas (gzip / brotli)
+#
+# Middleware ASGI que comprime las respuestas de tipo texto, JSON o
+# MessagePack según Accept-Encoding (br antes que gzip). Las respuestas
+# completas menores a `minimum_size` bytes se mandan tal cual; las que
+# llegan en streaming (/calidad/export/) se comprimen por fragmento, con
+# flush, para que el cliente siga recibiendo datos mientras se generan.
+#
+# El ETag de un cuerpo comprimido lleva sufijo (`"abc-gzip"`): es otra
+# representación. `http_cache.etag_matches` ignora el sufijo al comparar
+# If-None-Match, así un 304 sigue funcionando con cualquier codificación.
+# Toda respuesta cuyo ETag lleva sufijo (200 o 304) agrega
+# `Vary: Accept-Encoding` para que un caché intermedio no las mezcle.
+# ============================================================
+
+_COMPRESSIBLE = ("text/", "json", "msgpack", "xml", "javascript")
+
+
+class _Gzip:
+    suffix = "-gzip"
+
+    def __init__(self, level: int):
+        # wbits=31: contenedor gzip
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    suffix = "-br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+
+    def ok(coding):
+        return accepted.get(coding, accepted.get("*", 0)) > 0
+
+    if brotli is not None and ok("br"):
+        return "br"
+    if ok("gzip"):
+        return "gzip"
+    return None
+
+
+def _add_vary(headers: list, value: str):
+    for i, (name, current) in enumerate(headers):
+        if name.lower() == b"vary":
+            if value.lower().encode() not in current.lower():
+                headers[i] = (name, current + b", " + value.encode())
+            return
+    headers.append((b"vary", value.encode()))
+
+
+def _etag_with_suffix(headers: list, suffix: str):
+    # El ETag con sufijo depende de Accept-Encoding: Vary debe decirlo,
+    # también en el 304 (que no trae Content-Type)
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == b"etag" and value.endswith(b'"'):
+            headers[i] = (name, value[:-1] + suffix.encode() + b'"')
+            _add_vary(headers, "Accept-Encoding")
+            return
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = _accepted_encoding(accept_encoding)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                chunk = compressor.compress(body)
+                chunk += compressor.flush() if more_body else compressor.finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            # Primer fragmento: decidir con los encabezados y el tamaño
+            headers = list(start.get("headers", []))
+            status = start["status"]
+            content_type = b""
+            already_encoded = False
+            for name, value in headers:
+                lower = name.lower()
+                if lower == b"content-type":
+                    content_type = value.lower()
+                elif lower == b"content-encoding":
+                    already_encoded = True
+
+            compressible = not already_encoded and any(
+                kind.encode() in content_type for kind in _COMPRESSIBLE
+            )
+            if compressible:
+                _add_vary(headers, "Accept-Encoding")
+
+            if status == 304 and encoding is not None:
+                _etag_with_suffix(headers, "-br" if encoding == "br" else "-gzip")
+
+            if (
+                not compressible
+                or encoding is None
+                or status < 200
+                or status in (204, 304)
+                or (not more_body and len(body) < self.minimum_size)
+            ):
+                passthrough = True
+                await send({**start, "headers": headers})
+                await send(message)
+                return
+
+            compressor = (
+                _Brotli(self.brotli_quality)
+                if encoding == "br"
+                else _Gzip(self.gzip_level)
+            )
+            headers = [(n, v) for n, v in headers if n.lower() != b"content-length"]
+            headers.append((b"content-encoding", encoding.encode()))
+            _etag_with_suffix(headers, compressor.suffix)
+
+            chunk = compressor.compress(body)
+            chunk += compressor.flush() if more_body else compressor.finish()
+            if not more_body:
+                headers.append((b"content-length", str(len(chunk)).encode()))
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from pydantic import Field
+from pydantic import Field, model_validator
 
 
 class Settings(BaseSettings):
@@ -8,11 +8,108 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     DB_DRIVER: str = "ODBC Driver 17 for SQL Server"
+
+    # Pool de conexiones (tiempos en segundos). DB_POOL_MAX_SIZE=0 lo
+    # deriva de la admisión (ver `_dimensionar_pool`)
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 0
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_MAX_LIFETIME: int = 1800
+    DB_POOL_MAX_IDLE: int = 300
+    DB_POOL_PING_INTERVAL: int = 30
+
+    # Réplica de solo lectura (vacío = todo a la primaria). Puede ser otro
+    # servidor o el mismo listener con ApplicationIntent=ReadOnly
+    DB_READ_SERVER: str = ""
+    DB_READ_NAME: str = ""
+    DB_READ_APPLICATION_INTENT: bool = True
+    DB_READ_POOL_MAX_SIZE: int = 10
+    # Lecturas a la primaria tras una escritura (leer lo propio) y tras
+    # una falla de la réplica (segundos)
+    DB_READ_PIN_SECONDS: float = 5.0
+    DB_READ_RETRY_INTERVAL: float = 30.0
+
+    # Timeouts ODBC (segundos enteros; 0 = sin límite): login al abrir una
+    # conexión y por sentencia. Dentro de una petición se acotan a su plazo
+    DB_LOGIN_TIMEOUT: int = 5
+    DB_QUERY_TIMEOUT: int = 30
+    # Reintentos de lecturas ante errores transitorios (backoff base, s)
+    DB_READ_RETRIES: int = 2
+    DB_RETRY_BACKOFF: float = 0.05
+    # Lecturas readonly idénticas y concurrentes comparten una sola ejecución
+    DB_COALESCE_READS: bool = True
+
+    # Control de admisión: operaciones de BD simultáneas (0 = sin límite),
+    # cupos reservados a escrituras, colas por carril, espera máxima (s),
+    # exportaciones simultáneas y cupos del trabajo de fondo
+    DB_ADMISSION_LIMIT: int = 10
+    DB_ADMISSION_WRITE_RESERVED: int = 2
+    DB_ADMISSION_READ_QUEUE: int = 50
+    DB_ADMISSION_WRITE_QUEUE: int = 50
+    DB_ADMISSION_MAX_WAIT: float = 5.0
+    DB_ADMISSION_STREAM_LIMIT: int = 2
+    DB_ADMISSION_STREAM_QUEUE: int = 10
+    DB_ADMISSION_BACKGROUND_LIMIT: int = 1
+
+    # Hilos dedicados a ODBC para las rutas async (0 = derivado de la admisión)
+    DB_EXECUTOR_WORKERS: int = 0
+    # Conexiones e hilos por encima de los cupos de admisión: el ping de
+    # /health/ready no pasa por la admisión
+    DB_POOL_HEADROOM: int = 2
+
+    # Filas por fetchmany en las respuestas en streaming
+    DB_STREAM_FETCH_SIZE: int = 500
+
+    # Bitácora de consultas lentas (ms; 0 la desactiva)
+    DB_SLOW_QUERY_MS: float = 500
+    DB_SLOW_QUERY_LOG: str = "logs/slow_queries.log"
+    DB_SLOW_QUERY_LOG_MAX_BYTES: int = 10_000_000
+    DB_SLOW_QUERY_LOG_BACKUPS: int = 5
+    # Plan de las consultas lentas: "" (no), "estimated" o "actual"
+    DB_SLOW_QUERY_PLAN: str = ""
+    # Fracción de consultas lentas a las que se captura el plan
+    DB_SLOW_QUERY_PLAN_SAMPLE: float = 0.1
+
+    # Snapshot del tablero en memoria (segundos; TTL=0 lo desactiva)
+    BOARD_CACHE_TTL: float = 5.0
+    BOARD_CACHE_STALE_TTL: float = 30.0
+    BOARD_CACHE_MAX_ROWS: int = 5000
+    # Cambios que se recuerdan para responder deltas (/calidad/cambios/)
+    BOARD_CHANGELOG_SIZE: int = 10000
+
+    # Difusión del tablero por WebSocket (/calidad/stream/)
+    BOARD_STREAM_POLL_INTERVAL: float = 5.0
+    BOARD_STREAM_QUEUE_SIZE: int = 16
+
     CALIDAD_FASE_ID: int
     PREVIUS_FASE_ID: int
 
     TRACKER_URL: str = Field(validation_alias="tracker_url")
 
+    # Paginación del listado filtrado (/calidad/?limit=&cursor=)
+    PAGE_DEFAULT_SIZE: int = 100
+    PAGE_MAX_SIZE: int = 500
+
+    # Máximo de ids por operación en lote
+    BULK_MAX_IDS: int = 200
+
+    # Plazo por petición y de la exportación en streaming (segundos; 0 = sin plazo)
+    REQUEST_DEADLINE_SECONDS: float = 15.0
+    EXPORT_DEADLINE_SECONDS: float = 120.0
+
+    # Calentamiento al arrancar y /health/ready (segundos)
+    STARTUP_WARMUP: bool = True
+    HEALTH_DB_TIMEOUT: float = 2.0
+
+    # Compresión gzip/brotli de las respuestas (bytes; nivel y calidad)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Cache-Control de las respuestas GET con ETag
+    HTTP_CACHE_CONTROL: str = "private, no-cache"
+
     # Lee CSV desde .env: "http://a,http://b"
     CORS_ORIGINS: list[str] = Field(default_factory=list)
 
@@ -22,5 +119,33 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
 
+    @model_validator(mode="after")
+    def _dimensionar_pool(self):
+        """
+        El pool y el executor deben alcanzar para todas las operaciones
+        admitidas (DB_ADMISSION_LIMIT + DB_ADMISSION_BACKGROUND_LIMIT) más
+        DB_POOL_HEADROOM: si no, con la admisión llena el trabajo de fondo
+        y el healthcheck esperan conexión o hilo. En 0 se derivan de esa
+        suma; un valor explícito menor es un error de configuración. Sin
+        control de admisión (límite 0) no hay cota: 0 vale 10.
+        """
+        needed = None
+        if self.DB_ADMISSION_LIMIT > 0:
+            needed = (
+                self.DB_ADMISSION_LIMIT
+                + max(self.DB_ADMISSION_BACKGROUND_LIMIT, 1)
+                + self.DB_POOL_HEADROOM
+            )
+        for name in ("DB_POOL_MAX_SIZE", "DB_EXECUTOR_WORKERS"):
+            value = getattr(self, name)
+            if value <= 0:
+                setattr(self, name, needed or 10)
+            elif needed is not None and value < needed:
+                raise ValueError(
+                    f"{name}={value} no alcanza para DB_ADMISSION_LIMIT + "
+                    f"DB_ADMISSION_BACKGROUND_LIMIT + DB_POOL_HEADROOM ({needed})"
+                )
+        return self
+
 
 settings = Settings()
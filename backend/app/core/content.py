@@ -0,0 +1,110 @@
+# app/core/content.py
+
+import json
+from typing import Any, List, Tuple
+
+from fastapi import Request
+
+# MessagePack es opcional: sin el paquete solo se ofrece JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# ============================================================
+# Negociación del formato de las listas (Accept)
+#
+# - application/json (default): lista de objetos, como siempre.
+# - application/vnd.hyp.columnar+json: nombres de columna una sola vez y
+#   cada fila como arreglo:
+#       {"columns": ["id", "status", ...], "rows": [[1, "PENDIENTE", ...], ...]}
+#   Un dict de listas (comentarios en lote) queda {clave: {columns, rows}}.
+# - application/vnd.hyp.columnar+msgpack (o application/msgpack,
+#   application/x-msgpack): lo mismo codificado en MessagePack.
+# ============================================================
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.hyp.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.hyp.columnar+msgpack"
+
+_ALIASES = {
+    "application/msgpack": COLUMNAR_MSGPACK,
+    "application/x-msgpack": COLUMNAR_MSGPACK,
+}
+
+# Sufijo del ETag por representación: cada formato es un cuerpo distinto
+_ETAG_SUFFIX = {JSON: "", COLUMNAR_JSON: "-col", COLUMNAR_MSGPACK: "-colmp"}
+
+# Los valores llegan ya convertidos a tipos JSON (dump_python(mode="json"))
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def available() -> Tuple[str, ...]:
+    if msgpack is None:
+        return (JSON, COLUMNAR_JSON)
+    return (JSON, COLUMNAR_JSON, COLUMNAR_MSGPACK)
+
+
+def _parse_accept(header: str) -> List[Tuple[str, float]]:
+    offers = []
+    for position, part in enumerate(header.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type:
+            offers.append((media_type.lower(), q, position))
+    # Mayor q primero; a igual q, el orden del cliente
+    offers.sort(key=lambda offer: (-offer[1], offer[2]))
+    return [(media_type, q) for media_type, q, _ in offers]
+
+
+def negotiate(request: Request) -> str:
+    """Formato preferido por el cliente entre los disponibles (JSON si ninguno)."""
+    header = request.headers.get("accept")
+    if not header:
+        return JSON
+
+    supported = available()
+    for media_type, q in _parse_accept(header):
+        if q <= 0:
+            continue
+        media_type = _ALIASES.get(media_type, media_type)
+        if media_type in supported:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON
+    return JSON
+
+
+def etag_for(etag: str, media_type: str) -> str:
+    """`"abc.3"` -> `"abc.3-col"` para las representaciones no JSON."""
+    suffix = _ETAG_SUFFIX.get(media_type, "")
+    if not suffix or not etag.endswith('"'):
+        return etag
+    return etag[:-1] + suffix + '"'
+
+
+def to_columnar(value: Any) -> Any:
+    """Lista de dicts -> {columns, rows}; dict de listas -> columnar por clave."""
+    if isinstance(value, list):
+        if not all(isinstance(item, dict) for item in value):
+            return value
+        # Todos los dicts vienen del mismo modelo o proyección: mismo orden
+        columns = list(value[0]) if value else []
+        return {"columns": columns, "rows": [list(item.values()) for item in value]}
+    if isinstance(value, dict) and all(isinstance(v, list) for v in value.values()):
+        return {key: to_columnar(item) for key, item in value.items()}
+    return value
+
+
+def encode(media_type: str, value: Any) -> bytes:
+    """Codifica `value` (ya en tipos JSON) en el formato columnar pedido."""
+    columnar = to_columnar(value)
+    if media_type == COLUMNAR_MSGPACK:
+        return msgpack.packb(columnar, use_bin_type=True)
+    return _encoder.encode(columnar).encode("utf-8")
@@ -1,80 +1,1131 @@
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
 import pyodbc
+from app.core import deadline, read_pin, slow_query
+from app.core.admission import READ, WRITE, AdmissionController
+from app.core.admission import admission as default_admission
 from app.core.config import settings
+from app.core.db_executor import DBExecutor, db_executor
+from app.core.metrics import registry
+from app.core.queries import Rendered, catalog
+from app.core.slow_query import QueryTimer
+from app.errors.errors import QueryTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# El pool propio sustituye al pooling del driver manager ODBC
+pyodbc.pooling = False
+
+# ============================================================
+# Métricas de la capa de datos (etiqueta `query`: nombre de la consulta)
+# ============================================================
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds",
+    "Duración de las consultas (checkout, ejecución y lectura)",
+    ("query",),
+)
+DB_QUERY_ROWS = registry.counter(
+    "db_query_rows_total", "Filas devueltas o afectadas por consulta", ("query",)
+)
+DB_QUERY_ERRORS = registry.counter(
+    "db_query_errors_total", "Consultas que terminaron con error", ("query",)
+)
+DB_CONNECT_SECONDS = registry.histogram(
+    "db_connect_duration_seconds", "Tiempo de apertura de conexiones ODBC"
+)
+DB_POOL_WAIT_SECONDS = registry.histogram(
+    "db_pool_wait_seconds", "Espera por una conexión libre del pool"
+)
+DB_READS = registry.counter(
+    "db_reads_total", "Lecturas readonly por destino (replica / primary)", ("target",)
+)
+DB_REPLICA_FALLBACKS = registry.counter(
+    "db_replica_fallbacks_total", "Veces que la réplica falló y se leyó de la primaria"
+)
+DB_QUERY_TIMEOUTS = registry.counter(
+    "db_query_timeouts_total",
+    "Consultas cortadas por plazo agotado o cliente desconectado",
+    ("query",),
+)
+DB_QUERY_RETRIES = registry.counter(
+    "db_query_retries_total", "Reintentos de lecturas por errores transitorios", ("query",)
+)
+DB_QUERY_COALESCED = registry.counter(
+    "db_query_coalesced_total",
+    "Lecturas readonly por rol: leader (ejecutó) o follower (compartió el resultado)",
+    ("query", "role"),
+)
+
+
+class PoolTimeoutError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones pyodbc.
+
+    - Mantiene entre `min_size` y `max_size` conexiones abiertas.
+    - Recicla conexiones que superan `max_lifetime` o que llevan más de
+      `max_idle` segundos sin usarse (sin bajar de `min_size`).
+    - Valida con `SELECT 1` las conexiones que llevan más de
+      `ping_interval` segundos inactivas antes de entregarlas.
+    - Espera hasta `timeout` segundos por una conexión libre.
+    - Una conexión que vuelve tras un error (`dirty=True`) revierte
+      cualquier transacción abierta antes de volver a la lista de libres;
+      si no se puede, se descarta.
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        max_lifetime: float = 1800,
+        max_idle: float = 300,
+        ping_interval: float = 30,
+    ):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._size = 0  # conexiones abiertas (libres + en uso)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "closed": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "rollbacks": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+        }
+
+    # ----------------------------------------
+    # Checkout / devolución
+    # ----------------------------------------
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """`timeout` acota la espera (p. ej. lo que queda del plazo de la petición)."""
+        start = time.monotonic()
+        wait = self.timeout if timeout is None else min(self.timeout, timeout)
+        until = start + wait
+
+        while True:
+            pooled = self._checkout(until, wait)
+
+            if pooled is None:
+                # Hay cupo: abrir una conexión nueva fuera del lock
+                connect_start = time.perf_counter()
+                try:
+                    pooled = PooledConnection(self._connect())
+                except Exception:
+                    self._forget()
+                    raise
+                DB_CONNECT_SECONDS.observe(time.perf_counter() - connect_start)
+                with self._cond:
+                    self._stats["created"] += 1
+                break
+
+            if self._is_usable(pooled):
+                break
+
+            self._discard(pooled, recycled=True)
+
+        waited = time.monotonic() - start
+        DB_POOL_WAIT_SECONDS.observe(waited)
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+        return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False, dirty: bool = False):
+        """
+        `dirty`: la conexión vuelve tras un error y puede tener una
+        transacción abierta (p. ej. un batch cortado por timeout a mitad
+        de camino); se revierte o se descarta.
+        """
+        if not discard and dirty and not self._rollback(pooled):
+            discard = True
+        if discard or self._closed or self._expired(pooled, time.monotonic()):
+            self._discard(pooled, recycled=not discard)
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        pooled = self.acquire(timeout)
+        discard = dirty = False
+        try:
+            yield pooled.conn
+        except (pyodbc.OperationalError, pyodbc.InterfaceError):
+            # Error a nivel de conexión: no se devuelve al pool (al cerrarla,
+            # el servidor revierte lo que haya quedado abierto)
+            discard = True
+            raise
+        except BaseException:
+            # Otro error a mitad de un batch: revertir antes de reutilizarla
+            dirty = True
+            raise
+        finally:
+            self.release(pooled, discard=discard, dirty=dirty)
+
+    # ----------------------------------------
+    # Mantenimiento
+    # ----------------------------------------
+    def fill(self):
+        """Abre conexiones hasta alcanzar `min_size`."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = PooledConnection(self._connect())
+            except Exception:
+                self._forget()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+            self.release(pooled)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self) -> dict:
+        with self._cond:
+            in_use = self._size - len(self._idle)
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._stats,
+            }
+
+    # ----------------------------------------
+    # Internos
+    # ----------------------------------------
+    def _checkout(self, until: float, wait: float):
+        """
+        Devuelve una conexión libre, o None si hay cupo para abrir una
+        nueva (el cupo queda reservado). Espera hasta `until`.
+        """
+        with self._cond:
+            while True:
+                if self._idle:
+                    # LIFO: las menos usadas envejecen y se reciclan solas
+                    return self._idle.pop()
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+
+                remaining = until - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Sin conexiones libres tras {wait:.2f}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+    def _expired(self, pooled: PooledConnection, now: float) -> bool:
+        if self.max_lifetime and now - pooled.created_at > self.max_lifetime:
+            return True
+        if (
+            self.max_idle
+            and now - pooled.last_used > self.max_idle
+            and self._size > self.min_size
+        ):
+            return True
+        return False
+
+    def _is_usable(self, pooled: PooledConnection) -> bool:
+        now = time.monotonic()
+        if self._expired(pooled, now):
+            return False
+
+        if now - pooled.last_used < self.ping_interval:
+            return True
+
+        try:
+            pooled.conn.cursor().execute("SELECT 1").fetchone()
+            return True
+        except pyodbc.Error:
+            with self._cond:
+                self._stats["ping_failures"] += 1
+            return False
+
+    def _rollback(self, pooled: PooledConnection) -> bool:
+        """Revierte la transacción abierta, si hay; False si la conexión no responde."""
+        try:
+            pooled.conn.cursor().execute("IF @@TRANCOUNT > 0 ROLLBACK TRAN")
+        except pyodbc.Error:
+            return False
+        with self._cond:
+            self._stats["rollbacks"] += 1
+        return True
+
+    def _discard(self, pooled: PooledConnection, recycled: bool = False):
+        try:
+            pooled.conn.close()
+        except pyodbc.Error:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+            if recycled:
+                self._stats["recycled"] += 1
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+# Errores de conexión de la réplica que justifican leer de la primaria
+_REPLICA_ERRORS = (pyodbc.OperationalError, pyodbc.InterfaceError, PoolTimeoutError)
+
+# SQLSTATE de sentencia cortada: timeout del driver / cancelación (SQLCancel)
+_TIMEOUT_STATES = ("HYT00", "HY008")
+# SQLSTATE transitorios: enlace caído, no se pudo conectar, víctima de
+# deadlock, timeout de conexión. Solo se reintentan las lecturas.
+_TRANSIENT_STATES = ("08S01", "08001", "40001", "HYT01")
+
+
+def _sqlstate(error: BaseException) -> Optional[str]:
+    args = getattr(error, "args", ())
+    return args[0] if len(args) > 1 and isinstance(args[0], str) else None
+
+
+def _como_timeout(error: BaseException, name: str) -> Optional[QueryTimeoutError]:
+    """
+    QueryTimeoutError si `error` se debe al plazo de la petición: la
+    sentencia se cortó (HYT00/HY008) o el pool no entregó conexión antes
+    de que el plazo venciera.
+    """
+    request = deadline.current()
+    if isinstance(error, PoolTimeoutError):
+        left = deadline.remaining()
+        if left is None or left > 0:
+            return None
+    elif not isinstance(error, pyodbc.Error) or _sqlstate(error) not in _TIMEOUT_STATES:
+        return None
+
+    DB_QUERY_TIMEOUTS.inc(name)
+    if request is not None and request.cancelled:
+        return QueryTimeoutError(detail=f"{name}: {request.cancelled}")
+    return QueryTimeoutError(detail=f"{name}: {error}")
+
+
+def _verificar_plazo(name: str):
+    """Falla antes de tomar una conexión si el plazo ya venció o se canceló."""
+    try:
+        deadline.check()
+    except QueryTimeoutError:
+        DB_QUERY_TIMEOUTS.inc(name)
+        raise
+
+
+class _ReadRouting:
+    """
+    Cuándo se puede leer de la réplica. El pin de leer lo propio es el de
+    la petición en curso (`read_pin`); `last_write` (cualquier escritura
+    del proceso) solo se usa sin petición o en lecturas compartidas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_write = float("-inf")
+        self.down_until = float("-inf")
+        self.last_error: Optional[str] = None
+
+    def wrote(self):
+        self.last_write = time.monotonic()
+
+    def replica_down(self, error: BaseException):
+        with self._lock:
+            self.down_until = time.monotonic() + settings.DB_READ_RETRY_INTERVAL
+            self.last_error = repr(error)
+        DB_REPLICA_FALLBACKS.inc()
+        logger.warning("Réplica de lectura no disponible, se usa la primaria: %r", error)
+
+    def use_replica(self) -> bool:
+        now = time.monotonic()
+        if now < self.down_until:
+            return False
+        pin = read_pin.current()
+        if pin is not None:
+            return not pin.pinned()
+        return now - self.last_write >= settings.DB_READ_PIN_SECONDS
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "configured": DB.read_pool is not None,
+            "pinned_to_primary_s": round(
+                max(0.0, settings.DB_READ_PIN_SECONDS - (now - self.last_write)), 3
+            ),
+            "down_for_s": round(max(0.0, self.down_until - now), 3),
+            "last_error": self.last_error,
+        }
+
+
+_routing = _ReadRouting()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _SingleFlight:
+    """
+    Agrupa lecturas idénticas concurrentes: la primera llamada con un
+    `(query, params)` ejecuta (leader) y las que llegan mientras está en
+    curso esperan y reciben el mismo resultado (followers).
+
+    La clave incluye la generación de escrituras del proceso, que avanza
+    al terminar cada escritura: una lectura posterior a una escritura nunca
+    se une a una ejecución que empezó antes, así quien escribe siempre lee
+    lo propio. Incluye también el destino (réplica o primaria) según el
+    pin de quien llama: un cliente fijado a la primaria tras escribir no
+    recibe las filas de un leader que lee de la réplica atrasada. El
+    resultado compartido es de solo lectura para todos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.generation = 0
+
+    def wrote(self):
+        with self._lock:
+            self.generation += 1
+
+    def run(self, name: str, readonly: bool, query: str, params: tuple, execute):
+        if not (readonly and settings.DB_COALESCE_READS):
+            return execute()
+        try:
+            hash(params)
+        except TypeError:
+            return execute()
+
+        # Mismo criterio que DB._pools, evaluado con el pin de quien llama
+        replica = DB.read_pool is not None and _routing.use_replica()
+        with self._lock:
+            key = (self.generation, replica, query, params)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            DB_QUERY_COALESCED.inc(name, "leader")
+            try:
+                flight.result = execute()
+                return flight.result
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        DB_QUERY_COALESCED.inc(name, "follower")
+        _verificar_plazo(name)
+        left = deadline.remaining()
+        if not flight.done.wait(None if left is None else max(left, 0)):
+            DB_QUERY_TIMEOUTS.inc(name)
+            raise QueryTimeoutError(detail=f"{name}: plazo agotado esperando la lectura en curso")
+        if isinstance(flight.error, QueryTimeoutError):
+            # Plazo o cancelación del leader, no de esta petición
+            return execute()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+
+_flights = _SingleFlight()
+
+
+def _al_escribir():
+    _routing.wrote()
+    read_pin.wrote()
+    _flights.wrote()
 
 
 class DB:
     @staticmethod
-    def _connect():
+    def _connect(read: bool = False):
+        server = settings.DB_READ_SERVER if read else settings.DB_SERVER
+        database = (settings.DB_READ_NAME or settings.DB_NAME) if read else settings.DB_NAME
         conn_str = (
             f"DRIVER={{{settings.DB_DRIVER}}};"
-            f"SERVER={settings.DB_SERVER};"
-            f"DATABASE={settings.DB_NAME};"
+            f"SERVER={server};"
+            f"DATABASE={database};"
             f"UID={settings.DB_USER};"
             f"PWD={settings.DB_PASSWORD};"
             "TrustServerCertificate=yes;"
         )
-        return pyodbc.connect(conn_str)
+        if read and settings.DB_READ_APPLICATION_INTENT:
+            # Grupo de disponibilidad: el listener enruta a una secundaria
+            conn_str += "ApplicationIntent=ReadOnly;"
+        # Timeout de login acotado por el plazo de la petición (0: sin límite)
+        login_timeout = settings.DB_LOGIN_TIMEOUT
+        if deadline.remaining() is not None:
+            login_timeout = max(1, math.ceil(deadline.bounded(login_timeout or math.inf)))
+        # autocommit: cada sentencia suelta se confirma sola y la conexión
+        # vuelve al pool sin transacciones abiertas
+        return pyodbc.connect(conn_str, autocommit=True, timeout=login_timeout)
+
+    pool = ConnectionPool(
+        connect=lambda: DB._connect(),
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        timeout=settings.DB_POOL_TIMEOUT,
+        max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+        max_idle=settings.DB_POOL_MAX_IDLE,
+        ping_interval=settings.DB_POOL_PING_INTERVAL,
+    )
+
+    # Réplica de solo lectura (None si DB_READ_SERVER está vacío)
+    read_pool = (
+        ConnectionPool(
+            connect=lambda: DB._connect(read=True),
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_READ_POOL_MAX_SIZE,
+            timeout=settings.DB_POOL_TIMEOUT,
+            max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+            max_idle=settings.DB_POOL_MAX_IDLE,
+            ping_interval=settings.DB_POOL_PING_INTERVAL,
+        )
+        if settings.DB_READ_SERVER
+        else None
+    )
+
+    @staticmethod
+    def pool_stats() -> dict:
+        return DB.pool.stats()
+
+    @staticmethod
+    def read_status() -> dict:
+        return _routing.status()
+
+    @staticmethod
+    def fill_pools():
+        """Abre las conexiones mínimas; una réplica caída no impide arrancar."""
+        DB.pool.fill()
+        if DB.read_pool is not None:
+            try:
+                DB.read_pool.fill()
+            except pyodbc.Error as e:
+                _routing.replica_down(e)
+
+    @staticmethod
+    def close_pools():
+        DB.pool.close()
+        if DB.read_pool is not None:
+            DB.read_pool.close()
+
+    # ----------------------------------------
+    # Ruteo lectura / escritura
+    # Las lecturas con `readonly=True` van a la réplica, salvo que:
+    # - el cliente haya escrito hace menos de DB_READ_PIN_SECONDS (leer
+    #   lo propio: la réplica puede ir atrasada; ver `read_pin`), o
+    # - la réplica haya fallado hace menos de DB_READ_RETRY_INTERVAL.
+    # Si la réplica falla a nivel de conexión se reintenta en la primaria.
+    # ----------------------------------------
+    @staticmethod
+    def _pools(readonly: bool) -> list:
+        if readonly and DB.read_pool is not None and _routing.use_replica():
+            DB_READS.inc("replica")
+            return [DB.read_pool, DB.pool]
+        if readonly:
+            DB_READS.inc("primary")
+        return [DB.pool]
+
+    @staticmethod
+    def _ejecutar(
+        readonly: bool, timer: QueryTimer, query: str, params: tuple, fetch, sizes=None
+    ):
+        """
+        Ejecuta `query` en la réplica o la primaria y lee con `fetch(cursor)`.
+        Las lecturas (`readonly=True`) se reintentan hasta DB_READ_RETRIES
+        veces ante errores transitorios, con backoff exponencial con jitter,
+        solo si la pausa cabe en el plazo de la petición. `sizes` son los
+        tipos declarados de los parámetros (`cursor.setinputsizes`).
+        """
+        attempt = 0
+        while True:
+            try:
+                return DB._ejecutar_una_vez(readonly, timer, query, params, fetch, sizes)
+            except pyodbc.Error as e:
+                if (
+                    not readonly
+                    or attempt >= settings.DB_READ_RETRIES
+                    or _sqlstate(e) not in _TRANSIENT_STATES
+                ):
+                    raise
+                pause = random.uniform(0, settings.DB_RETRY_BACKOFF * 2**attempt)
+                left = deadline.remaining()
+                if left is not None and left <= pause:
+                    raise
+                attempt += 1
+                DB_QUERY_RETRIES.inc(timer.name)
+                logger.warning("Reintento %d de %s tras %r", attempt, timer.name, e)
+                time.sleep(pause)
+
+    @staticmethod
+    def _ejecutar_una_vez(
+        readonly: bool, timer: QueryTimer, query: str, params: tuple, fetch, sizes=None
+    ):
+        pools = DB._pools(readonly)
+        for pool in pools:
+            try:
+                _verificar_plazo(timer.name)
+                with pool.connection(deadline.remaining()) as conn:
+                    timer.mark("connect")
+                    timer.pool = pool
+                    conn.timeout = deadline.statement_timeout()
+                    cursor = conn.cursor()
+                    if sizes:
+                        cursor.setinputsizes(sizes)
+                    # Solo las lecturas se cancelan si el cliente se va: una
+                    # escritura ya enviada termina (o la corta el timeout de
+                    # sentencia, con XACT_ABORT y el rollback del pool)
+                    tracked = deadline.track(cursor) if readonly else nullcontext()
+                    with tracked:
+                        cursor.execute(query, params)
+                        timer.mark("execute")
+                        result = fetch(cursor)
+                    timer.mark("fetch")
+                    return result
+            except _REPLICA_ERRORS as e:
+                timeout = _como_timeout(e, timer.name)
+                if timeout is not None:
+                    raise timeout from e
+                if pool is DB.pool:
+                    raise
+                _routing.replica_down(e)
+
+    # ----------------------------------------
+    # Medición por consulta
+    # Cada método acepta `name` (p. ej. "calidad.tablero") para agrupar
+    # las métricas; sin nombre se usa el tipo de operación. El timer marca
+    # las fases connect / execute / fetch y las filas; si la consulta supera
+    # DB_SLOW_QUERY_MS se registra en la bitácora de consultas lentas.
+    # Las sentencias del catálogo (`statement`) suman además a las
+    # estadísticas de su variante.
+    # ----------------------------------------
+    @staticmethod
+    @contextmanager
+    def _medir(
+        name: str,
+        query: str,
+        params: tuple,
+        timer: QueryTimer = None,
+        statement: Optional[Rendered] = None,
+    ):
+        timer = timer or QueryTimer(name)
+        error = None
+        try:
+            yield timer
+        except Exception as exc:
+            error = exc
+            DB_QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            timer.stop()
+            DB_QUERY_SECONDS.observe(timer.total, name)
+            if error is None:
+                DB_QUERY_ROWS.inc(name, amount=timer.rows)
+            if statement is not None:
+                statement.stats.record(timer.total, timer.rows, error is not None)
+            if slow_query.is_slow(timer):
+                DB._registrar_lenta(timer, query, params, error, statement)
+
+    @staticmethod
+    def _registrar_lenta(
+        timer: QueryTimer,
+        query: str,
+        params: tuple,
+        error,
+        statement: Optional[Rendered] = None,
+    ):
+        try:
+            entry_id = slow_query.log_slow(timer, query, params, error)
+            if slow_query.should_capture_plan():
+                # El plan se captura como corrió la lenta: mismos tipos de
+                # parámetros y mismo servidor (primaria o réplica)
+                _capturar_plan_en_segundo_plano(
+                    entry_id,
+                    timer.name,
+                    query,
+                    params,
+                    statement.input_sizes if statement is not None else None,
+                    timer.pool or DB.pool,
+                )
+        except Exception:
+            # La bitácora nunca debe romper la consulta que la originó
+            slow_query.logger.exception("No se pudo registrar la consulta lenta")
 
     # ----------------------------------------
     # SELECT seguro
     # ----------------------------------------
     @staticmethod
-    def select(query: str, params: tuple = ()):
-        conn = DB._connect()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+    def select(
+        query: str,
+        params: tuple = (),
+        raw: bool = False,
+        name: str = "select",
+        readonly: bool = False,
+        statement: Optional[Rendered] = None,
+    ):
+        """
+        Filas como dicts. Con `raw=True` devuelve `(columnas, filas)` con las
+        filas tal cual las entrega pyodbc, para mapeadores por índice. Con
+        `readonly=True` puede leerse de la réplica. `statement` es la
+        variante del catálogo que se ejecuta (ver `DB.run`).
+        """
+        sizes = statement.input_sizes if statement is not None else None
+
+        def fetch(cursor):
+            return [column[0] for column in cursor.description], cursor.fetchall()
+
+        def execute():
+            with DB._medir(name, query, params, statement=statement) as timer:
+                result = DB._ejecutar(readonly, timer, query, params, fetch, sizes)
+                timer.rows = len(result[1])
+            return result
+
+        columns, rows = _flights.run(name, readonly, query, params, execute)
+
+        if raw:
+            return columns, rows
 
         # Convertir a dicts automáticamente
-        columns = [column[0] for column in cursor.description]
-        result = [dict(zip(columns, row)) for row in rows]
+        return [dict(zip(columns, row)) for row in rows]
 
-        conn.close()
-        return result
+    # ----------------------------------------
+    # Batch con varios result sets (un solo viaje)
+    # ----------------------------------------
+    @staticmethod
+    def batch(
+        query: str,
+        params: tuple = (),
+        raw: bool = False,
+        name: str = "batch",
+        readonly: bool = False,
+        statement: Optional[Rendered] = None,
+    ):
+        """
+        Ejecuta un batch de varias sentencias y devuelve una lista con las
+        filas (dicts) de cada result set, en orden. Los conteos de filas de
+        INSERT/UPDATE no cuentan como result set. Si el batch necesita
+        atomicidad debe abrir y confirmar su propia transacción. Con
+        `raw=True` cada result set es `(columnas, filas)`, como en `select`.
+        Un batch sin `readonly=True` se considera escritura.
+        """
+        sizes = statement.input_sizes if statement is not None else None
+
+        def execute():
+            with DB._medir(name, query, params, statement=statement) as timer:
+                result = DB._ejecutar(
+                    readonly,
+                    timer,
+                    query,
+                    params,
+                    lambda c: DB._fetch_sets(c, raw=True),
+                    sizes,
+                )
+                timer.rows = sum(len(rows) for _, rows in result)
+            return result
+
+        try:
+            sets = _flights.run(name, readonly, query, params, execute)
+        finally:
+            if not readonly:
+                _al_escribir()
+
+        if raw:
+            return sets
+        return [[dict(zip(columns, row)) for row in rows] for columns, rows in sets]
 
     # ----------------------------------------
-    # INSERT seguro (returns last ID si aplica)
+    # SELECT por bloques (streaming)
     # ----------------------------------------
     @staticmethod
-    def insert(query: str, params: tuple):
-        conn = DB._connect()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
+    def stream(
+        query: str,
+        params: tuple = (),
+        size: int = None,
+        name: str = "stream",
+        readonly: bool = False,
+        statement: Optional[Rendered] = None,
+    ):
+        """
+        Generador que ejecuta `query` y entrega `(columnas, filas)` por
+        bloques de `size` filas (tuplas, sin convertir a dict) con
+        `fetchmany`. La conexión queda tomada del pool hasta agotar o
+        cerrar el generador. La duración medida es la del checkout y la
+        ejecución; la lectura depende del ritmo del cliente.
+        """
+        size = size or settings.DB_STREAM_FETCH_SIZE
+        timer = QueryTimer(name)
+        pools = DB._pools(readonly)
+        for pool in pools:
+            pooled = None
+            try:
+                _verificar_plazo(name)
+                pooled = pool.acquire(deadline.remaining())
+                timer.mark("connect")
+                timer.pool = pool
+                pooled.conn.timeout = deadline.statement_timeout()
+                cursor = pooled.conn.cursor()
+                if statement is not None:
+                    cursor.setinputsizes(statement.input_sizes)
+                with DB._medir(name, query, params, timer, statement), deadline.track(cursor):
+                    cursor.execute(query, params)
+                    timer.mark("execute")
+                break
+            except _REPLICA_ERRORS as e:
+                if pooled is not None:
+                    pool.release(pooled, discard=True)
+                timeout = _como_timeout(e, name)
+                if timeout is not None:
+                    raise timeout from e
+                if pool is DB.pool:
+                    raise
+                _routing.replica_down(e)
+            except BaseException:
+                if pooled is not None:
+                    pool.release(pooled, dirty=True)
+                raise
 
+        # Cada bloque respeta el plazo: una exportación que lo agota o cuyo
+        # cliente se fue se corta aunque el cursor siga teniendo filas
+        discard = False
+        try:
+            columns = [column[0] for column in cursor.description]
+            while True:
+                _verificar_plazo(name)
+                with deadline.track(cursor):
+                    rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                DB_QUERY_ROWS.inc(name, amount=len(rows))
+                yield columns, rows
+        except (pyodbc.OperationalError, pyodbc.InterfaceError) as e:
+            discard = True
+            timeout = _como_timeout(e, name)
+            if timeout is not None:
+                raise timeout from e
+            raise
+        finally:
+            # Descarta las filas pendientes antes de devolver la conexión
+            try:
+                cursor.close()
+            except pyodbc.Error:
+                discard = True
+            pool.release(pooled, discard=discard)
+
+    # ----------------------------------------
+    # INSERT ... OUTPUT INSERTED (devuelve la fila insertada)
+    # ----------------------------------------
+    @staticmethod
+    def insert_returning(
+        query: str,
+        params: tuple,
+        name: str = "insert_returning",
+        statement: Optional[Rendered] = None,
+    ):
+        sizes = statement.input_sizes if statement is not None else None
         try:
-            cursor.execute("SELECT SCOPE_IDENTITY()")
-            last_id = cursor.fetchone()[0]
-        except:
-            last_id = None
+            with DB._medir(name, query, params, statement=statement) as timer:
+                sets = DB._ejecutar(False, timer, query, params, DB._fetch_sets, sizes)
+                timer.rows = len(sets[0]) if sets else 0
+        finally:
+            _al_escribir()
 
-        conn.close()
-        return last_id
+        return sets[0][0] if sets and sets[0] else None
+
+    @staticmethod
+    def _fetch_sets(cursor, raw: bool = False):
+        result = []
+        while True:
+            if cursor.description is not None:
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+                if raw:
+                    result.append((columns, rows))
+                else:
+                    result.append([dict(zip(columns, row)) for row in rows])
+            if not cursor.nextset():
+                break
+        return result
 
     # ----------------------------------------
-    # UPDATE seguro
+    # UPDATE / DELETE seguros (devuelven filas afectadas)
     # ----------------------------------------
     @staticmethod
-    def update(query: str, params: tuple):
-        conn = DB._connect()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
+    def update(
+        query: str, params: tuple, name: str = "update", statement: Optional[Rendered] = None
+    ):
+        return DB._modificar(query, params, name, statement)
+
+    @staticmethod
+    def delete(query: str, params: tuple, name: str = "delete"):
+        return DB._modificar(query, params, name)
+
+    @staticmethod
+    def _modificar(
+        query: str, params: tuple, name: str, statement: Optional[Rendered] = None
+    ) -> int:
+        sizes = statement.input_sizes if statement is not None else None
+        try:
+            with DB._medir(name, query, params, statement=statement) as timer:
+                affected = DB._ejecutar(
+                    False, timer, query, params, lambda c: c.rowcount, sizes
+                )
+                timer.rows = max(affected, 0)
+        finally:
+            _al_escribir()
 
-        affected = cursor.rowcount
-        conn.close()
         return affected
 
     # ----------------------------------------
-    # DELETE seguro
+    # Sentencias del catálogo (app/core/queries.py), por nombre
     # ----------------------------------------
     @staticmethod
-    def delete(query: str, params: tuple):
-        conn = DB._connect()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
+    def run(
+        name: str,
+        params: tuple = (),
+        parts: tuple = (),
+        raw: bool = False,
+        size: int = None,
+    ):
+        """
+        Ejecuta la sentencia registrada `name` con las partes variables
+        `parts` (columnas, filtros, tamaño de lista IN...). El SQL, los tipos
+        de los parámetros, `readonly` y el método (select, batch, stream,
+        insert_returning, update) salen del catálogo; devuelve lo mismo que
+        ese método.
+        """
+        statement = catalog.get(name)
+        rendered = statement.render(*parts)
+        params = tuple(params)
+        rendered.check(params)
+        sql = rendered.sql
+        if statement.kind == "select":
+            return DB.select(sql, params, raw, name, statement.readonly, rendered)
+        if statement.kind == "batch":
+            return DB.batch(sql, params, raw, name, statement.readonly, rendered)
+        if statement.kind == "stream":
+            return DB.stream(sql, params, size, name, statement.readonly, rendered)
+        if statement.kind == "insert_returning":
+            return DB.insert_returning(sql, params, name, rendered)
+        return DB.update(sql, params, name, rendered)
 
-        affected = cursor.rowcount
-        conn.close()
-        return affected
+
+class AsyncDB:
+    """
+    Variante asíncrona de DB para rutas `async def` que consultan sin
+    pasar por un servicio (p. ej. el ping de /health/ready).
+
+    Cada operación corre en el executor ODBC dedicado, por lo que el event
+    loop nunca se bloquea esperando a pyodbc. Con `admission` (por defecto
+    el del proceso) cada operación espera cupo en el carril de lectura
+    (`readonly=True`) o de escritura; `admission=None` lo omite.
+    """
+
+    def __init__(
+        self,
+        executor: DBExecutor = db_executor,
+        admission: Optional[AdmissionController] = default_admission,
+    ):
+        self.executor = executor
+        self.admission = admission
+
+    async def _run(self, lane: str, fn, *args):
+        if self.admission is None:
+            return await self.executor.run(fn, *args)
+        async with self.admission.slot(lane):
+            return await self.executor.run(fn, *args)
+
+    async def select(
+        self,
+        query: str,
+        params: tuple = (),
+        raw: bool = False,
+        name: str = "select",
+        readonly: bool = False,
+    ):
+        lane = READ if readonly else WRITE
+        return await self._run(lane, DB.select, query, params, raw, name, readonly)
+
+
+# ============================================================
+# Captura de planes de las consultas lentas (muestreada)
+#
+# - "estimated": SET SHOWPLAN_XML ON. SQL Server compila la consulta y
+#   devuelve el plan sin ejecutarla, así que sirve también para escrituras.
+# - "actual": SET STATISTICS XML ON. Vuelve a ejecutar la consulta, por
+#   eso solo se usa con lecturas; las escrituras caen a "estimated".
+#
+# Corre en el executor ODBC, fuera de la petición, en el carril de fondo
+# de la admisión y como máximo una captura a la vez para no acaparar el
+# pool en un pico de lentitud. Usa el mismo pool (primaria o réplica) y
+# los mismos tipos de parámetros que la ejecución lenta. Las opciones SET
+# persisten en la sesión: si no se pueden apagar, la conexión se descarta
+# en lugar de volver al pool.
+# ============================================================
+_PLAN_COLUMN = "Microsoft SQL Server 2005 XML Showplan"
+_WRITE_STATEMENT = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|EXEC|EXECUTE|INTO|TRUNCATE)\b", re.IGNORECASE
+)
+_plan_lock = threading.Lock()
+
+
+def _es_lectura(query: str) -> bool:
+    return (
+        query.lstrip().upper().startswith(("SELECT", "WITH"))
+        and _WRITE_STATEMENT.search(query) is None
+    )
+
+
+def _capturar_plan_en_segundo_plano(
+    entry_id: str, name: str, query: str, params, sizes, pool: ConnectionPool
+):
+    if not _plan_lock.acquire(blocking=False):
+        return
+    try:
+        # Fuera del plazo de la petición que originó la consulta lenta
+        with deadline.detached():
+            db_executor.submit(_capturar_plan, entry_id, name, query, params, sizes, pool)
+    except Exception:
+        _plan_lock.release()
+        raise
+
+
+def _capturar_plan(
+    entry_id: str, name: str, query: str, params, sizes, pool: ConnectionPool
+):
+    """
+    Plan de `query` en `pool` (donde corrió la consulta lenta) con los
+    tipos declarados `sizes`, para que sea el de la misma parametrización.
+    """
+    try:
+        kind = settings.DB_SLOW_QUERY_PLAN
+        if kind == "actual" and not _es_lectura(query):
+            kind = "estimated"
+        option = "SHOWPLAN_XML" if kind == "estimated" else "STATISTICS XML"
+
+        # "actual" vuelve a ejecutar la consulta: carril de fondo de la admisión
+        with default_admission.background(detached=True):
+            pooled = pool.acquire()
+            discard = False
+            try:
+                pooled.conn.timeout = settings.DB_QUERY_TIMEOUT
+                cursor = pooled.conn.cursor()
+                cursor.execute(f"SET {option} ON")
+                if sizes:
+                    cursor.setinputsizes(sizes)
+                try:
+                    cursor.execute(query, params)
+                    plans = [
+                        rows[0][0]
+                        for columns, rows in DB._fetch_sets(cursor, raw=True)
+                        if columns == [_PLAN_COLUMN] and rows
+                    ]
+                finally:
+                    try:
+                        cursor.execute(f"SET {option} OFF")
+                    except pyodbc.Error:
+                        discard = True
+            except (pyodbc.OperationalError, pyodbc.InterfaceError):
+                discard = True
+                raise
+            finally:
+                pool.release(pooled, discard=discard)
+
+        slow_query.log_plan(entry_id, name, kind, plans)
+    except Exception as exc:
+        slow_query.log_plan(entry_id, name, "error", [repr(exc)])
+    finally:
+        _plan_lock.release()
+
+
+# ============================================================
+# Estado del pool en cada lectura de /metrics
+# ============================================================
+def _pool_metrics():
+    pools = [("primary", DB.pool)]
+    if DB.read_pool is not None:
+        pools.append(("replica", DB.read_pool))
+    stats = [(name, pool.stats()) for name, pool in pools]
+
+    yield "db_pool_connections", "gauge", "Conexiones del pool por estado", {
+        (("pool", name), ("state", state)): s[state]
+        for name, s in stats
+        for state in ("idle", "in_use")
+    }
+    yield "db_pool_max_connections", "gauge", "Tamaño máximo del pool", {
+        (("pool", name),): s["max_size"] for name, s in stats
+    }
+    for key in (
+        "checkouts",
+        "created",
+        "closed",
+        "recycled",
+        "ping_failures",
+        "rollbacks",
+        "timeouts",
+    ):
+        yield f"db_pool_{key}_total", "counter", f"Pool: {key}", {
+            (("pool", name),): s[key] for name, s in stats
+        }
+
+
+registry.register_collector(_pool_metrics)
@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+class DBExecutor:
+    """
+    Executor dedicado para trabajo ODBC (pyodbc es bloqueante).
+
+    Separa la concurrencia contra la base de datos del threadpool de
+    Starlette: las rutas `async def` esperan aquí sin ocupar hilos del
+    servidor, y el número de hilos ODBC se ajusta con `DB_EXECUTOR_WORKERS`.
+    """
+
+    def __init__(self, max_workers: int, name: str = "odbc"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "queued": 0,
+            "active": 0,
+            "max_queued": 0,
+            "wait_time_total": 0.0,
+            "run_time_total": 0.0,
+        }
+
+    # ----------------------------------------
+    # API
+    # ----------------------------------------
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Encola `fn` conservando el contexto (contextvars) del llamador."""
+        ctx = contextvars.copy_context()
+        enqueued_at = time.monotonic()
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["queued"] += 1
+            if self._stats["queued"] > self._stats["max_queued"]:
+                self._stats["max_queued"] = self._stats["queued"]
+
+        def task():
+            started_at = time.monotonic()
+            with self._lock:
+                self._stats["queued"] -= 1
+                self._stats["active"] += 1
+                self._stats["wait_time_total"] += started_at - enqueued_at
+
+            ok = False
+            try:
+                result = ctx.run(fn, *args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._stats["active"] -= 1
+                    self._stats["completed" if ok else "failed"] += 1
+                    self._stats["run_time_total"] += time.monotonic() - started_at
+
+        future = self._executor.submit(task)
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Ejecuta `fn` en el executor y espera el resultado sin bloquear."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def iterate(self, iterator):
+        """
+        Recorre un iterador bloqueante (p. ej. `DB.stream`) avanzando cada
+        paso en el executor. Si el consumidor se detiene antes de agotarlo
+        (cliente desconectado), el iterador se cierra en el executor para
+        devolver su conexión al pool.
+        """
+        done = object()
+        future = None
+        try:
+            while True:
+                future = self.submit(next, iterator, done)
+                item = await asyncio.wrap_future(future)
+                if item is done:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                if future is None or future.done():
+                    self.submit(close)
+                else:
+                    # Aún avanza en otro hilo: se cierra al terminar ese paso
+                    future.add_done_callback(lambda _: self.submit(close))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max_workers": self.max_workers, **self._stats}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # ----------------------------------------
+    # Internos
+    # ----------------------------------------
+    def _on_done(self, future: Future):
+        # Cancelada antes de arrancar: nunca pasó por task()
+        if future.cancelled():
+            with self._lock:
+                self._stats["queued"] -= 1
+                self._stats["cancelled"] += 1
+
+
+db_executor = DBExecutor(max_workers=settings.DB_EXECUTOR_WORKERS)
+
+
+def _executor_metrics():
+    stats = db_executor.stats()
+    yield "db_executor_tasks", "gauge", "Tareas ODBC en cola y en ejecución", {
+        (("state", "queued"),): stats["queued"],
+        (("state", "active"),): stats["active"],
+    }
+    yield "db_executor_workers", "gauge", "Hilos del executor ODBC", {
+        (): stats["max_workers"]
+    }
+    for key in ("submitted", "completed", "failed", "cancelled"):
+        yield f"db_executor_{key}_total", "counter", f"Executor ODBC: {key}", {
+            (): stats[key]
+        }
+    yield "db_executor_wait_seconds_total", "counter", "Espera acumulada en cola", {
+        (): stats["wait_time_total"]
+    }
+
+
+registry.register_collector(_executor_metrics)
@@ -0,0 +1,198 @@
+# app/core/deadline.py
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.errors.errors import QueryTimeoutError
+
+# ============================================================
+# Presupuesto de tiempo por petición
+#
+# Cada petición HTTP recibe un plazo (REQUEST_DEADLINE_SECONDS; algunas
+# rutas lo cambian con `route_budget`). El plazo viaja en un contextvar
+# hasta los hilos ODBC (el executor copia el contexto) y DB lo convierte
+# en timeout de login, de espera por el pool y de la sentencia. Si el
+# cliente se desconecta, las lecturas en curso de esa petición se
+# cancelan con `cursor.cancel()` (las escrituras ya enviadas terminan) y
+# las sentencias siguientes fallan de inmediato.
+# ============================================================
+
+REQUEST_DISCONNECTS = registry.counter(
+    "http_requests_disconnected_total",
+    "Peticiones abandonadas por el cliente con consultas canceladas",
+)
+
+
+class RequestDeadline:
+    """Plazo y sentencias en curso de una petición."""
+
+    def __init__(self, seconds: Optional[float]):
+        self.started_at = time.monotonic()
+        self.deadline: Optional[float] = None
+        self.cancelled: Optional[str] = None
+        self._cursors = set()
+        self._lock = threading.Lock()
+        self.set_budget(seconds)
+
+    def set_budget(self, seconds: Optional[float]):
+        """Plazo total de la petición, contado desde su llegada (None/0: sin plazo)."""
+        self.deadline = self.started_at + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check(self):
+        """Lanza QueryTimeoutError si el plazo venció o la petición se canceló."""
+        if self.cancelled:
+            raise QueryTimeoutError(detail=self.cancelled)
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise QueryTimeoutError(
+                detail=f"Plazo de {self.deadline - self.started_at:.1f}s agotado"
+            )
+
+    def cancel(self, reason: str):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = reason
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception:
+                pass
+
+    @contextmanager
+    def track(self, cursor):
+        with self._lock:
+            self._cursors.add(cursor)
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                self._cursors.discard(cursor)
+
+
+_current: contextvars.ContextVar[Optional[RequestDeadline]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def current() -> Optional[RequestDeadline]:
+    return _current.get()
+
+
+def check():
+    request = _current.get()
+    if request is not None:
+        request.check()
+
+
+def remaining() -> Optional[float]:
+    request = _current.get()
+    return request.remaining() if request is not None else None
+
+
+def bounded(seconds: float) -> float:
+    """`seconds` acotado por lo que queda del plazo (mínimo 0)."""
+    left = remaining()
+    return seconds if left is None else max(0.0, min(seconds, left))
+
+
+def statement_timeout() -> int:
+    """Timeout de sentencia en segundos enteros (ODBC): plazo o DB_QUERY_TIMEOUT."""
+    left = remaining()
+    if left is None:
+        return settings.DB_QUERY_TIMEOUT
+    return max(1, math.ceil(min(left, settings.DB_QUERY_TIMEOUT or left)))
+
+
+@contextmanager
+def track(cursor):
+    request = _current.get()
+    if request is None:
+        yield cursor
+        return
+    with request.track(cursor):
+        yield cursor
+
+
+@contextmanager
+def detached():
+    """Trabajo de fondo disparado por una petición sin heredar su plazo."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def route_budget(seconds: float):
+    """Dependencia de FastAPI que cambia el plazo de una ruta (p. ej. exportar)."""
+
+    async def dependency():
+        request = _current.get()
+        if request is not None:
+            request.set_budget(seconds)
+
+    return dependency
+
+
+class DeadlineMiddleware:
+    """
+    Middleware ASGI que abre el plazo de cada petición y vigila la
+    desconexión del cliente. El cuerpo de la petición se lee completo al
+    inicio (son JSON pequeños) y se entrega igual a la app; desde ahí solo
+    este middleware escucha `receive` y reenvía el `http.disconnect`.
+    """
+
+    def __init__(self, app, seconds: Optional[float] = None):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestDeadline(self.seconds)
+        token = _current.set(request)
+
+        buffered = []
+        while True:
+            message = await receive()
+            buffered.append(message)
+            if message["type"] != "http.request" or not message.get("more_body", False):
+                break
+
+        async def watch():
+            message = await receive()
+            if message["type"] == "http.disconnect" and not finished:
+                REQUEST_DISCONNECTS.inc()
+                request.cancel("Cliente desconectado")
+            return message
+
+        finished = False
+        watcher = asyncio.create_task(watch())
+
+        async def replay():
+            if buffered:
+                return buffered.pop(0)
+            return await asyncio.shield(watcher)
+
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            finished = True
+            watcher.cancel()
+            _current.reset(token)
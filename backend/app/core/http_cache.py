@@ -0,0 +1,98 @@
+# app/core/http_cache.py
+
+import hashlib
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.core import content
+from app.core.config import settings
+
+# Sufijos que agrega CompressionMiddleware al ETag de un cuerpo comprimido
+_ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def _cache_headers(etag: str, vary: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": settings.HTTP_CACHE_CONTROL}
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+def _opaque(etag: str) -> str:
+    """ETag sin `W/` ni el sufijo de compresión (mismo contenido)."""
+    etag = etag.strip().removeprefix("W/")
+    for suffix in _ENCODING_SUFFIXES:
+        if etag.endswith(suffix + '"'):
+            return etag[: -len(suffix) - 1] + '"'
+    return etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Compara `etag` contra If-None-Match (comparación débil, RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    target = _opaque(etag)
+    for candidate in header.split(","):
+        if _opaque(candidate) == target:
+            return True
+    return False
+
+
+def not_modified(etag: str, vary: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=_cache_headers(etag, vary))
+
+
+def json_response(
+    request: Request,
+    data: Any,
+    response_type: Any,
+    etag: Optional[str] = None,
+    columnar: bool = False,
+) -> Response:
+    """
+    Serializa `data` como `response_type` una sola vez y responde con ETag.
+
+    Si `etag` viene dado (p. ej. la versión del snapshot del tablero) se
+    compara antes de serializar; si no, el ETag es el hash del cuerpo ya
+    serializado. En ambos casos un If-None-Match vigente devuelve 304.
+
+    Con `columnar=True` el formato se negocia con Accept (ver
+    `app/core/content.py`); sin Accept específico sigue siendo JSON.
+    """
+    media_type = content.negotiate(request) if columnar else content.JSON
+    vary = "Accept" if columnar else None
+
+    if etag is not None:
+        etag = content.etag_for(etag, media_type)
+        if etag_matches(request, etag):
+            return not_modified(etag, vary)
+
+    adapter = _adapter(response_type)
+    validated = adapter.validate_python(data, from_attributes=True)
+    if media_type == content.JSON:
+        body = adapter.dump_json(validated)
+    else:
+        body = content.encode(media_type, adapter.dump_python(validated, mode="json"))
+
+    if etag is None:
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if etag_matches(request, etag):
+            return not_modified(etag, vary)
+
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers=_cache_headers(etag, vary),
+    )
@@ -0,0 +1,45 @@
+# app/core/json_stream.py
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Iterable, Iterator
+
+
+# ============================================================
+# Codificación JSON directa (sin pasar por modelos pydantic)
+# Produce el mismo formato que la respuesta validada: fechas ISO 8601,
+# Decimal como número y texto en UTF-8.
+# ============================================================
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+_encoder = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=_default
+)
+
+
+def encode_items(items: list) -> bytes:
+    """Codifica una lista de dicts como elementos de un arreglo, sin corchetes."""
+    return _encoder.encode(items)[1:-1].encode()
+
+
+def json_array(chunks: Iterable[list]) -> Iterator[bytes]:
+    """
+    Convierte bloques de dicts en los fragmentos de un único arreglo JSON.
+    Cada bloque se codifica en una pasada; nunca se arma la lista completa.
+    """
+    yield b"["
+    first = True
+    for items in chunks:
+        if not items:
+            continue
+        body = encode_items(items)
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
@@ -0,0 +1,276 @@
+# app/core/metrics.py
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# ============================================================
+# Métricas en proceso con formato de exposición de Prometheus
+#
+# Cada hilo escribe en su propio "shard" (dict por hilo), así registrar
+# una observación no toma locks ni compite con otros hilos: el event loop
+# y cada hilo ODBC tienen el suyo. Al leer /metrics se suman los shards.
+# Las etiquetas son tuplas cortas de valores acotados (plantilla de ruta,
+# nombre de consulta), nunca la URL cruda.
+# ============================================================
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            # Solo la primera escritura de cada hilo toma el lock
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshot(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # copia: otro hilo puede agregar etiquetas mientras se lee
+        return [dict(shard) for shard in shards]
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _samples(self):
+        totals: Dict[tuple, float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        for labels, value in sorted(totals.items()):
+            yield f"{self.name}{self._labels(labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Como Counter pero admite bajar (p. ej. peticiones en curso)."""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [conteos por bucket..., +Inf], suma
+            state = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def _samples(self):
+        totals: Dict[tuple, list] = {}
+        for shard in self._snapshot():
+            for labels, (counts, total) in shard.items():
+                agg = totals.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+                agg[0] = [a + b for a, b in zip(agg[0], counts)]
+                agg[1] += total
+
+        for labels, (counts, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = self._labels(labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{self._labels(labels)} {_number(total)}"
+            yield f"{self.name}_count{self._labels(labels)} {cumulative}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+# ============================================================
+# Registro
+# ============================================================
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # Funciones que devuelven [(nombre, tipo, ayuda, {etiquetas: valor})]
+        # leídas en cada scrape (pool, executor, cache)
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[tuple]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        for collector in self._collectors:
+            for name, kind, help, values in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    label_text = (
+                        "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+                        if labels
+                        else ""
+                    )
+                    lines.append(f"{name}{label_text} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ============================================================
+# Métricas HTTP
+# ============================================================
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta",
+    ("method", "route"),
+)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total",
+    "Peticiones HTTP por ruta y código de estado",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "Peticiones HTTP en curso", ("method",)
+)
+WS_CONNECTIONS = registry.gauge(
+    "websocket_connections", "Conexiones WebSocket abiertas", ("route",)
+)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición: duración por plantilla de
+    ruta (`/api/calidad/item/{id}/`), código de estado y peticiones en
+    curso. Las rutas sin coincidencia se agrupan como `<sin_ruta>`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method)
+            route = _route(scope)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+
+    async def _websocket(self, scope, receive, send):
+        opened = False
+
+        async def send_tracking(message):
+            nonlocal opened
+            if message["type"] == "websocket.accept" and not opened:
+                opened = True
+                WS_CONNECTIONS.inc(_route(scope))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking)
+        finally:
+            if opened:
+                WS_CONNECTIONS.dec(_route(scope))
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<sin_ruta>"
@@ -0,0 +1,87 @@
+# app/core/pagination.py
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Tuple
+
+from app.errors.errors import ValidationError
+
+
+# ============================================================
+# Cursor opaco (base64 de JSON) para paginación por keyset
+# ============================================================
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(**values: Any) -> str:
+    payload = {key: _encode_value(value) for key, value in values.items()}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError(payload)
+        return {key: _decode_value(value) for key, value in payload.items()}
+    except Exception:
+        raise ValidationError(detail="Cursor de paginación inválido.")
+
+
+# ============================================================
+# SQL de keyset: orden estable (columna, id) con NULL al final
+# ============================================================
+def keyset_order(column: str, descending: bool, id_column: str = "id") -> str:
+    direction = "DESC" if descending else "ASC"
+    if column == id_column:
+        return f"{id_column} {direction}"
+    return (
+        f"CASE WHEN {column} IS NULL THEN 1 ELSE 0 END, "
+        f"{column} {direction}, {id_column} {direction}"
+    )
+
+
+def keyset_clause(
+    column: str,
+    descending: bool,
+    value: Any,
+    last_id: Any,
+    id_column: str = "id",
+) -> Tuple[str, tuple]:
+    """
+    Condición WHERE para las filas posteriores a (value, last_id) en el
+    orden de `keyset_order`. Devuelve (sql, parámetros).
+    """
+    op = "<" if descending else ">"
+
+    if column == id_column:
+        return f"{id_column} {op} ?", (last_id,)
+
+    if value is None:
+        # Ya estamos en la cola de NULLs: solo avanza el id
+        return f"({column} IS NULL AND {id_column} {op} ?)", (last_id,)
+
+    return (
+        f"({column} {op} ? OR ({column} = ? AND {id_column} {op} ?) "
+        f"OR {column} IS NULL)",
+        (value, value, last_id),
+    )
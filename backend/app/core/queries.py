@@ -0,0 +1,232 @@
+# app/core/queries.py
+
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import pyodbc
+
+from app.errors.errors import ValidationError
+
+# ============================================================
+# Catálogo de sentencias con nombre
+#
+# Cada sentencia se registra una vez con un nombre (el mismo de las
+# métricas, p. ej. "calidad.item") y una función que arma su SQL y los
+# tipos de sus parámetros a partir de las partes variables (columnas de
+# `fields`, filtros, tamaño de una lista IN). El resultado se guarda por
+# combinación de partes, así:
+#
+# - el texto SQL es idéntico byte a byte en cada ejecución y SQL Server
+#   reutiliza el plan;
+# - los parámetros se declaran siempre con el mismo tipo y largo
+#   (`cursor.setinputsizes`), en lugar del NVARCHAR(len(valor)) que
+#   pyodbc infiere de cada str, que fragmenta la caché de planes;
+# - cada variante lleva sus propias estadísticas (llamadas, tiempo,
+#   filas, errores) para perfilar las sentencias calientes una a una.
+#
+# `DB.run(nombre, params, *partes)` ejecuta por nombre.
+# ============================================================
+
+
+class SqlType(NamedTuple):
+    """Tipo ODBC de un parámetro: (sql_type, size, decimals) de setinputsizes."""
+
+    name: str
+    sql_type: int
+    size: int = 0
+    decimals: int = 0
+
+    @property
+    def input_size(self) -> Tuple[int, int, int]:
+        return (self.sql_type, self.size, self.decimals)
+
+    def fits(self, value: Any) -> bool:
+        """False si `value` es un texto más largo que el tipo declarado."""
+        return not (self.size and isinstance(value, str) and len(value) > self.size)
+
+
+INT = SqlType("INT", pyodbc.SQL_INTEGER)
+BIGINT = SqlType("BIGINT", pyodbc.SQL_BIGINT)
+DATETIME = SqlType("DATETIME", pyodbc.SQL_TYPE_TIMESTAMP, 23, 3)
+
+
+def VARCHAR(size: int = 0) -> SqlType:
+    """VARCHAR(size); sin tamaño, VARCHAR(MAX)."""
+    return SqlType(f"VARCHAR({size or 'MAX'})", pyodbc.SQL_VARCHAR, size)
+
+
+def NVARCHAR(size: int = 0) -> SqlType:
+    """NVARCHAR(size); sin tamaño, NVARCHAR(MAX)."""
+    return SqlType(f"NVARCHAR({size or 'MAX'})", pyodbc.SQL_WVARCHAR, size)
+
+
+# ============================================================
+# Listas IN de tamaño variable
+# El número de marcadores se redondea al siguiente escalón y el resto se
+# rellena con NULL (`x IN (..., NULL)` no coincide con nada): unas pocas
+# variantes de texto en lugar de una por cada largo de lista.
+# ============================================================
+IN_LIST_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def in_list_size(count: int) -> int:
+    for size in IN_LIST_BUCKETS:
+        if count <= size:
+            return size
+    return count
+
+
+def pad_in_list(values: Sequence[Any]) -> List[Any]:
+    return [*values, *([None] * (in_list_size(len(values)) - len(values)))]
+
+
+class StatementStats:
+    __slots__ = ("calls", "errors", "rows", "total", "max", "_lock")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, rows: int, error: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += error
+            self.rows += rows
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+
+class Rendered:
+    """Una variante concreta de una sentencia: SQL fijo, tipos y estadísticas."""
+
+    __slots__ = ("statement", "sql", "types", "variant", "input_sizes", "stats")
+
+    def __init__(self, statement: "Statement", sql: str, types: Sequence[SqlType]):
+        markers = sql.count("?")
+        if markers != len(types):
+            raise ValueError(
+                f"{statement.name}: {markers} marcadores y {len(types)} tipos"
+            )
+        self.statement = statement
+        self.sql = sql
+        self.types = tuple(types)
+        self.variant = hashlib.blake2b(sql.encode(), digest_size=4).hexdigest()
+        self.input_sizes = [t.input_size for t in self.types]
+        self.stats = StatementStats()
+
+    @property
+    def name(self) -> str:
+        return self.statement.name
+
+    def check(self, params: Sequence[Any]):
+        """
+        Valida que haya un parámetro por cada tipo declarado y, en las
+        escrituras, que ningún texto exceda el largo de su columna (la BD
+        lo rechazaría igual). En las lecturas un texto más largo solo deja
+        de coincidir: lo resuelve quien arma la consulta.
+        """
+        if len(params) != len(self.types):
+            raise ValueError(
+                f"{self.name}: {len(params)} parámetros para {len(self.types)} marcadores"
+            )
+        if self.statement.readonly:
+            return
+        for value, sql_type in zip(params, self.types):
+            if not sql_type.fits(value):
+                raise ValidationError(
+                    detail=f"Valor de más de {sql_type.size} caracteres."
+                )
+
+
+class Statement:
+    def __init__(
+        self,
+        name: str,
+        build: Callable[..., Tuple[str, Sequence[SqlType]]],
+        kind: str = "select",
+        readonly: bool = False,
+        max_variants: int = 256,
+    ):
+        self.name = name
+        self.kind = kind
+        self.readonly = readonly
+        self._build = build
+        self._max_variants = max_variants
+        self._variants: Dict[tuple, Rendered] = {}
+        self._render = lru_cache(maxsize=max_variants)(self._render_uncached)
+
+    def render(self, *parts) -> Rendered:
+        """Variante para `parts` (hashables: tuplas, no listas)."""
+        return self._render(*parts)
+
+    def variants(self) -> List[Rendered]:
+        return list(self._variants.values())
+
+    def _render_uncached(self, *parts) -> Rendered:
+        sql, types = self._build(*parts)
+        rendered = Rendered(self, sql, types)
+        key = (rendered.sql, rendered.types)
+        if key not in self._variants and len(self._variants) >= self._max_variants:
+            # Demasiadas combinaciones (p. ej. de `fields`): sin estadísticas
+            return rendered
+        # Mismo SQL desde otras partes: se comparten estadísticas
+        return self._variants.setdefault(key, rendered)
+
+
+class QueryCatalog:
+    def __init__(self):
+        self._statements: Dict[str, Statement] = {}
+
+    def statement(self, name: str, kind: str = "select", readonly: bool = False):
+        """Decorador: registra la función que arma el SQL de `name`."""
+        if kind not in ("select", "batch", "stream", "insert_returning", "update"):
+            raise ValueError(f"Tipo de sentencia desconocido: {kind}")
+
+        def register(build):
+            if name in self._statements:
+                raise ValueError(f"Sentencia duplicada: {name}")
+            self._statements[name] = Statement(name, build, kind, readonly)
+            return build
+
+        return register
+
+    def get(self, name: str) -> Statement:
+        try:
+            return self._statements[name]
+        except KeyError:
+            raise KeyError(f"Sentencia no registrada: {name}") from None
+
+    def stats(self, top: Optional[int] = None) -> List[dict]:
+        """Estadísticas por variante, de mayor a menor tiempo total."""
+        rows = []
+        for statement in self._statements.values():
+            for rendered in statement.variants():
+                s = rendered.stats
+                rows.append(
+                    {
+                        "name": statement.name,
+                        "variant": rendered.variant,
+                        "kind": statement.kind,
+                        "readonly": statement.readonly,
+                        "calls": s.calls,
+                        "errors": s.errors,
+                        "rows": s.rows,
+                        "total_ms": round(s.total * 1000, 2),
+                        "mean_ms": round(s.total * 1000 / s.calls, 3) if s.calls else None,
+                        "max_ms": round(s.max * 1000, 2),
+                        "params": [t.name for t in rendered.types],
+                        "sql": " ".join(rendered.sql.split()),
+                    }
+                )
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows[:top] if top else rows
+
+
+catalog = QueryCatalog()
@@ -0,0 +1,140 @@
+# app/core/read_pin.py
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.core.config import settings
+
+# ============================================================
+# Leer lo propio con réplica, por cliente
+#
+# Después de escribir, quien escribió lee de la primaria durante
+# DB_READ_PIN_SECONDS (la réplica puede ir atrasada). El pin viaja con el
+# cliente: la respuesta de una escritura fija la cookie `db_pin` (y el
+# encabezado `X-DB-Pin`) con el instante en que vence; en cada petición
+# ReadPinMiddleware lo lee y lo deja en un contextvar que DB consulta al
+# elegir réplica o primaria. Las lecturas de los demás clientes siguen
+# yendo a la réplica.
+#
+# Sin petición (calentamiento) o en lecturas compartidas entre clientes
+# (`shared()`, p. ej. la foto del tablero) DB usa el pin global del
+# proceso: la última escritura de cualquiera.
+#
+# El pin también indica cuándo escribió el cliente (`written_at`): con
+# varios workers la foto del tablero de otro proceso puede ser anterior a
+# esa escritura y se recarga antes de responderle.
+# ============================================================
+
+COOKIE = "db_pin"
+HEADER = "x-db-pin"
+
+
+class ReadPin:
+    """Pin de la petición en curso (`until`: epoch en que vence)."""
+
+    __slots__ = ("until", "wrote")
+
+    def __init__(self, until: float = 0.0):
+        self.until = until
+        self.wrote = False
+
+    def pinned(self) -> bool:
+        return time.time() < self.until
+
+    @property
+    def written_at(self) -> float:
+        """Epoch de la escritura que fijó el pin."""
+        return self.until - settings.DB_READ_PIN_SECONDS
+
+    def mark_write(self):
+        self.wrote = True
+        self.until = time.time() + settings.DB_READ_PIN_SECONDS
+
+
+_current: contextvars.ContextVar[Optional[ReadPin]] = contextvars.ContextVar(
+    "read_pin", default=None
+)
+
+
+def current() -> Optional[ReadPin]:
+    return _current.get()
+
+
+def wrote():
+    """Marca la escritura en la petición en curso (si hay)."""
+    pin = _current.get()
+    if pin is not None:
+        pin.mark_write()
+
+
+@contextmanager
+def shared():
+    """Lecturas compartidas entre clientes: usan el pin global del proceso."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _parse(value: str) -> float:
+    """Instante de vencimiento, acotado a DB_READ_PIN_SECONDS desde ahora."""
+    try:
+        until = float(value)
+    except ValueError:
+        return 0.0
+    return min(until, time.time() + settings.DB_READ_PIN_SECONDS)
+
+
+def _from_headers(headers) -> float:
+    for name, value in headers:
+        if name == HEADER.encode():
+            return _parse(value.decode("latin-1").strip())
+        if name == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                key, _, cookie = part.strip().partition("=")
+                if key == COOKIE:
+                    return _parse(cookie)
+    return 0.0
+
+
+class ReadPinMiddleware:
+    """
+    Middleware ASGI: abre el pin de cada petición HTTP a partir de la
+    cookie o el encabezado y, si la petición escribió, lo renueva en la
+    respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pin = ReadPin(_from_headers(scope["headers"]))
+        token = _current.set(pin)
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and pin.wrote:
+                value = f"{pin.until:.3f}"
+                max_age = max(1, round(settings.DB_READ_PIN_SECONDS))
+                headers = list(message.get("headers", []))
+                headers.append((HEADER.encode(), value.encode()))
+                headers.append(
+                    (
+                        b"set-cookie",
+                        f"{COOKIE}={value}; Max-Age={max_age}; Path=/; "
+                        "HttpOnly; SameSite=Lax".encode(),
+                    )
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,162 @@
+# app/core/slow_query.py
+
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from app.core.config import settings
+
+# ============================================================
+# Bitácora de consultas lentas
+#
+# Cada consulta de DB que supera DB_SLOW_QUERY_MS se escribe como una
+# línea JSON en un archivo rotativo local (DB_SLOW_QUERY_LOG), con el
+# tiempo separado en conexión / ejecución / lectura. Los parámetros se
+# registran redactados: solo tipo y tamaño, nunca el valor.
+# ============================================================
+
+logger = logging.getLogger("app.db.slow_queries")
+logger.propagate = False
+
+_setup_lock = threading.Lock()
+_configured = False
+
+
+class QueryTimer:
+    """Tiempos de una consulta por fase (segundos)."""
+
+    __slots__ = (
+        "name", "start", "end", "connect", "execute", "fetch", "rows", "pool", "_last"
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = self._last = time.perf_counter()
+        self.end = None
+        self.connect = self.execute = self.fetch = 0.0
+        self.rows = 0
+        # Pool (primaria o réplica) en que corrió; lo fija DB al conectar
+        self.pool = None
+
+    def mark(self, phase: str):
+        """Asigna a `phase` el tiempo transcurrido desde la marca anterior."""
+        now = time.perf_counter()
+        setattr(self, phase, getattr(self, phase) + now - self._last)
+        self._last = now
+
+    def stop(self):
+        self.end = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+def enabled() -> bool:
+    return settings.DB_SLOW_QUERY_MS > 0
+
+
+def is_slow(timer: QueryTimer) -> bool:
+    return enabled() and timer.total * 1000 >= settings.DB_SLOW_QUERY_MS
+
+
+def should_capture_plan() -> bool:
+    return (
+        settings.DB_SLOW_QUERY_PLAN in ("estimated", "actual")
+        and random.random() < settings.DB_SLOW_QUERY_PLAN_SAMPLE
+    )
+
+
+def redact(params: Sequence[Any]) -> list:
+    """Describe los parámetros sin exponer su valor: `str(12)`, `int`, `None`."""
+    result = []
+    for value in params or ():
+        if value is None:
+            result.append("None")
+        elif isinstance(value, (str, bytes)):
+            result.append(f"{type(value).__name__}({len(value)})")
+        else:
+            result.append(type(value).__name__)
+    return result
+
+
+def log_slow(
+    timer: QueryTimer,
+    query: str,
+    params: Sequence[Any],
+    error: Optional[BaseException] = None,
+) -> str:
+    """Escribe la consulta lenta y devuelve su id (para asociar el plan)."""
+    entry_id = uuid.uuid4().hex[:12]
+    _write(
+        {
+            "type": "slow_query",
+            "id": entry_id,
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "name": timer.name,
+            "total_ms": round(timer.total * 1000, 2),
+            "connect_ms": round(timer.connect * 1000, 2),
+            "execute_ms": round(timer.execute * 1000, 2),
+            "fetch_ms": round(timer.fetch * 1000, 2),
+            "rows": timer.rows,
+            "params": redact(params),
+            "error": repr(error) if error else None,
+            "sql": " ".join(query.split()),
+        }
+    )
+    return entry_id
+
+
+def log_plan(entry_id: str, name: str, kind: str, plans: Sequence[str]):
+    _write(
+        {
+            "type": "plan",
+            "id": entry_id,
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "name": name,
+            "kind": kind,
+            "plans": list(plans),
+        }
+    )
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return repr(value)
+
+
+def _write(entry: dict):
+    _configure()
+    logger.warning(json.dumps(entry, ensure_ascii=False, default=_default))
+
+
+def _configure():
+    global _configured
+    if _configured:
+        return
+    with _setup_lock:
+        if _configured:
+            return
+        path = Path(settings.DB_SLOW_QUERY_LOG)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=settings.DB_SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.DB_SLOW_QUERY_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        _configured = True
@@ -0,0 +1,96 @@
+# app/core/warmup.py
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# Calentamiento al arrancar
+#
+# Tras un reinicio la primera petición pagaba la apertura de conexiones,
+# la compilación de los planes en SQL Server y la carga del snapshot. Los
+# pasos registrados aquí se ejecutan en segundo plano al iniciar la app;
+# mientras no terminen, /health/ready responde 503 y el balanceador no
+# manda tráfico. Si un paso falla (BD caída) se reintenta con espera
+# creciente hasta lograrlo.
+# ============================================================
+
+
+class Warmup:
+    def __init__(self, retry_delay: float = 1.0, max_retry_delay: float = 30.0):
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._steps: List[Tuple[str, Callable[[], Awaitable]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+        self.done = False
+        self.attempts = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+    def add_step(self, name: str, step: Callable[[], Awaitable]):
+        self._steps.append((name, step))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task = self._task
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        return {
+            "done": self.done,
+            "attempts": self.attempts,
+            "duration_ms": (
+                round((self.finished_at - self.started_at) * 1000, 1)
+                if self.finished_at is not None
+                else None
+            ),
+            "steps_ms": dict(self.timings),
+            "last_error": self.last_error,
+        }
+
+    async def _run(self):
+        self.started_at = time.monotonic()
+        delay = self.retry_delay
+        while True:
+            self.attempts += 1
+            try:
+                for name, step in self._steps:
+                    start = time.perf_counter()
+                    await step()
+                    self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.last_error = repr(exc)
+                logger.warning(
+                    "Calentamiento fallido (intento %s), reintento en %.0fs: %r",
+                    self.attempts,
+                    delay,
+                    exc,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+        self.done = True
+        self.last_error = None
+        self.finished_at = time.monotonic()
+        logger.info("Calentamiento completo en %s", self.timings)
+
+
+warmup = Warmup()
@@ -17,4 +17,12 @@ ERROR_CATALOG = {
         "http_code": 401,
         "message": "No autorizado."
     },
+    "query_timeout": {
+        "http_code": 504,
+        "message": "La consulta tardó demasiado. Intenta de nuevo."
+    },
+    "service_unavailable": {
+        "http_code": 503,
+        "message": "El servicio está saturado. Intenta de nuevo en unos segundos."
+    },
 }
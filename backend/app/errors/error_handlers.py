@@ -20,11 +20,16 @@ def app_error_handler(request: Request, exc: AppError):
             }
         )
 
+    # Errores de saturación: el cliente sabe cuándo reintentar
+    retry_after = getattr(exc, "retry_after", None)
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+
     return JSONResponse(
         status_code=error_info["http_code"],
         content={
             "code": exc.code,
             "message": error_info["message"],
             "detail": exc.detail,
-        }
+        },
+        headers=headers,
     )
@@ -34,3 +34,16 @@ class UnauthorizedError(AppError):
     """Error: autenticación fallida."""
     def __init__(self, detail: Optional[str] = None):
         super().__init__("unauthorized", "No autorizado.", detail)
+
+
+class QueryTimeoutError(AppError):
+    """Error: la consulta superó el plazo de la petición o fue cancelada."""
+    def __init__(self, detail: Optional[str] = None):
+        super().__init__("query_timeout", "La consulta tardó demasiado.", detail)
+
+
+class ServiceUnavailableError(AppError):
+    """Error: la BD está saturada y la operación no se admitió."""
+    def __init__(self, detail: Optional[str] = None, retry_after: int = 1):
+        super().__init__("service_unavailable", "Servicio saturado.", detail)
+        self.retry_after = retry_after  # segundos (cabecera Retry-After)
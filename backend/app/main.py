@@ -1,6 +1,8 @@
 # main.py
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # Error system
@@ -10,8 +12,53 @@ from app.errors.error_handlers import app_error_handler
 # Settings
 from app.core.config import settings
 
+# Compresión
+from app.core.compression import CompressionMiddleware
+
+# Plazo por petición
+from app.core.deadline import DeadlineMiddleware
+
+# Leer lo propio con réplica
+from app.core.read_pin import ReadPinMiddleware
+
+# Métricas
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.core.queries import catalog
+
+# Ciclo de vida
+from app.core.db import DB
+from app.core.db_executor import db_executor
+from app.core.warmup import warmup
+
 # Routers (regístralos aquí)
-from app.modules.calidad.calidad_router import router as calidad_router
+from app.api.health_router import router as health_router
+from app.modules.calidad.calidad_router import (
+    broadcaster as calidad_broadcaster,
+    router as calidad_router,
+    service as calidad_service,
+)
+
+
+# ============================================================
+# Arranque y apagado
+# - Al arrancar: abre el pool y ejecuta las consultas calientes del
+#   tablero en segundo plano (/health/ready da 503 hasta terminar).
+# - Al apagar: cierra los WebSocket del tablero, deja de aceptar
+#   consultas en el executor y cierra las conexiones libres.
+# ============================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.STARTUP_WARMUP:
+        warmup.start()
+    else:
+        warmup.done = True
+    try:
+        yield
+    finally:
+        await warmup.stop()
+        await calidad_broadcaster.stop()
+        db_executor.shutdown(wait=False)
+        DB.close_pools()
 
 
 def create_app() -> FastAPI:
@@ -19,13 +66,45 @@ def create_app() -> FastAPI:
         title=settings.PROJECT_NAME,
         version=settings.VERSION,
         description="API Backend Tablero HYP Calidad",
+        lifespan=lifespan,
     )
 
+    # ============================================================
+    # Calentamiento (en orden)
+    # ============================================================
+    warmup.add_step("db.pool", lambda: db_executor.run(DB.fill_pools))
+    warmup.add_step("calidad", calidad_service.calentar)
+
     # ============================================================
     # Error Handlers
     # ============================================================
     app.add_exception_handler(AppError, app_error_handler)
 
+    # ============================================================
+    # Plazo por petición y cancelación al desconectarse el cliente
+    # (la más interna: el contextvar llega tal cual a la ruta)
+    # ============================================================
+    app.add_middleware(DeadlineMiddleware, seconds=settings.REQUEST_DEADLINE_SECONDS)
+
+    # ============================================================
+    # Pin por cliente tras escribir: sus lecturas van a la primaria (con
+    # réplica) y la foto del tablero de cualquier worker se recarga si es
+    # anterior a su escritura (con cache)
+    # ============================================================
+    if settings.DB_READ_SERVER or settings.BOARD_CACHE_TTL > 0:
+        app.add_middleware(ReadPinMiddleware)
+
+    # ============================================================
+    # Compresión gzip/brotli (comprime el cuerpo final)
+    # ============================================================
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        )
+
     # ============================================================
     # CORS
     # ============================================================
@@ -35,25 +114,54 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Encabezados que el front necesita leer (caché y paginación)
+        expose_headers=[
+            "ETag",
+            "X-Total-Count",
+            "X-Has-More",
+            "X-Next-Cursor",
+            "X-DB-Pin",
+        ],
     )
 
+    # ============================================================
+    # Métricas (latencia por ruta, estados, peticiones en curso)
+    # Se agrega al final para que envuelva también a CORS
+    # ============================================================
+    app.add_middleware(MetricsMiddleware)
+
     # ============================================================
     # Routers
     # ============================================================
     router_prefix = "/api"
     app.include_router(calidad_router, prefix=router_prefix)
+    app.include_router(health_router)
 
     # ============================================================
-    # Root endpoint (healthcheck)
+    # Root endpoint (información; para el balanceador usar /health/ready)
     # ============================================================
     @app.get("/")
-    def root():
+    async def root():
         return {
             "status": "ok",
             "project": settings.PROJECT_NAME,
             "version": settings.VERSION,
         }
 
+    # ============================================================
+    # Métricas en formato Prometheus
+    # ============================================================
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    # ============================================================
+    # Estadísticas por sentencia del catálogo (las de más tiempo total)
+    # ============================================================
+    @app.get("/metrics/statements", include_in_schema=False)
+    async def metrics_statements(top: int = 50):
+        return catalog.stats(top)
+
     return app
 
 
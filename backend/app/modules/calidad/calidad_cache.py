@@ -0,0 +1,438 @@
+# app/modules/calidad/calidad_cache.py
+
+import contextlib
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core import deadline, read_pin
+from app.core.admission import admission
+from app.core.db_executor import DBExecutor, db_executor
+
+from .calidad_model import CalidadModel
+
+logger = logging.getLogger(__name__)
+
+
+class BoardSnapshot:
+    """
+    Foto inmutable de v_validad_hyp (fase de calidad + fase previa) con
+    índices por id e id_hd. `board` son las filas de la fase de calidad,
+    ordenadas por id. Nunca se modifica: los parches crean una nueva.
+
+    `loaded_at` es el reloj monótono de la carga (antigüedad) y
+    `loaded_wall` el epoch en que empezó (comparable con el pin de un
+    cliente, que viene de otro proceso).
+    """
+
+    __slots__ = ("rows", "board", "by_id", "by_hd", "loaded_at", "loaded_wall", "_digest")
+
+    def __init__(
+        self,
+        rows: List[CalidadModel],
+        board_fase_id: int,
+        loaded_at: float,
+        loaded_wall: float = 0.0,
+    ):
+        self.rows = rows
+        self.loaded_at = loaded_at
+        self.loaded_wall = loaded_wall
+        self._digest: Optional[str] = None
+        self.board: List[CalidadModel] = []
+        self.by_id: Dict[int, CalidadModel] = {}
+        self.by_hd: Dict[int, List[CalidadModel]] = {}
+        for row in rows:
+            self.by_id[row.id] = row
+            self.by_hd.setdefault(row.id_hd, []).append(row)
+            if row.id_fase == board_fase_id:
+                self.board.append(row)
+        # El orden de la vista no está definido; ordenado, el mismo tablero
+        # serializa igual en cualquier proceso
+        self.board.sort(key=lambda row: row.id)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+    @property
+    def digest(self) -> str:
+        """
+        Huella del contenido del tablero. Depende solo de los datos: dos
+        procesos con las mismas filas dan la misma. Se calcula una vez.
+        """
+        if self._digest is None:
+            h = hashlib.blake2b(digest_size=8)
+            for row in self.board:
+                h.update(repr(tuple(row.__dict__.values())).encode())
+            self._digest = h.hexdigest()
+        return self._digest
+
+
+class CalidadBoardCache:
+    """
+    Cache en proceso del tablero de calidad.
+
+    - Dentro de `ttl` la foto se sirve tal cual.
+    - Entre `ttl` y `ttl + stale_ttl` se sirve la foto vieja y se refresca
+      en segundo plano (stale-while-revalidate).
+    - Más allá, el lector recarga de forma síncrona (una sola carga aunque
+      haya varios lectores esperando).
+    - Si la carga supera `max_rows` no se guarda, para acotar la memoria.
+
+    Las escrituras del servicio parchean (`patch_many`) o invalidan
+    (`invalidate`) la foto en el momento. Con varios procesos la escritura
+    pudo ocurrir en otro: si el cliente trae un pin (`read_pin`) posterior
+    a la carga de la foto, se recarga antes de responderle, así nadie lee
+    datos anteriores a su propia escritura.
+
+    Cada vez que cambia el tablero (carga o parche) se anotan en una
+    bitácora acotada los ids que entraron, cambiaron o salieron, con una
+    versión creciente. `changes_since` responde los cambios posteriores a
+    una versión sin tocar la base de datos.
+
+    La versión es del proceso; hacia afuera (ETag y token de `/cambios/`)
+    se usa la huella del contenido (`BoardSnapshot.digest`), válida en
+    cualquier proceso. `token()` recuerda qué versión tenía cada huella
+    entregada para poder responder deltas desde ella.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[CalidadModel]],
+        board_fase_id: int,
+        ttl: float,
+        stale_ttl: float,
+        max_rows: int,
+        max_changes: int = 10000,
+        max_tokens: int = 1024,
+        executor: DBExecutor = db_executor,
+    ):
+        self._loader = loader
+        self.board_fase_id = board_fase_id
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_rows = max_rows
+        self.max_changes = max_changes
+        self.max_tokens = max_tokens
+        self._executor = executor
+
+        self._snapshot: Optional[BoardSnapshot] = None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Cambia con cada escritura; una carga iniciada antes no se instala
+        self._generation = 0
+
+        # Bitácora de cambios del tablero: (versión, id)
+        self.version = 0
+        self._changes = deque()
+        # Versión más antigua desde la que aún se puede responder un delta
+        self._floor = 0
+        # Huellas entregadas -> versión (las más recientes al final)
+        self._tokens: Dict[str, int] = {}
+        self._listeners: List[Callable[[int], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    # ----------------------------------------
+    # Lectura
+    # ----------------------------------------
+    def get(self) -> BoardSnapshot:
+        snapshot = self._snapshot
+        written_at = self._written_at()
+        if snapshot is not None and snapshot.loaded_wall >= written_at:
+            age = snapshot.age
+            if age < self.ttl:
+                return snapshot
+            if age < self.ttl + self.stale_ttl:
+                self._refresh_in_background()
+                return snapshot
+
+        return self._load_sync(written_at)
+
+    def get_versioned(self) -> Tuple[BoardSnapshot, Optional[int]]:
+        """
+        Foto vigente y su versión. La versión es None si la foto devuelta no
+        es la publicada (carga no cacheada o pisada por una escritura).
+        """
+        snapshot = self.get()
+        with self._lock:
+            if snapshot is self._snapshot:
+                return snapshot, self.version
+            return snapshot, None
+
+    def servable(self) -> bool:
+        """True si get() responde desde memoria, sin consultar la BD."""
+        snapshot = self._snapshot
+        return (
+            snapshot is not None
+            and snapshot.age < self.ttl + self.stale_ttl
+            and snapshot.loaded_wall >= self._written_at()
+        )
+
+    @staticmethod
+    def _written_at() -> float:
+        """Epoch de la última escritura del cliente en curso (0 si no tiene pin)."""
+        pin = read_pin.current()
+        if pin is None or not pin.pinned():
+            return 0.0
+        return pin.written_at
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        age = snapshot.age if snapshot is not None else None
+        # invalidate() deja la foto con antigüedad infinita
+        invalidated = age == float("inf")
+        return {
+            "enabled": self.enabled,
+            "loaded": snapshot is not None,
+            "invalidated": invalidated,
+            "age_s": None if age is None or invalidated else round(age, 3),
+            "fresh": age is not None and age < self.ttl,
+            "rows": len(snapshot.rows) if snapshot is not None else 0,
+            "version": self.version,
+            "digest": snapshot.digest if snapshot is not None else None,
+            "refreshing": self._refreshing,
+        }
+
+    def changes_since(
+        self, since: Optional[int]
+    ) -> Tuple[int, bool, List[CalidadModel], List[int]]:
+        """
+        Cambios del tablero posteriores a la versión `since`.
+
+        Devuelve `(version, completo, filas, ids_eliminados)`. Si `since`
+        es None o ya salió de la bitácora, `completo` es True y `filas`
+        es el tablero entero.
+        """
+        _, version, completo, rows, removed = self._changes_since(since)
+        return version, completo, rows, removed
+
+    def changes_since_token(
+        self, token: Optional[str]
+    ) -> Tuple[str, bool, List[CalidadModel], List[int]]:
+        """
+        Igual que `changes_since`, pero desde una huella (`token()`) que
+        pudo entregar otro proceso. Devuelve la huella del tablero actual.
+        """
+        since = self._version_of(token) if token else None
+        snapshot, version, completo, rows, removed = self._changes_since(since)
+        # Solo si sigue publicada: cada instalación crea una foto nueva
+        published = version if snapshot is self._snapshot else None
+        return self.token(snapshot, published), completo, rows, removed
+
+    def token(self, snapshot: BoardSnapshot, version: Optional[int]) -> str:
+        """
+        Huella de `snapshot` para ETag y delta-sync. Si es la foto publicada
+        (`version` no es None) se recuerda su versión.
+        """
+        digest = snapshot.digest
+        if version is not None:
+            with self._lock:
+                self._remember(digest, version)
+        return digest
+
+    def _version_of(self, token: str) -> Optional[int]:
+        with self._lock:
+            version = self._tokens.get(token)
+            snapshot = self._snapshot
+            current = self.version
+        if version is not None or snapshot is None:
+            return version
+        # Huella de otro proceso: sirve si describe el tablero que hay aquí
+        if snapshot.digest != token:
+            return None
+        with self._lock:
+            self._remember(token, current)
+        return current
+
+    def _remember(self, digest: str, version: int):
+        # Con lock. La misma huella en otra versión (volvió al mismo
+        # contenido) se queda con la más reciente: el delta es el mismo
+        self._tokens.pop(digest, None)
+        if len(self._tokens) >= self.max_tokens:
+            del self._tokens[next(iter(self._tokens))]
+        self._tokens[digest] = version
+
+    def _changes_since(self, since: Optional[int]):
+        snapshot = self.get()
+        with self._lock:
+            snapshot = self._snapshot or snapshot
+            version = self.version
+
+            if since is None or since < self._floor or since > version:
+                return snapshot, version, True, list(snapshot.board), []
+
+            ids = set()
+            for change_version, id in reversed(self._changes):
+                if change_version <= since:
+                    break
+                ids.add(id)
+
+        board_by_id = {row.id: row for row in snapshot.board}
+        rows = [board_by_id[id] for id in sorted(ids) if id in board_by_id]
+        removed = sorted(id for id in ids if id not in board_by_id)
+        return snapshot, version, False, rows, removed
+
+    def add_listener(self, callback: Callable[[int], None]):
+        """
+        Registra `callback(version)`, invocado cada vez que cambia el
+        tablero. Se llama con el lock tomado: debe ser inmediato (p. ej.
+        `loop.call_soon_threadsafe`).
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[int], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    # ----------------------------------------
+    # Escrituras
+    # ----------------------------------------
+    def patch_many(self, changes: List[Tuple[CalidadModel, bool]]):
+        """
+        Reemplaza (o agrega) cada fila `(model, keep)` en una sola foto
+        nueva. Con `keep=False` la quita, p. ej. cuando el registro salió de
+        las fases cacheadas.
+        """
+        with self._lock:
+            self._generation += 1
+            snapshot = self._snapshot
+            if snapshot is None or not changes:
+                return
+
+            replaced = {model.id: (model, keep) for model, keep in changes}
+            rows = [row for row in snapshot.rows if row.id not in replaced]
+            rows.extend(model for model, keep in replaced.values() if keep)
+            self._install(
+                BoardSnapshot(
+                    rows, self.board_fase_id, snapshot.loaded_at, snapshot.loaded_wall
+                ),
+                candidates=list(replaced),
+            )
+
+    def invalidate(self):
+        """Vence la foto: el siguiente lector recarga de forma síncrona."""
+        with self._lock:
+            self._generation += 1
+            snapshot = self._snapshot
+            if snapshot is not None:
+                # Se conserva como base para calcular la bitácora
+                self._snapshot = BoardSnapshot(
+                    snapshot.rows, self.board_fase_id, float("-inf"), snapshot.loaded_wall
+                )
+
+    # ----------------------------------------
+    # Carga
+    # ----------------------------------------
+    def _load_sync(self, written_at: float = 0.0) -> BoardSnapshot:
+        # Sin cupo de petición (tablero servido desde memoria que venció
+        # justo antes) la carga usa el carril de fondo. Siempre el cupo
+        # antes que `_load_lock`, igual que el refresco
+        with admission.background(), self._load_lock:
+            # Otro lector pudo haber cargado mientras esperábamos el lock
+            snapshot = self._snapshot
+            if (
+                snapshot is not None
+                and snapshot.age < self.ttl
+                and snapshot.loaded_wall >= written_at
+            ):
+                return snapshot
+            return self._load(pinned=written_at > 0)
+
+    def _load(self, pinned: bool = False) -> BoardSnapshot:
+        generation = self._generation
+        started = time.time()
+        # La foto es de todos: se lee con el pin global, no con el del
+        # cliente que disparó la carga. Salvo si la pide quien acaba de
+        # escribir (quizá en otro proceso): con su pin lee de la primaria
+        with contextlib.nullcontext() if pinned else read_pin.shared():
+            rows = self._loader()
+        snapshot = BoardSnapshot(rows, self.board_fase_id, time.monotonic(), started)
+
+        if len(rows) > self.max_rows:
+            logger.warning(
+                "Tablero con %s filas supera BOARD_CACHE_MAX_ROWS=%s; no se cachea",
+                len(rows),
+                self.max_rows,
+            )
+            return snapshot
+
+        with self._lock:
+            # Una escritura ocurrió durante la carga: la foto podría no
+            # incluirla, se deja que el siguiente lector recargue
+            if generation == self._generation:
+                self._install(snapshot)
+        return snapshot
+
+    def _install(self, snapshot: BoardSnapshot, candidates: Optional[List[int]] = None):
+        """
+        Publica `snapshot` y anota en la bitácora lo que cambió (con lock).
+        `candidates` son los únicos ids que pueden haber cambiado (parches):
+        se comparan solo esos en lugar del tablero completo.
+        """
+        previous = self._snapshot
+        self._snapshot = snapshot
+
+        if previous is None:
+            # Primera carga: ningún delta anterior es válido
+            self.version += 1
+            self._floor = self.version
+            return
+
+        if candidates is not None:
+            changed = [
+                id
+                for id in candidates
+                if self._board_row(previous, id) != self._board_row(snapshot, id)
+            ]
+        else:
+            before = {row.id: row for row in previous.board}
+            after = {row.id: row for row in snapshot.board}
+            changed = [id for id, row in after.items() if before.get(id) != row]
+            changed.extend(id for id in before if id not in after)
+        if not changed:
+            return
+
+        self.version += 1
+        for id in changed:
+            if len(self._changes) >= self.max_changes:
+                dropped_version, _ = self._changes.popleft()
+                self._floor = max(self._floor, dropped_version)
+            self._changes.append((self.version, id))
+
+        for callback in list(self._listeners):
+            try:
+                callback(self.version)
+            except Exception:
+                logger.exception("Error notificando cambio del tablero")
+
+    def _board_row(self, snapshot: BoardSnapshot, id: int) -> Optional[CalidadModel]:
+        row = snapshot.by_id.get(id)
+        return row if row is not None and row.id_fase == self.board_fase_id else None
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                # No cuenta el cupo de la petición que lo disparó
+                with admission.background(detached=True), self._load_lock:
+                    self._load()
+            except Exception:
+                logger.exception("Error refrescando el tablero de calidad")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        # El refresco es compartido: no hereda el plazo de la petición que lo disparó
+        with deadline.detached():
+            self._executor.submit(refresh)
@@ -0,0 +1,374 @@
+# app/modules/calidad/calidad_queries.py
+
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.pagination import keyset_clause, keyset_order
+from app.core.queries import INT, SqlType, catalog
+
+from .calidad_schema import (
+    CALIDAD_COLUMNS,
+    CALIDAD_SELECT,
+    CALIDAD_TYPES,
+    COMENTARIO_SELECT,
+    COMENTARIO_TYPES,
+    CalidadSchema,
+    ComentarioSchema,
+)
+
+# ============================================================
+# Sentencias del módulo de calidad (catálogo de app/core/queries.py)
+#
+# Cada función recibe las partes variables de la consulta y devuelve
+# (sql, tipos de los parámetros). Las partes deben ser hashables: `fields`
+# y los filtros viajan como tuplas (o None). El servicio ejecuta con
+# `db.run(nombre, params, partes)`.
+# ============================================================
+Fields = Optional[Tuple[str, ...]]
+
+
+def _filtros(filtros: Sequence[str]) -> Tuple[List[str], List[SqlType]]:
+    """WHERE de la fase más los filtros de igualdad, con sus tipos."""
+    where = ["idTecnicoAsi = ?"]
+    types = [INT]
+    for filtro in filtros:
+        where.append(f"{CALIDAD_COLUMNS[filtro]} = ?")
+        types.append(CALIDAD_TYPES[filtro])
+    return where, types
+
+
+# ============================================================
+# Lecturas de v_validad_hyp
+# ============================================================
+@catalog.statement("calidad.tablero", readonly=True)
+def tablero():
+    return (
+        f"""
+        SELECT {CALIDAD_SELECT}
+        FROM v_validad_hyp
+        WHERE idTecnicoAsi IN (?, ?)
+        """,
+        [INT, INT],
+    )
+
+
+@catalog.statement("calidad.en_fase", readonly=True)
+def en_fase(fields: Fields):
+    return (
+        f"""
+        SELECT {CalidadSchema.select_list(fields)}
+        FROM v_validad_hyp
+        WHERE idTecnicoAsi = ?
+        """,
+        [INT],
+    )
+
+
+@catalog.statement("calidad.buscar", kind="batch", readonly=True)
+def buscar(
+    fields: Fields,
+    filtros: Tuple[str, ...],
+    campo: str,
+    descendente: bool,
+    posicion: Optional[str],
+):
+    """
+    Total y página del listado. `posicion` es el tipo de cursor: None
+    (primera página), "null" (el último valor de orden fue NULL) o "value".
+    """
+    where, types = _filtros(filtros)
+    count_where = " AND ".join(where)
+    page_types = list(types)
+
+    columna = CALIDAD_COLUMNS[campo]
+    if posicion is not None:
+        clause, clause_params = keyset_clause(
+            columna, descendente, None if posicion == "null" else posicion, 0
+        )
+        where.append(clause)
+        # Los parámetros del keyset son valores de orden y al final el id
+        page_types += [CALIDAD_TYPES[campo]] * (len(clause_params) - 1) + [INT]
+
+    # La página necesita id y la columna de orden para el siguiente cursor
+    columnas = CalidadSchema.select_list(
+        None if fields is None else [*fields, "id", campo]
+    )
+    return (
+        f"""
+        SELECT COUNT(*) AS total
+        FROM v_validad_hyp
+        WHERE {count_where};
+
+        SELECT TOP (?) {columnas}
+        FROM v_validad_hyp
+        WHERE {" AND ".join(where)}
+        ORDER BY {keyset_order(columna, descendente)};
+        """,
+        [*types, INT, *page_types],
+    )
+
+
+@catalog.statement("calidad.exportar", kind="stream", readonly=True)
+def exportar(fields: Fields, filtros: Tuple[str, ...], campo: str, descendente: bool):
+    where, types = _filtros(filtros)
+    return (
+        f"""
+        SELECT {CalidadSchema.select_list(fields)}
+        FROM v_validad_hyp
+        WHERE {" AND ".join(where)}
+        ORDER BY {keyset_order(CALIDAD_COLUMNS[campo], descendente)}
+        """,
+        types,
+    )
+
+
+@catalog.statement("calidad.vehiculo", readonly=True)
+def vehiculo(fields: Fields):
+    return (
+        f"""
+        SELECT {CalidadSchema.select_list(fields)}
+        FROM v_validad_hyp
+        WHERE id_hd = ? AND idTecnicoAsi = ?
+        """,
+        [INT, INT],
+    )
+
+
+@catalog.statement("calidad.item", readonly=True)
+def item(fields: Fields):
+    return (
+        f"""
+        SELECT {CalidadSchema.select_list(fields)}
+        FROM v_validad_hyp
+        WHERE id = ?
+        """,
+        [INT],
+    )
+
+
+@catalog.statement("calidad.vehiculo_info", readonly=True)
+def vehiculo_info(fields: Fields):
+    return (
+        f"""
+        SELECT {CalidadSchema.select_list(fields)}
+        FROM v_validad_hyp
+        WHERE id_hd = ? AND (idTecnicoAsi = ? OR idTecnicoAsi = ?)
+        """,
+        [INT, INT, INT],
+    )
+
+
+@catalog.statement("calidad.detalle", kind="batch", readonly=True)
+def detalle(fields: Fields):
+    """
+    Ficha del vehículo en un solo viaje: registros en fase de calidad,
+    registro de la fase previa (o de calidad) y comentarios de sus idChip.
+    """
+    columnas = CalidadSchema.select_list(fields)
+    return (
+        f"""
+        SELECT {columnas}
+        FROM v_validad_hyp
+        WHERE id_hd = ? AND idTecnicoAsi = ?;
+
+        SELECT TOP (1) {columnas}
+        FROM v_validad_hyp
+        WHERE id_hd = ? AND (idTecnicoAsi = ? OR idTecnicoAsi = ?);
+
+        SELECT {COMENTARIO_SELECT}
+        FROM TYT_LV_TBL_CONTROL_CITAS_COM
+        WHERE idChip IN (
+            SELECT idChip
+            FROM v_validad_hyp
+            WHERE id_hd = ? AND idTecnicoAsi = ?
+        )
+        ORDER BY idChip, fecha ASC, idLinea ASC;
+        """,
+        [INT] * 7,
+    )
+
+
+# ============================================================
+# Comentarios
+# ============================================================
+@catalog.statement("comentarios.por_chip", readonly=True)
+def comentarios_por_chip():
+    return (
+        f"""
+        SELECT {COMENTARIO_SELECT}
+        FROM TYT_LV_TBL_CONTROL_CITAS_COM
+        WHERE idChip = ?
+        ORDER BY fecha ASC, idLinea ASC
+        """,
+        [INT],
+    )
+
+
+@catalog.statement("comentarios.lote", readonly=True)
+def comentarios_lote(bucket: int, ultimos: bool):
+    """`bucket` marcadores en el IN (ver `pad_in_list`); con `ultimos`, un INT más."""
+    placeholders = ", ".join("?" for _ in range(bucket))
+    if not ultimos:
+        return (
+            f"""
+            SELECT {COMENTARIO_SELECT}
+            FROM TYT_LV_TBL_CONTROL_CITAS_COM
+            WHERE idChip IN ({placeholders})
+            ORDER BY idChip, fecha ASC, idLinea ASC
+            """,
+            [INT] * bucket,
+        )
+    return (
+        f"""
+        SELECT {ComentarioSchema.select_list("t")}
+        FROM (
+            SELECT
+                {ComentarioSchema.select_list("com")},
+                ROW_NUMBER() OVER (
+                    PARTITION BY com.idChip
+                    ORDER BY com.fecha DESC, com.idLinea DESC
+                ) AS rn
+            FROM TYT_LV_TBL_CONTROL_CITAS_COM com
+            WHERE com.idChip IN ({placeholders})
+        ) t
+        WHERE t.rn <= ?
+        ORDER BY t.idChip, t.fecha ASC, t.idLinea ASC
+        """,
+        [INT] * (bucket + 1),
+    )
+
+
+# Una sola sentencia: calcula idLinea, inserta y devuelve la fila.
+# UPDLOCK + HOLDLOCK bloquea el rango del idChip hasta el final de la
+# sentencia, así dos comentarios simultáneos no repiten idLinea.
+@catalog.statement("comentarios.insertar", kind="insert_returning")
+def comentarios_insertar():
+    return (
+        """
+        INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM
+        (idChip, fecha, Status, cveUsuario, idLinea, Comentario)
+        OUTPUT
+            INSERTED.idChip, INSERTED.fecha, INSERTED.Status,
+            INSERTED.cveUsuario, INSERTED.idLinea, INSERTED.Comentario
+        SELECT ?, GETDATE(), ?, ?, ISNULL(MAX(idLinea), 0) + 1, ?
+        FROM TYT_LV_TBL_CONTROL_CITAS_COM WITH (UPDLOCK, HOLDLOCK)
+        WHERE idChip = ?
+        """,
+        [
+            INT,
+            COMENTARIO_TYPES["status"],
+            COMENTARIO_TYPES["cve_usuario"],
+            COMENTARIO_TYPES["comentario"],
+            INT,
+        ],
+    )
+
+
+# ============================================================
+# Transiciones: un solo batch y una sola transacción
+# Lee los idChip de todos los ids, aplica un UPDATE condicional
+# (set-based), inserta los comentarios automáticos y devuelve los
+# registros finales. El UPDATE condicional impide que dos clics
+# simultáneos inicien o finalicen dos veces el mismo registro.
+# La lista de ids se rellena con NULL hasta `bucket` (se descartan al
+# cargar @ids).
+# SET XACT_ABORT ON: si el cliente corta el batch (timeout o desconexión)
+# o un error no pasa por el CATCH, el servidor revierte la transacción
+# entera en lugar de dejarla abierta. La opción queda activa en la
+# sesión, lo que es inocuo para el resto de las sentencias; el pool
+# revierte además cualquier transacción que vuelva abierta tras un error.
+# ============================================================
+TRANSICIONES = {
+    "iniciar": {
+        "set": "fecha_Hora_ini_Oper = GETDATE(), Status = 'INICIADA'",
+        "where": "c.fecha_Hora_ini_Oper IS NULL",
+        "status": "INICIADA",
+        "error": "No se pudo iniciar la calidad",
+    },
+    "finalizar": {
+        "set": (
+            "Fecha_Hora_Fin_Oper = GETDATE(), Status = 'TERMINADO', "
+            "Status_OS = @status_os"
+        ),
+        "where": (
+            "c.fecha_Hora_ini_Oper IS NOT NULL "
+            "AND c.Fecha_Hora_Fin_Oper IS NULL"
+        ),
+        "status": "TERMINADO",
+        "error": "No se pudo finalizar la calidad",
+    },
+}
+
+
+# Variables del batch con el tipo de la columna que reciben
+_USUARIO = COMENTARIO_TYPES["cve_usuario"]
+_COMENTARIO = COMENTARIO_TYPES["comentario"]
+_STATUS_OS = CALIDAD_TYPES["status_os"]
+
+
+def _transicion(accion: str):
+    spec = TRANSICIONES[accion]
+
+    def build(bucket: int):
+        query = f"""
+        SET XACT_ABORT ON;
+
+        DECLARE @usuario {_USUARIO.name} = ?;
+        DECLARE @comentario {_COMENTARIO.name} = ?;
+        DECLARE @status_os {_STATUS_OS.name} = ?;
+        DECLARE @ids TABLE (id INT PRIMARY KEY);
+        DECLARE @chips TABLE (id INT PRIMARY KEY, idChip INT);
+        DECLARE @done TABLE (id INT PRIMARY KEY, idChip INT NOT NULL);
+
+        INSERT INTO @ids (id)
+        SELECT DISTINCT v.id
+        FROM (VALUES {", ".join("(?)" for _ in range(bucket))}) v(id)
+        WHERE v.id IS NOT NULL;
+
+        BEGIN TRY
+            BEGIN TRAN;
+
+            INSERT INTO @chips (id, idChip)
+            SELECT v.id, MAX(v.idChip)
+            FROM v_validad_hyp v
+            JOIN @ids i ON i.id = v.id
+            GROUP BY v.id;
+
+            UPDATE c
+            SET {spec["set"]}
+            OUTPUT INSERTED.id, ch.idChip INTO @done (id, idChip)
+            FROM TYT_LV_TBL_CONTROL_CITAS c
+            JOIN @chips ch ON ch.id = c.id
+            WHERE ch.idChip IS NOT NULL AND {spec["where"]};
+
+            INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM
+            (idChip, fecha, Status, cveUsuario, idLinea, Comentario)
+            SELECT d.idChip, GETDATE(), '{spec["status"]}', @usuario,
+                   ISNULL(m.maxLinea, 0)
+                   + ROW_NUMBER() OVER (PARTITION BY d.idChip ORDER BY d.id),
+                   @comentario
+            FROM @done d
+            OUTER APPLY (
+                SELECT MAX(com.idLinea) AS maxLinea
+                FROM TYT_LV_TBL_CONTROL_CITAS_COM com WITH (UPDLOCK, HOLDLOCK)
+                WHERE com.idChip = d.idChip
+            ) m;
+
+            COMMIT;
+        END TRY
+        BEGIN CATCH
+            IF @@TRANCOUNT > 0 ROLLBACK;
+            THROW;
+        END CATCH;
+
+        SELECT id FROM @done;
+        SELECT {CALIDAD_SELECT}
+        FROM v_validad_hyp
+        WHERE id IN (SELECT id FROM @ids);
+        """
+        return query, [_USUARIO, _COMENTARIO, _STATUS_OS] + [INT] * bucket
+
+    return build
+
+
+for _accion in TRANSICIONES:
+    catalog.statement(f"calidad.{_accion}", kind="batch")(_transicion(_accion))
@@ -1,26 +1,53 @@
 # app/modules/calidad/calidad_router.py
 
-from fastapi import APIRouter
-from typing import List
+from fastapi import APIRouter, Depends, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
 
-from .calidad_service import CalidadService
+from app.core.config import settings
+from app.core.deadline import route_budget
+from app.core.http_cache import json_response
+
+from .calidad_schema import CalidadSchema
+from .calidad_service import AsyncCalidadService
+from .calidad_stream import BoardBroadcaster
 from .calidad_schema_api import (
     CalidadResponse,
+    CalidadCambiosResponse,
+    CalidadDetalleParcialResponse,
+    CalidadDetalleResponse,
     ComentarioResponse,
     CrearComentarioRequest,
+    TransicionLoteRequest,
+    TransicionResultadoResponse,
     UsuarioRequest,
 )
 
 router = APIRouter(prefix="/calidad", tags=["Calidad"])
 
-service = CalidadService()
+service = AsyncCalidadService()
+broadcaster = BoardBroadcaster(service)
+
+FIELDS_QUERY = Query(
+    None,
+    description="Campos a devolver separados por coma (p. ej. id,no_orden,status)",
+)
+
+
+def _tipo(response_type, fields: Optional[List[str]]):
+    """Con `fields` la respuesta es parcial: dicts en lugar del modelo."""
+    if fields is None:
+        return response_type
+    if getattr(response_type, "__origin__", None) is list:
+        return List[Dict[str, Any]]
+    return Dict[str, Any]
 
 
 # ============================================================
 # 0. Authentication
 # ============================================================
 @router.get("/auth/me/")
-def auth_me():
+async def auth_me():
     return {"status": "ok", "message": "Authenticated"}
 
 
@@ -28,61 +55,200 @@ def auth_me():
 # 1. Vehículos actualmente en fase de calidad
 # ============================================================
 @router.get("/", response_model=List[CalidadResponse])
-def listar_en_fase():
-    return service.get_vehiculos_en_fase_calidad()
+async def listar_en_fase(
+    request: Request,
+    fields: Optional[str] = FIELDS_QUERY,
+    status: Optional[str] = None,
+    status_os: Optional[str] = None,
+    id_tecnico: Optional[int] = None,
+    id_asesor: Optional[int] = None,
+    sort: Optional[str] = Query(
+        None, description="Campo de orden; con '-' al inicio es descendente (p. ej. -fecha)"
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=settings.PAGE_MAX_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor de la página anterior"),
+):
+    campos = CalidadSchema.parse_fields(fields)
+    filtros = {
+        "status": status,
+        "status_os": status_os,
+        "id_tecnico": id_tecnico,
+        "id_asesor": id_asesor,
+    }
+
+    if any(v is not None for v in (*filtros.values(), sort, limit, cursor)):
+        # Listado filtrado/paginado: se resuelve en SQL. El cuerpo sigue
+        # siendo la lista; total y paginación van en encabezados.
+        page = await service.buscar_en_fase(filtros, sort, limit, cursor, campos)
+        response = json_response(
+            request, page["data"], _tipo(List[CalidadResponse], campos), columnar=True
+        )
+        response.headers["X-Total-Count"] = str(page["total"])
+        response.headers["X-Has-More"] = "true" if page["has_more"] else "false"
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        return response
+
+    version, data = await service.get_tablero(campos)
+
+    etag = None
+    if version:
+        # La proyección forma parte de la representación
+        etag = f'"{version}+{"+".join(campos)}"' if campos else f'"{version}"'
+    return json_response(
+        request, data, _tipo(List[CalidadResponse], campos), etag=etag, columnar=True
+    )
+
+
+# ============================================================
+# 1.1 Cambios del tablero desde un token (delta-sync)
+# ============================================================
+@router.get("/cambios/", response_model=CalidadCambiosResponse)
+async def listar_cambios(since: Optional[str] = None):
+    return await service.get_cambios_tablero(since)
+
+
+# ============================================================
+# 1.2 Cambios del tablero en vivo (WebSocket)
+# ============================================================
+@router.websocket("/stream/")
+async def stream_tablero(websocket: WebSocket):
+    await broadcaster.serve(websocket)
+
+
+# ============================================================
+# 1.3 Exportar el listado completo en streaming
+# Plazo propio (EXPORT_DEADLINE_SECONDS): recorre toda la fase
+# ============================================================
+@router.get(
+    "/export/",
+    response_model=List[CalidadResponse],
+    dependencies=[Depends(route_budget(settings.EXPORT_DEADLINE_SECONDS))],
+)
+async def exportar_en_fase(
+    fields: Optional[str] = FIELDS_QUERY,
+    status: Optional[str] = None,
+    status_os: Optional[str] = None,
+    id_tecnico: Optional[int] = None,
+    id_asesor: Optional[int] = None,
+    sort: Optional[str] = None,
+):
+    campos = CalidadSchema.parse_fields(fields)
+    filtros = {
+        "status": status,
+        "status_os": status_os,
+        "id_tecnico": id_tecnico,
+        "id_asesor": id_asesor,
+    }
+    chunks = await service.exportar_en_fase(filtros, sort, campos)
+    return StreamingResponse(chunks, media_type="application/json")
 
 
 # ============================================================
 # 2. Obtener vehículo por idHD (dentro de la fase)
 # ============================================================
 @router.get("/vehiculo/{id_hd}/", response_model=List[CalidadResponse])
-def obtener_por_id_hd(id_hd: int):
-    return service.get_vehiculo_por_id(id_hd)
+async def obtener_por_id_hd(
+    request: Request, id_hd: int, fields: Optional[str] = FIELDS_QUERY
+):
+    campos = CalidadSchema.parse_fields(fields)
+    data = await service.get_vehiculo_por_id(id_hd, campos)
+    return json_response(request, data, _tipo(List[CalidadResponse], campos))
 
 
 # ============================================================
 # 3. Obtener una calidad por ID (PK)
 # ============================================================
 @router.get("/item/{id}/", response_model=CalidadResponse)
-def obtener_por_id(id: int):
-    return service.get_calidad_por_id(id)
+async def obtener_por_id(request: Request, id: int, fields: Optional[str] = FIELDS_QUERY):
+    campos = CalidadSchema.parse_fields(fields)
+    data = await service.get_calidad_por_id(id, campos)
+    return json_response(request, data, _tipo(CalidadResponse, campos))
 
 
 # ============================================================
 # 4. Obtener info del vehículo en fase previa
 # ============================================================
 @router.get("/vehiculo-info/{id_hd}/", response_model=CalidadResponse)
-def obtener_info_previa(id_hd: int):
-    return service.get_vehiculo_info(id_hd)
+async def obtener_info_previa(
+    request: Request, id_hd: int, fields: Optional[str] = FIELDS_QUERY
+):
+    campos = CalidadSchema.parse_fields(fields)
+    data = await service.get_vehiculo_info(id_hd, campos)
+    return json_response(request, data, _tipo(CalidadResponse, campos))
+
+
+# ============================================================
+# 4.1 Ficha del vehículo (registro, fase previa y comentarios)
+# ============================================================
+@router.get("/vehiculo/{id_hd}/detalle/", response_model=CalidadDetalleResponse)
+async def obtener_detalle(
+    request: Request, id_hd: int, fields: Optional[str] = FIELDS_QUERY
+):
+    campos = CalidadSchema.parse_fields(fields)
+    data = await service.get_detalle_vehiculo(id_hd, campos)
+    tipo = CalidadDetalleResponse if campos is None else CalidadDetalleParcialResponse
+    return json_response(request, data, tipo)
 
 
 # ============================================================
 # 5. Historial de comentarios
 # ============================================================
 @router.get("/comentarios/{id_chip}/", response_model=List[ComentarioResponse])
-def obtener_comentarios(id_chip: int):
-    return service.get_comentarios(id_chip)
+async def obtener_comentarios(request: Request, id_chip: int):
+    data = await service.get_comentarios(id_chip)
+    return json_response(request, data, List[ComentarioResponse], columnar=True)
+
+
+# ============================================================
+# 5.1 Historial de comentarios de varios vehículos
+# ============================================================
+@router.get("/comentarios/", response_model=Dict[int, List[ComentarioResponse]])
+async def obtener_comentarios_lote(
+    request: Request,
+    id_chip: List[int] = Query(...),
+    ultimos: Optional[int] = Query(None, ge=1),
+):
+    data = await service.get_comentarios_lote(id_chip, ultimos)
+    return json_response(
+        request, data, Dict[int, List[ComentarioResponse]], columnar=True
+    )
 
 
 # ============================================================
 # 6. Agregar comentario
 # ============================================================
 @router.post("/comentarios/", response_model=ComentarioResponse)
-def agregar_comentario(data: CrearComentarioRequest):
-    return service.agregar_comentario(data)
+async def agregar_comentario(data: CrearComentarioRequest):
+    return await service.agregar_comentario(data)
 
 
 # ============================================================
 # 7. Iniciar una calidad
 # ============================================================
 @router.post("/{id}/iniciar/", response_model=CalidadResponse)
-def iniciar_calidad(id: int, body: UsuarioRequest):
-    return service.iniciar_calidad(id, body.usuario)
+async def iniciar_calidad(id: int, body: UsuarioRequest):
+    return await service.iniciar_calidad(id, body.usuario)
 
 
 # ============================================================
 # 8. Finalizar una calidad
 # ============================================================
 @router.post("/{id}/finalizar/", response_model=CalidadResponse)
-def finalizar_calidad(id: int, body: UsuarioRequest):
-    return service.finalizar_calidad(id, body.usuario, body.status_os)
+async def finalizar_calidad(id: int, body: UsuarioRequest):
+    return await service.finalizar_calidad(id, body.usuario, body.status_os)
+
+
+# ============================================================
+# 9. Iniciar / finalizar en lote
+# ============================================================
+@router.post("/iniciar/lote/", response_model=List[TransicionResultadoResponse])
+async def iniciar_calidad_lote(body: TransicionLoteRequest):
+    return await service.iniciar_calidad_lote(body.ids, body.usuario)
+
+
+@router.post("/finalizar/lote/", response_model=List[TransicionResultadoResponse])
+async def finalizar_calidad_lote(body: TransicionLoteRequest):
+    return await service.finalizar_calidad_lote(
+        body.ids, body.usuario, body.status_os
+    )
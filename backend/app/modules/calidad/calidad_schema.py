@@ -1,54 +1,312 @@
 # app/modules/calidad/calidad_schema.py
 
-from typing import Dict, Any
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.queries import DATETIME, INT, VARCHAR, SqlType
+from app.errors.errors import ValidationError
+
 from .calidad_model import CalidadModel, CalidadComentarioModel
 
 
+# ============================================================
+# Mapa de columnas: campo del modelo/API -> columna de la BD
+# Es la única fuente para las listas de SELECT y el mapeo de filas.
+# ============================================================
+CALIDAD_COLUMNS: Dict[str, str] = {
+    "id": "id",
+    "id_chip": "idChip",
+    "id_hd": "id_hd",
+    "fecha": "fecha",
+    "status": "status",
+    "color": "color",
+    "vehiculo": "vehiculo",
+    "no_orden": "noOrden",
+    "no_placas": "noPlacas",
+    "id_tecnico": "idTecnico",
+    "id_asesor": "idAsesor",
+    "fecha_hora_ini_oper": "fecha_hora_ini_oper",
+    "fecha_hora_fin_oper": "fecha_hora_fin_oper",
+    "status_os": "status_os",
+    "kilometraje": "kilometraje",
+    "contacto_nombre": "contactoNombre",
+    "contacto_telefono": "contactoTelefono",
+    "tmp_real": "tmp_Real",
+    "tmp_original": "tmp_original",
+    "servicio": "servicio",
+    "servicio_capturado": "servicioCapturado",
+    "id_fase": "idTecnicoAsi",
+    "tecnico": "tecnico",
+    "asesor": "asesor",
+}
+
+# Tipo SQL de cada columna de v_validad_hyp (mantener igual al DDL). Los
+# parámetros que se comparan con una columna se declaran con su tipo
+# exacto: un NVARCHAR contra una columna VARCHAR obliga a SQL Server a
+# convertir la columna (CONVERT_IMPLICIT) y deja de usar sus índices.
+CALIDAD_TYPES: Dict[str, SqlType] = {
+    "id": INT,
+    "id_chip": INT,
+    "id_hd": INT,
+    "fecha": DATETIME,
+    "status": VARCHAR(20),
+    "color": VARCHAR(20),
+    "vehiculo": VARCHAR(100),
+    "no_orden": VARCHAR(20),
+    "no_placas": VARCHAR(15),
+    "id_tecnico": INT,
+    "id_asesor": INT,
+    "fecha_hora_ini_oper": DATETIME,
+    "fecha_hora_fin_oper": DATETIME,
+    "status_os": VARCHAR(20),
+    "kilometraje": INT,
+    "contacto_nombre": VARCHAR(150),
+    "contacto_telefono": VARCHAR(20),
+    "tmp_real": INT,
+    "tmp_original": INT,
+    "servicio": VARCHAR(255),
+    "servicio_capturado": VARCHAR(255),
+    "id_fase": INT,
+    "tecnico": VARCHAR(150),
+    "asesor": VARCHAR(150),
+}
+
+# Campos calculados -> columnas de las que dependen
+CALIDAD_DERIVED: Dict[str, Sequence[str]] = {
+    "tracker_url": ("noOrden",),
+}
+
+CALIDAD_FIELDS: List[str] = [*CALIDAD_COLUMNS, *CALIDAD_DERIVED]
+
+# Campos por los que se puede filtrar (igualdad) y ordenar el listado
+CALIDAD_FILTERS: Sequence[str] = ("status", "status_os", "id_tecnico", "id_asesor")
+CALIDAD_SORTABLE: Sequence[str] = (
+    "id",
+    "fecha",
+    "status",
+    "vehiculo",
+    "no_orden",
+    "no_placas",
+    "fecha_hora_ini_oper",
+    "fecha_hora_fin_oper",
+    "status_os",
+    "kilometraje",
+    "tecnico",
+    "asesor",
+)
+
+COMENTARIO_COLUMNS: Dict[str, str] = {
+    "id_chip": "idChip",
+    "fecha": "fecha",
+    "status": "Status",
+    "cve_usuario": "cveUsuario",
+    "id_linea": "idLinea",
+    "comentario": "Comentario",
+}
+
+# Tipo SQL de cada columna de TYT_LV_TBL_CONTROL_CITAS_COM (igual al DDL)
+COMENTARIO_TYPES: Dict[str, SqlType] = {
+    "id_chip": INT,
+    "fecha": DATETIME,
+    "status": VARCHAR(20),
+    "cve_usuario": VARCHAR(50),
+    "id_linea": INT,
+    "comentario": VARCHAR(),
+}
+
+
+def _select_list(columns, alias: Optional[str] = None) -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(f"{prefix}{column}" for column in columns)
+
+
+# ============================================================
+# Mapeadores precompilados: fila (tupla) -> modelo o dict
+# Se compilan una vez por lista de columnas del cursor (índices,
+# plantilla del tracker) y se reutilizan; por fila solo queda un
+# itemgetter, un zip y la construcción del resultado. Los datos vienen
+# de la BD con tipos ya correctos, por eso los modelos se crean sin
+# validación (equivalente a `model_construct`).
+# ============================================================
+@lru_cache(maxsize=None)
+def _tracker_template() -> Optional[Tuple[str, str]]:
+    """(prefijo, sufijo) de TRACKER_URL alrededor de {no_order}, o None."""
+    from app.core.config import settings
+
+    prefix, sep, suffix = settings.TRACKER_URL.partition("{no_order}")
+    if not sep or "{" in prefix + suffix or "}" in prefix + suffix:
+        # Plantilla con otros campos o llaves escapadas: se usa str.format
+        return None
+    return prefix, suffix
+
+
+def _getter(indices: Sequence[int]) -> Callable[[Sequence[Any]], tuple]:
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indices)
+
+
+@lru_cache(maxsize=256)
+def _compile_mapper(
+    columns: Tuple[str, ...],
+    mapping: Tuple[Tuple[str, str], ...],
+    tracker: bool,
+    model: Optional[type],
+) -> Callable[[Sequence[Any]], Any]:
+    index = {column: i for i, column in enumerate(columns)}
+    present = [(field, index[column]) for field, column in mapping if column in index]
+    # Campos sin columna en el cursor: None, igual que row.get()
+    missing = {field: None for field, column in mapping if column not in index}
+
+    names = tuple(field for field, _ in present)
+    getter = _getter([i for _, i in present]) if present else (lambda row: ())
+    no_orden = index.get("noOrden") if tracker else None
+    tracker_url = CalidadSchema.tracker_url
+
+    construct = _trusted_constructor(model) if model is not None else None
+
+    def map_row(row):
+        values = dict(zip(names, getter(row)))
+        if missing:
+            values.update(missing)
+        if tracker:
+            values["tracker_url"] = (
+                tracker_url(row[no_orden]) if no_orden is not None else None
+            )
+        if construct is None:
+            return values
+        return construct(values)
+
+    return map_row
+
+
+def _trusted_constructor(model: type) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Construye instancias de `model` a partir de un dict con todos sus
+    campos, sin validar. Es lo mismo que hace `model_construct` al final,
+    sin el recorrido por campos/alias/defaults de cada llamada.
+    """
+    if (
+        model.__pydantic_post_init__
+        or model.__private_attributes__
+        or model.model_config.get("extra") == "allow"
+    ):
+        return lambda values: model.model_construct(**values)
+
+    new = object.__new__
+    setattr_ = object.__setattr__
+    # Todos los campos vienen siempre: el conjunto se comparte
+    fields_set = set(model.model_fields)
+
+    def construct(values):
+        instance = new(model)
+        setattr_(instance, "__dict__", values)
+        setattr_(instance, "__pydantic_fields_set__", fields_set)
+        setattr_(instance, "__pydantic_extra__", None)
+        setattr_(instance, "__pydantic_private__", None)
+        return instance
+
+    return construct
+
+
+_CALIDAD_MAPPING = tuple(CALIDAD_COLUMNS.items())
+_COMENTARIO_MAPPING = tuple(COMENTARIO_COLUMNS.items())
+
+
 class CalidadSchema:
 
+    @staticmethod
+    def select_list(fields: Optional[Sequence[str]] = None, alias: Optional[str] = None) -> str:
+        """
+        Lista de columnas de v_validad_hyp para un SELECT: todas las que usa
+        el modelo o solo las necesarias para `fields`.
+        """
+        if fields is None:
+            return _select_list(CALIDAD_COLUMNS.values(), alias)
+
+        columns = []
+        for field in fields:
+            for column in CALIDAD_DERIVED.get(field, (CALIDAD_COLUMNS.get(field),)):
+                if column and column not in columns:
+                    columns.append(column)
+        return _select_list(columns, alias)
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+        """
+        Convierte el parámetro `fields=a,b,c` en lista de campos válidos.
+        None (o vacío) significa todos los campos.
+        """
+        if not fields:
+            return None
+
+        parsed = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in parsed if f not in CALIDAD_FIELDS]
+        if unknown:
+            raise ValidationError(detail=f"Campos desconocidos: {', '.join(unknown)}")
+        return parsed or None
+
+    @staticmethod
+    def parse_sort(sort: Optional[str]) -> Tuple[str, bool]:
+        """
+        Convierte `sort=campo` / `sort=-campo` en (campo, descendente).
+        Solo se aceptan los campos de CALIDAD_SORTABLE.
+        """
+        if not sort:
+            return "id", False
+
+        descending = sort.startswith("-")
+        field = sort.lstrip("-+").strip()
+        if field not in CALIDAD_SORTABLE:
+            raise ValidationError(
+                detail=f"No se puede ordenar por '{field}'. "
+                f"Campos válidos: {', '.join(CALIDAD_SORTABLE)}"
+            )
+        return field, descending
+
+    @staticmethod
+    def model_mapper(columns: Sequence[str]) -> Callable[[Sequence[Any]], CalidadModel]:
+        """Mapeador precompilado fila (tupla) -> CalidadModel para `columns`."""
+        return _compile_mapper(tuple(columns), _CALIDAD_MAPPING, True, CalidadModel)
+
+    @staticmethod
+    def row_mapper(
+        columns: Sequence[str], fields: Optional[Sequence[str]] = None
+    ) -> Callable[[Sequence[Any]], Dict[str, Any]]:
+        """
+        Mapeador precompilado fila (tupla) -> dict con `fields` (todos los
+        campos si es None) para `columns`.
+        """
+        fields = CALIDAD_FIELDS if fields is None else fields
+        mapping = tuple(
+            (field, CALIDAD_COLUMNS[field]) for field in fields if field in CALIDAD_COLUMNS
+        )
+        return _compile_mapper(tuple(columns), mapping, "tracker_url" in fields, None)
+
     @staticmethod
     def db_to_model(row: Dict[str, Any]) -> CalidadModel:
         """
         Convierte una fila de SQL (dict) al modelo CalidadModel.
         """
+        return CalidadSchema.model_mapper(tuple(row))(tuple(row.values()))
+
+    @staticmethod
+    def model_to_dict(model: CalidadModel, fields: Sequence[str]) -> Dict[str, Any]:
+        return {field: getattr(model, field) for field in fields}
 
-        def calculate_tracker_url(no_orden: str) -> str:
-            # Aquí podrías usar settings.TRACKER_URL y formatearlo con no_orden
+    @staticmethod
+    def tracker_url(no_orden: Optional[str]) -> Optional[str]:
+        if not no_orden:
+            return None
+
+        template = _tracker_template()
+        if template is None:
             from app.core.config import settings
 
             return settings.TRACKER_URL.format(no_order=no_orden)
-
-        return CalidadModel(
-            id=row.get("id"),
-            id_chip=row.get("idChip"),
-            id_hd=row.get("id_hd"),
-            fecha=row.get("fecha"),
-            status=row.get("status"),
-            color=row.get("color"),
-            vehiculo=row.get("vehiculo"),
-            no_orden=row.get("noOrden"),
-            no_placas=row.get("noPlacas"),
-            id_tecnico=row.get("idTecnico"),
-            id_asesor=row.get("idAsesor"),
-            fecha_hora_ini_oper=row.get("fecha_hora_ini_oper"),
-            fecha_hora_fin_oper=row.get("fecha_hora_fin_oper"),
-            status_os=row.get("status_os"),
-            kilometraje=row.get("kilometraje"),
-            contacto_nombre=row.get("contactoNombre"),
-            contacto_telefono=row.get("contactoTelefono"),
-            tmp_real=row.get("tmp_Real"),
-            tmp_original=row.get("tmp_original"),
-            servicio=row.get("servicio"),
-            servicio_capturado=row.get("servicioCapturado"),
-            id_fase=row.get("idTecnicoAsi"),
-            tecnico=row.get("tecnico"),
-            asesor=row.get("asesor"),
-            tracker_url=(
-                calculate_tracker_url(row.get("noOrden"))
-                if row.get("noOrden")
-                else None
-            ),
-        )
+        return f"{template[0]}{no_orden}{template[1]}"
 
     @staticmethod
     def model_to_db(model: CalidadModel) -> Dict[str, Any]:
@@ -57,42 +315,29 @@ class CalidadSchema:
         Útil cuando hagamos update/insert más adelante.
         """
         return {
-            "id": model.id,
-            "idChip": model.id_chip,
-            "id_hd": model.id_hd,
-            "fecha": model.fecha,
-            "status": model.status,
-            "color": model.color,
-            "vehiculo": model.vehiculo,
-            "noOrden": model.no_orden,
-            "noPlacas": model.no_placas,
-            "idTecnico": model.id_tecnico,
-            "idAsesor": model.id_asesor,
-            "fecha_hora_ini_oper": model.fecha_hora_ini_oper,
-            "fecha_hora_fin_oper": model.fecha_hora_fin_oper,
-            "status_os": model.status_os,
-            "kilometraje": model.kilometraje,
-            "contactoNombre": model.contacto_nombre,
-            "contactoTelefono": model.contacto_telefono,
-            "tmp_Real": model.tmp_real,
-            "tmp_original": model.tmp_original,
-            "servicio": model.servicio,
-            "servicioCapturado": model.servicio_capturado,
-            "idTecnicoAsi": model.id_fase,
-            "tecnico": model.tecnico,
-            "asesor": model.asesor,
+            column: getattr(model, field) for field, column in CALIDAD_COLUMNS.items()
         }
 
 
 class ComentarioSchema:
 
     @staticmethod
-    def db_to_model(row: Dict[str, Any]) -> CalidadComentarioModel:
-        return CalidadComentarioModel(
-            id_chip=row.get("idChip"),
-            fecha=row.get("fecha"),
-            status=row.get("Status"),
-            cve_usuario=row.get("cveUsuario"),
-            id_linea=row.get("idLinea"),
-            comentario=row.get("Comentario"),
+    def select_list(alias: Optional[str] = None) -> str:
+        return _select_list(COMENTARIO_COLUMNS.values(), alias)
+
+    @staticmethod
+    def model_mapper(
+        columns: Sequence[str],
+    ) -> Callable[[Sequence[Any]], CalidadComentarioModel]:
+        return _compile_mapper(
+            tuple(columns), _COMENTARIO_MAPPING, False, CalidadComentarioModel
         )
+
+    @staticmethod
+    def db_to_model(row: Dict[str, Any]) -> CalidadComentarioModel:
+        return ComentarioSchema.model_mapper(tuple(row))(tuple(row.values()))
+
+
+# Listas completas precalculadas para las consultas del servicio
+CALIDAD_SELECT = CalidadSchema.select_list()
+COMENTARIO_SELECT = ComentarioSchema.select_list()
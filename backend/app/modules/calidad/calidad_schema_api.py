@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 
 class CalidadResponse(BaseModel):
@@ -31,6 +31,13 @@ class CalidadResponse(BaseModel):
     tracker_url: Optional[str]
 
 
+class CalidadCambiosResponse(BaseModel):
+    token: Optional[str]
+    completo: bool
+    actualizados: List[CalidadResponse]
+    eliminados: List[int]
+
+
 class ComentarioResponse(BaseModel):
     id_chip: int
     fecha: datetime
@@ -40,6 +47,20 @@ class ComentarioResponse(BaseModel):
     comentario: str
 
 
+class CalidadDetalleResponse(BaseModel):
+    calidad: List[CalidadResponse]
+    fase_previa: CalidadResponse
+    comentarios: List[ComentarioResponse]
+
+
+class CalidadDetalleParcialResponse(BaseModel):
+    """Ficha con `fields`: los registros solo traen los campos pedidos."""
+
+    calidad: List[Dict[str, Any]]
+    fase_previa: Dict[str, Any]
+    comentarios: List[ComentarioResponse]
+
+
 class CrearComentarioRequest(BaseModel):
     id_chip: int
     status: str
@@ -50,3 +71,17 @@ class CrearComentarioRequest(BaseModel):
 class UsuarioRequest(BaseModel):
     usuario: str
     status_os: Optional[str]
+
+
+class TransicionLoteRequest(BaseModel):
+    ids: List[int]
+    usuario: str
+    status_os: Optional[str]
+
+
+class TransicionResultadoResponse(BaseModel):
+    id: int
+    ok: bool
+    code: Optional[str]
+    detail: Optional[str]
+    calidad: Optional[CalidadResponse]
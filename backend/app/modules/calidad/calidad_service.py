@@ -1,7 +1,12 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from app.core.admission import READ, STREAM, WRITE, admission
 from app.core.db import DB
-from app.errors.errors import NotFoundError, DatabaseError, ValidationError
+from app.core.db_executor import DBExecutor, db_executor
+from app.errors.errors import AppError, NotFoundError, DatabaseError, ValidationError
 from app.core.config import settings
+from app.core.json_stream import json_array
+from app.core.pagination import decode_cursor, encode_cursor, keyset_clause
+from app.core.queries import in_list_size, pad_in_list
 
 from .calidad_model import (
     CalidadModel,
@@ -9,7 +14,23 @@ from .calidad_model import (
     CrearComentario,
 )
 
-from .calidad_schema import CalidadSchema, ComentarioSchema
+from .calidad_schema import (
+    CALIDAD_COLUMNS,
+    CALIDAD_FILTERS,
+    CALIDAD_TYPES,
+    CalidadSchema,
+    ComentarioSchema,
+)
+from .calidad_cache import CalidadBoardCache
+from .calidad_queries import TRANSICIONES
+
+# Registro completo, o dict parcial cuando se pide `fields`
+Calidad = Union[CalidadModel, Dict[str, Any]]
+
+
+def _partes(fields: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    """`fields` como parte del catálogo de sentencias (hashable)."""
+    return None if fields is None else tuple(fields)
 
 
 class CalidadService:
@@ -18,101 +39,455 @@ class CalidadService:
         self.db = DB()
         self.calidad_fase_id = settings.CALIDAD_FASE_ID
         self.previus_fase_id = settings.PREVIUS_FASE_ID
+        self.board_cache = CalidadBoardCache(
+            loader=self._cargar_tablero,
+            board_fase_id=self.calidad_fase_id,
+            ttl=settings.BOARD_CACHE_TTL,
+            stale_ttl=settings.BOARD_CACHE_STALE_TTL,
+            max_rows=settings.BOARD_CACHE_MAX_ROWS,
+            max_changes=settings.BOARD_CHANGELOG_SIZE,
+        )
+
+    # ============================================================
+    # 0. Snapshot del tablero (fase de calidad + fase previa)
+    # ============================================================
+    def _cargar_tablero(self) -> List[CalidadModel]:
+        try:
+            columns, rows = self.db.run(
+                "calidad.tablero",
+                (self.calidad_fase_id, self.previus_fase_id),
+                raw=True,
+            )
+        except AppError:
+            raise
+        except Exception as e:
+            raise DatabaseError(detail=str(e))
+
+        mapper = CalidadSchema.model_mapper(columns)
+        return [mapper(row) for row in rows]
+
+    def _actualizar_tablero(self, *calidades: CalidadModel):
+        """Write-through: refleja en el snapshot las filas recién escritas."""
+        if self.board_cache.enabled and calidades:
+            fases = (self.calidad_fase_id, self.previus_fase_id)
+            self.board_cache.patch_many(
+                [(calidad, calidad.id_fase in fases) for calidad in calidades]
+            )
+
+    # ============================================================
+    # Proyección (fields=): con `fields` los métodos de lectura devuelven
+    # dicts solo con esos campos y la consulta trae solo sus columnas.
+    # ============================================================
+    @staticmethod
+    def _proyectar(models: List[CalidadModel], fields: Optional[List[str]]) -> list:
+        if fields is None:
+            return list(models)
+        return [CalidadSchema.model_to_dict(m, fields) for m in models]
+
+    @staticmethod
+    def _mapear(columns: List[str], rows: list, fields: Optional[List[str]]) -> list:
+        if fields is None:
+            mapper = CalidadSchema.model_mapper(columns)
+        else:
+            mapper = CalidadSchema.row_mapper(columns, fields)
+        return [mapper(row) for row in rows]
 
     # ============================================================
     # 1. Vehículos actualmente en fase de calidad
     # ============================================================
-    def get_vehiculos_en_fase_calidad(self) -> List[CalidadModel]:
-        query = """
-        SELECT *
-        FROM v_validad_hyp
-        WHERE idTecnicoAsi = ?
+    def get_vehiculos_en_fase_calidad(
+        self, fields: Optional[List[str]] = None
+    ) -> List[Calidad]:
+        if self.board_cache.enabled:
+            return self._proyectar(self.board_cache.get().board, fields)
+
+        try:
+            columns, rows = self.db.run(
+                "calidad.en_fase",
+                (self.calidad_fase_id,),
+                (_partes(fields),),
+                raw=True,
+            )
+        except AppError:
+            raise
+        except Exception as e:
+            raise DatabaseError(detail=str(e))
+
+        return self._mapear(columns, rows, fields)
+
+    def get_tablero(
+        self, fields: Optional[List[str]] = None
+    ) -> Tuple[Optional[str], List[Calidad]]:
+        """
+        Igual que get_vehiculos_en_fase_calidad, junto con la huella del
+        tablero (None sin snapshot), que sirve de ETag sin tener que
+        serializar la respuesta y es la misma en todos los workers.
+        """
+        if not self.board_cache.enabled:
+            return None, self.get_vehiculos_en_fase_calidad(fields)
+
+        snapshot, version = self.board_cache.get_versioned()
+        rows = self._proyectar(snapshot.board, fields)
+        return self.board_cache.token(snapshot, version), rows
+
+    # ============================================================
+    # 1.1 Cambios del tablero desde un token de sincronización
+    # ============================================================
+    def get_cambios_tablero(self, since: Optional[str] = None) -> dict:
         """
+        Delta del tablero respecto al token `since` (huella del tablero).
+        Sin token, con uno demasiado viejo o de un estado que este proceso
+        no conoce, responde el tablero completo con `completo=True`.
+        """
+        if not self.board_cache.enabled:
+            return {
+                "token": None,
+                "completo": True,
+                "actualizados": self.get_vehiculos_en_fase_calidad(),
+                "eliminados": [],
+            }
+
+        token, completo, rows, eliminados = self.board_cache.changes_since_token(
+            since
+        )
+        return {
+            "token": token,
+            "completo": completo,
+            "actualizados": rows,
+            "eliminados": eliminados,
+        }
+
+    # ============================================================
+    # 1.2 Listado filtrado, ordenado y paginado (keyset)
+    # Los filtros y el orden se resuelven en SQL; cada página es un solo
+    # batch con el total y hasta `limit + 1` filas (la extra indica si
+    # hay más). El cursor guarda el valor de orden y el id de la última
+    # fila, así la página N cuesta lo mismo que la primera.
+    # ============================================================
+    def buscar_en_fase(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> dict:
+        campo, descendente = CalidadSchema.parse_sort(sort)
+        orden = f"-{campo}" if descendente else campo
+        columna = CALIDAD_COLUMNS[campo]
+        limit = min(limit or settings.PAGE_DEFAULT_SIZE, settings.PAGE_MAX_SIZE)
+        nombres, params = self._filtros_fase(filtros)
+
+        tipo_cursor = None
+        page_params = list(params)
+        if cursor:
+            posicion = decode_cursor(cursor)
+            if posicion.get("sort") != orden or "id" not in posicion:
+                raise ValidationError(
+                    detail="El cursor no corresponde al orden solicitado."
+                )
+            tipo_cursor = "null" if posicion.get("v") is None else "value"
+            _, clause_params = keyset_clause(
+                columna, descendente, posicion.get("v"), posicion["id"]
+            )
+            page_params.extend(clause_params)
+
+        if self._sin_coincidencias(nombres, params):
+            return {"total": 0, "has_more": False, "next_cursor": None, "data": []}
+
+        try:
+            (_, total), (columns, rows) = self.db.run(
+                "calidad.buscar",
+                (*params, limit + 1, *page_params),
+                (_partes(fields), nombres, campo, descendente, tipo_cursor),
+                raw=True,
+            )
+        except AppError:
+            raise
+        except Exception as e:
+            raise DatabaseError(detail=str(e))
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more:
+            ultima = rows[-1]
+            next_cursor = encode_cursor(
+                sort=orden,
+                v=ultima[columns.index(columna)],
+                id=ultima[columns.index("id")],
+            )
+
+        return {
+            "total": total[0][0] if total else 0,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "data": self._mapear(columns, rows, fields),
+        }
+
+    def _filtros_fase(
+        self, filtros: Optional[Dict[str, Any]]
+    ) -> Tuple[Tuple[str, ...], List[Any]]:
+        """
+        Filtros aplicados (en el orden de CALIDAD_FILTERS, para que el SQL
+        no dependa del orden de la petición) y los parámetros del WHERE de
+        la fase.
+        """
+        filtros = {k: v for k, v in (filtros or {}).items() if v is not None}
+        for filtro in filtros:
+            if filtro not in CALIDAD_FILTERS:
+                raise ValidationError(detail=f"Filtro desconocido: {filtro}")
+        nombres = tuple(f for f in CALIDAD_FILTERS if f in filtros)
+        return nombres, [self.calidad_fase_id, *(filtros[f] for f in nombres)]
+
+    @staticmethod
+    def _sin_coincidencias(nombres: Tuple[str, ...], params: List[Any]) -> bool:
+        """
+        True si algún filtro es más largo que su columna: no puede coincidir
+        con nada y no cabe en el parámetro declarado con el tipo de la
+        columna, así que no se consulta.
+        """
+        return any(
+            not CALIDAD_TYPES[nombre].fits(valor)
+            for nombre, valor in zip(nombres, params[1:])
+        )
+
+    # ============================================================
+    # 1.3 Exportación en streaming
+    # Generador de fragmentos JSON: lee con fetchmany y convierte cada
+    # bloque de tuplas directo a bytes, sin dicts intermedios por columna,
+    # sin modelos y sin re-validación. La memoria no crece con el número
+    # de filas.
+    # ============================================================
+    def exportar_en_fase(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        sort: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Iterator[bytes]:
+        campo, descendente = CalidadSchema.parse_sort(sort)
+        nombres, params = self._filtros_fase(filtros)
+        if self._sin_coincidencias(nombres, params):
+            yield from json_array(())
+            return
+        stream = self.db.run(
+            "calidad.exportar", params, (_partes(fields), nombres, campo, descendente)
+        )
         try:
-            rows = self.db.select(query, (self.calidad_fase_id,))
+            # Ejecuta la consulta antes del primer fragmento: un error de BD
+            # se reporta como DatabaseError y no como una respuesta cortada
+            primero = next(stream, None)
+        except AppError:
+            raise
         except Exception as e:
             raise DatabaseError(detail=str(e))
 
-        return [CalidadSchema.db_to_model(row) for row in rows]
+        def bloques():
+            if primero is None:
+                return
+            columns, rows = primero
+            mapper = CalidadSchema.row_mapper(columns, fields)
+            yield [mapper(row) for row in rows]
+            for _, rows in stream:
+                yield [mapper(row) for row in rows]
+
+        try:
+            yield from json_array(bloques())
+        finally:
+            stream.close()
 
     # ============================================================
     # 2. Vehículo por id_hd dentro de la fase de calidad
     # ============================================================
-    def get_vehiculo_por_id(self, id_hd: int) -> List[CalidadModel]:
-        query = """
-        SELECT *
-        FROM v_validad_hyp
-        WHERE id_hd = ? AND idTecnicoAsi = ?
-        """
+    def get_vehiculo_por_id(
+        self, id_hd: int, fields: Optional[List[str]] = None
+    ) -> List[Calidad]:
+        if self.board_cache.enabled:
+            snapshot = self.board_cache.get()
+            rows = [
+                r
+                for r in snapshot.by_hd.get(id_hd, [])
+                if r.id_fase == self.calidad_fase_id
+            ]
+            if rows:
+                return self._proyectar(rows, fields)
+
         try:
-            rows = self.db.select(query, (id_hd, self.calidad_fase_id))
+            columns, rows = self.db.run(
+                "calidad.vehiculo",
+                (id_hd, self.calidad_fase_id),
+                (_partes(fields),),
+                raw=True,
+            )
+        except AppError:
+            raise
         except Exception as e:
             raise DatabaseError(detail=str(e))
 
         if not rows:
             raise NotFoundError(detail=f"id_hd={id_hd} no está en fase de calidad")
 
-        return [CalidadSchema.db_to_model(row) for row in rows]
+        return self._mapear(columns, rows, fields)
 
     # ============================================================
     # 3. Obtener una calidad por ID (id = PK)
     # ============================================================
-    def get_calidad_por_id(self, id: int) -> CalidadModel:
-        query = """
-        SELECT *
-        FROM v_validad_hyp
-        WHERE id = ?
-        """
+    def get_calidad_por_id(
+        self, id: int, fields: Optional[List[str]] = None
+    ) -> Calidad:
+        if self.board_cache.enabled:
+            calidad = self.board_cache.get().by_id.get(id)
+            if calidad is not None:
+                return self._proyectar([calidad], fields)[0]
+
         try:
-            rows = self.db.select(query, (id,))
+            columns, rows = self.db.run(
+                "calidad.item", (id,), (_partes(fields),), raw=True
+            )
+        except AppError:
+            raise
         except Exception as e:
             raise DatabaseError(detail=str(e))
 
         if not rows:
             raise NotFoundError(detail=f"id={id}")
 
-        return CalidadSchema.db_to_model(rows[0])
+        return self._mapear(columns, rows[:1], fields)[0]
 
     # ============================================================
     # 4. Obtener info del vehículo en fase anterior
     # ============================================================
-    def get_vehiculo_info(self, id_hd: int) -> CalidadModel:
-        query = """
-        SELECT *
-        FROM v_validad_hyp
-        WHERE id_hd = ? AND (idTecnicoAsi = ? OR idTecnicoAsi = ?)
-        """
+    def get_vehiculo_info(
+        self, id_hd: int, fields: Optional[List[str]] = None
+    ) -> Calidad:
+        if self.board_cache.enabled:
+            rows = self.board_cache.get().by_hd.get(id_hd)
+            if rows:
+                return self._proyectar(rows[:1], fields)[0]
+
         try:
-            rows = self.db.select(
-                query, (id_hd, self.previus_fase_id, self.calidad_fase_id)
+            columns, rows = self.db.run(
+                "calidad.vehiculo_info",
+                (id_hd, self.previus_fase_id, self.calidad_fase_id),
+                (_partes(fields),),
+                raw=True,
             )
+        except AppError:
+            raise
         except Exception as e:
             raise DatabaseError(detail=str(e))
 
         if not rows:
             raise NotFoundError(detail=f"id_hd={id_hd} no está en fase previa")
 
-        return CalidadSchema.db_to_model(rows[0])
+        return self._mapear(columns, rows[:1], fields)[0]
+
+    # ============================================================
+    # 4.1 Ficha del vehículo: registro, fase previa y comentarios
+    # Lo mismo que /vehiculo/, /vehiculo-info/ y /comentarios/ juntos. Con
+    # el snapshot los registros salen de memoria y solo los comentarios
+    # van a la BD; sin él, un solo batch con tres result sets.
+    # ============================================================
+    def get_detalle_vehiculo(
+        self, id_hd: int, fields: Optional[List[str]] = None
+    ) -> dict:
+        if self.board_cache.enabled:
+            todos = self.board_cache.get().by_hd.get(id_hd, [])
+            rows = [r for r in todos if r.id_fase == self.calidad_fase_id]
+            if rows:
+                chips = list(dict.fromkeys(r.id_chip for r in rows if r.id_chip is not None))
+                comentarios = self.get_comentarios_lote(chips) if chips else {}
+                return {
+                    "calidad": self._proyectar(rows, fields),
+                    "fase_previa": self._proyectar(todos[:1], fields)[0],
+                    "comentarios": [c for chip in chips for c in comentarios[chip]],
+                }
+
+        fase, previa = self.calidad_fase_id, self.previus_fase_id
+        try:
+            (columns, rows), (_, info), (com_columns, com_rows) = self.db.run(
+                "calidad.detalle",
+                (id_hd, fase, id_hd, previa, fase, id_hd, fase),
+                (_partes(fields),),
+                raw=True,
+            )
+        except AppError:
+            raise
+        except Exception as e:
+            raise DatabaseError(detail=str(e))
+
+        if not rows:
+            raise NotFoundError(detail=f"id_hd={id_hd} no está en fase de calidad")
+
+        mapper = ComentarioSchema.model_mapper(com_columns)
+        return {
+            "calidad": self._mapear(columns, rows, fields),
+            "fase_previa": self._mapear(columns, info[:1], fields)[0],
+            "comentarios": [mapper(row) for row in com_rows],
+        }
 
     # ============================================================
     # 5. Obtener comentarios por idChip
     # ============================================================
     def get_comentarios(self, id_chip: int) -> List[CalidadComentarioModel]:
-        query = """
-        SELECT *
-        FROM TYT_LV_TBL_CONTROL_CITAS_COM
-        WHERE idChip = ?
-        ORDER BY fecha ASC, idLinea ASC
+        try:
+            columns, rows = self.db.run("comentarios.por_chip", (id_chip,), raw=True)
+        except AppError:
+            raise
+        except Exception as e:
+            raise DatabaseError(detail=str(e))
+
+        mapper = ComentarioSchema.model_mapper(columns)
+        return [mapper(row) for row in rows]
+
+    # ============================================================
+    # 5.1 Comentarios de varios idChip en una sola consulta
+    # ============================================================
+    def get_comentarios_lote(
+        self, id_chips: List[int], ultimos: Optional[int] = None
+    ) -> Dict[int, List[CalidadComentarioModel]]:
         """
+        Historial de comentarios agrupado por idChip. Con `ultimos` solo se
+        devuelven los N comentarios más recientes de cada idChip (en orden
+        cronológico, igual que get_comentarios).
+        """
+        id_chips = list(dict.fromkeys(id_chips))
+        if not id_chips:
+            raise ValidationError(detail="La lista de id_chip está vacía.")
+        if len(id_chips) > settings.BULK_MAX_IDS:
+            raise ValidationError(
+                detail=f"Máximo {settings.BULK_MAX_IDS} id_chip por consulta."
+            )
+
+        # Lista IN rellenada con NULL hasta el siguiente escalón
+        params = pad_in_list(id_chips)
+        if ultimos is not None:
+            params.append(ultimos)
         try:
-            rows = self.db.select(query, (id_chip,))
+            columns, rows = self.db.run(
+                "comentarios.lote",
+                params,
+                (in_list_size(len(id_chips)), ultimos is not None),
+                raw=True,
+            )
+        except AppError:
+            raise
         except Exception as e:
             raise DatabaseError(detail=str(e))
 
-        return [ComentarioSchema.db_to_model(row) for row in rows]
+        resultado: Dict[int, List[CalidadComentarioModel]] = {
+            id_chip: [] for id_chip in id_chips
+        }
+        mapper = ComentarioSchema.model_mapper(columns)
+        for row in rows:
+            comentario = mapper(row)
+            resultado[comentario.id_chip].append(comentario)
+        return resultado
 
     # ============================================================
     # 6. Insertar comentario con idLinea incremental
+    # Una sola sentencia (ver "comentarios.insertar" en calidad_queries)
     # ============================================================
     def agregar_comentario(self, data: CrearComentario) -> CalidadComentarioModel:
 
@@ -123,55 +498,27 @@ class CalidadService:
             raise ValidationError(detail="El comentario no puede estar vacío")
 
         # ======================
-        # OBTENER SIGUIENTE idLinea
-        # ======================
-        next_line_query = """
-        SELECT ISNULL(MAX(idLinea), 0) + 1 AS next_line
-        FROM TYT_LV_TBL_CONTROL_CITAS_COM
-        WHERE idChip = ?
-        """
-
-        try:
-            res = self.db.select(next_line_query, (data.id_chip,))
-            next_line = res[0]["next_line"]
-        except Exception as e:
-            raise DatabaseError(detail=f"No se pudo obtener idLinea: {str(e)}")
-
-        # ======================
-        # INSERTAR COMENTARIO
+        # INSERTAR Y RECUPERAR
         # ======================
-        insert_query = """
-        INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM
-        (idChip, fecha, Status, cveUsuario, idLinea, Comentario)
-        VALUES (?, GETDATE(), ?, ?, ?, ?)
-        """
-
         try:
-            self.db.insert(
-                insert_query,
+            row = self.db.run(
+                "comentarios.insertar",
                 (
                     data.id_chip,
                     data.status,
                     data.cve_usuario,
-                    next_line,
                     data.comentario,
+                    data.id_chip,
                 ),
             )
+        except AppError:
+            raise
         except Exception as e:
             raise DatabaseError(detail=f"Error al insertar comentario: {str(e)}")
 
-        # ======================
-        # RECUPERAR REGISTRO INSERTADO
-        # ======================
-        select_query = """
-        SELECT *
-        FROM TYT_LV_TBL_CONTROL_CITAS_COM
-        WHERE idChip = ? AND idLinea = ?
-        """
-        try:
-            row = self.db.select(select_query, (data.id_chip, next_line))[0]
-        except Exception as e:
-            raise DatabaseError(detail=str(e))
+        # La vista puede reflejar el comentario: la siguiente lectura recarga
+        if self.board_cache.enabled:
+            self.board_cache.invalidate()
 
         return ComentarioSchema.db_to_model(row)
 
@@ -179,87 +526,325 @@ class CalidadService:
     # 7. INICIAR CALIDAD
     # ============================================================
     def iniciar_calidad(self, id: int, usuario: str) -> CalidadModel:
-        # 1. Obtener el registro
-        calidad = self.get_calidad_por_id(id)
-
-        # Validación: ya iniciada
-        if calidad.fecha_hora_ini_oper is not None:
-            raise ValidationError(detail="La calidad ya fue iniciada.")
-
-        # Validación: id_chip requerido para comentarios
-        if calidad.id_chip is None:
-            raise ValidationError(detail="El registro no tiene id_chip válido.")
-
-        # 2. Actualizar DB
-        update_query = """
-        UPDATE TYT_LV_TBL_CONTROL_CITAS
-        SET 
-            fecha_Hora_ini_Oper = GETDATE(),
-            Status = 'INICIADA'
-        WHERE id = ?
-        """
-
-        try:
-            self.db.update(update_query, (id,))
-        except Exception as e:
-            raise DatabaseError(detail=f"No se pudo iniciar la calidad: {str(e)}")
-
-        # 3. Insertar comentario automático
-        auto_comment = CrearComentario(
-            id_chip=calidad.id_chip,
-            status="INICIADA",
-            cve_usuario=usuario,
-            comentario="Calidad iniciada.",
-        )
-        self.agregar_comentario(auto_comment)
+        ok, calidad = self._transicionar("iniciar", [id], usuario)[id]
+        error = self._error_transicion("iniciar", id, ok, calidad)
+        if error is not None:
+            raise error
 
-        # 4. Devolver la calidad actualizada
-        return self.get_calidad_por_id(id)
+        self._actualizar_tablero(calidad)
+        return calidad
 
     # ============================================================
     # 8. FINALIZAR CALIDAD
     # Recibe 'Aprobado' o 'Rechazado' en status_os
     # ============================================================
     def finalizar_calidad(self, id: int, usuario: str, status_os: str) -> CalidadModel:
-        # 1. Obtener el registro
-        calidad = self.get_calidad_por_id(id)
-        calidad.status_os = status_os
+        ok, calidad = self._transicionar("finalizar", [id], usuario, status_os)[id]
+        error = self._error_transicion("finalizar", id, ok, calidad)
+        if error is not None:
+            raise error
 
-        if calidad.fecha_hora_ini_oper is None:
+        self._actualizar_tablero(calidad)
+        return calidad
+
+    # ============================================================
+    # 9. Transiciones en lote (cambio de turno)
+    # ============================================================
+    def iniciar_calidad_lote(self, ids: List[int], usuario: str) -> List[dict]:
+        return self._transicionar_lote("iniciar", ids, usuario)
+
+    def finalizar_calidad_lote(
+        self, ids: List[int], usuario: str, status_os: str
+    ) -> List[dict]:
+        return self._transicionar_lote("finalizar", ids, usuario, status_os)
+
+    def _transicionar_lote(
+        self,
+        accion: str,
+        ids: List[int],
+        usuario: str,
+        status_os: Optional[str] = None,
+    ) -> List[dict]:
+        if not ids:
+            raise ValidationError(detail="La lista de ids está vacía.")
+        if len(ids) > settings.BULK_MAX_IDS:
             raise ValidationError(
-                detail="No se puede finalizar una calidad que no ha sido iniciada."
+                detail=f"Máximo {settings.BULK_MAX_IDS} ids por lote."
             )
 
-        if calidad.fecha_hora_fin_oper is not None:
-            raise ValidationError(detail="La calidad ya está finalizada.")
+        resultados = []
+        aplicados = []
+        for id, (ok, calidad) in self._transicionar(
+            accion, ids, usuario, status_os
+        ).items():
+            error = self._error_transicion(accion, id, ok, calidad)
+            if error is None:
+                aplicados.append(calidad)
+            resultados.append(
+                {
+                    "id": id,
+                    "ok": error is None,
+                    "code": error.code if error else None,
+                    "detail": error.detail if error else None,
+                    "calidad": calidad if error is None else None,
+                }
+            )
+        # Un solo parche del snapshot para todo el lote
+        self._actualizar_tablero(*aplicados)
+        return resultados
 
-        # Validación: id_chip requerido para comentarios
-        if calidad.id_chip is None:
-            raise ValidationError(detail="El registro no tiene id_chip válido.")
-
-        # 2. Actualizar DB
-        update_query = """
-        UPDATE TYT_LV_TBL_CONTROL_CITAS
-        SET 
-            Fecha_Hora_Fin_Oper = GETDATE(),
-            Status = 'TERMINADO',
-            Status_OS = ?
-        WHERE id = ?
+    # ============================================================
+    # Transiciones: un solo batch y una sola transacción
+    # (ver "calidad.iniciar" / "calidad.finalizar" en calidad_queries)
+    # ============================================================
+    def _transicionar(
+        self,
+        accion: str,
+        ids: List[int],
+        usuario: str,
+        status_os: Optional[str] = None,
+    ) -> Dict[int, Tuple[bool, Optional[CalidadModel]]]:
         """
+        Aplica la transición `accion` a `ids` y devuelve, por id,
+        (aplicada, registro final o None si no existe).
+        """
+        spec = TRANSICIONES[accion]
+        ids = list(dict.fromkeys(ids))
+
+        if accion == "iniciar":
+            comentario = "Calidad iniciada."
+        else:
+            comentario = f"Calidad finalizada con estado: {status_os}."
 
         try:
-            self.db.update(update_query, (status_os, id))
+            (_, aplicados), (columns, filas) = self.db.run(
+                f"calidad.{accion}",
+                (usuario, comentario, status_os, *pad_in_list(ids)),
+                (in_list_size(len(ids)),),
+                raw=True,
+            )
+        except AppError:
+            raise
         except Exception as e:
-            raise DatabaseError(detail=f"No se pudo finalizar la calidad: {str(e)}")
-
-        # 3. Insertar comentario automático
-        auto_comment = CrearComentario(
-            id_chip=calidad.id_chip,
-            status="TERMINADO",
-            cve_usuario=usuario,
-            comentario=f"Calidad finalizada con estado: {status_os}.",
+            raise DatabaseError(detail=f"{spec['error']}: {str(e)}")
+
+        hechos = {row[0] for row in aplicados}
+        mapper = CalidadSchema.model_mapper(columns)
+        registros: Dict[int, CalidadModel] = {}
+        for row in filas:
+            calidad = mapper(row)
+            registros.setdefault(calidad.id, calidad)
+
+        return {id: (id in hechos, registros.get(id)) for id in ids}
+
+    @staticmethod
+    def _error_transicion(
+        accion: str, id: int, ok: bool, calidad: Optional[CalidadModel]
+    ) -> Optional[AppError]:
+        """Error equivalente a las validaciones previas, o None si se aplicó."""
+        if calidad is None:
+            return NotFoundError(detail=f"id={id}")
+        if ok:
+            return None
+
+        if accion == "iniciar":
+            # Validación: ya iniciada
+            if calidad.fecha_hora_ini_oper is not None:
+                return ValidationError(detail="La calidad ya fue iniciada.")
+        else:
+            if calidad.fecha_hora_ini_oper is None:
+                return ValidationError(
+                    detail="No se puede finalizar una calidad que no ha sido iniciada."
+                )
+            if calidad.fecha_hora_fin_oper is not None:
+                return ValidationError(detail="La calidad ya está finalizada.")
+
+        # Validación: id_chip requerido para comentarios
+        return ValidationError(detail="El registro no tiene id_chip válido.")
+
+    # ============================================================
+    # 10. Calentamiento al arrancar
+    # Ejecuta una vez las consultas más usadas del tablero para que SQL
+    # Server compile y guarde sus planes, se carguen el snapshot y los
+    # mapeadores de filas antes de la primera petición real.
+    # ============================================================
+    def calentar(self, muestra: int = 20) -> None:
+        tablero = self.get_vehiculos_en_fase_calidad()
+
+        id_chips = [m.id_chip for m in tablero if m.id_chip is not None][:muestra]
+        if id_chips:
+            self.get_comentarios_lote(id_chips)
+            self.get_comentarios_lote(id_chips, ultimos=1)
+
+        self.buscar_en_fase(limit=1)
+
+
+def _en_fondo(fn, *args):
+    """Trabajo sin petición (calentamiento): carril de fondo de la admisión."""
+    with admission.background():
+        return fn(*args)
+
+
+async def _encadenar(primero: bytes, resto: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    try:
+        yield primero
+        async for chunk in resto:
+            yield chunk
+    finally:
+        # Cliente desconectado: cerrar ya el resto (conexión y cupo)
+        await resto.aclose()
+
+
+class AsyncCalidadService:
+    """
+    Variante asíncrona de CalidadService para las rutas `async def`.
+
+    Cada operación se ejecuta completa (todas sus consultas) en el executor
+    ODBC dedicado: un solo salto de hilo por petición y ningún hilo del
+    servidor bloqueado esperando a la base de datos. Antes de ocupar un
+    hilo pasa por el control de admisión (`app/core/admission.py`) en el
+    carril de lectura o de escritura.
+    """
+
+    def __init__(
+        self,
+        service: Optional[CalidadService] = None,
+        executor: DBExecutor = db_executor,
+    ):
+        self.service = service or CalidadService()
+        self.executor = executor
+
+    async def _run(self, lane: str, fn, *args):
+        async with admission.slot(lane):
+            return await self.executor.run(fn, *args)
+
+    async def _run_tablero(self, fn, *args):
+        """Lecturas del tablero: sin cupo de BD si el snapshot responde desde memoria."""
+        cache = self.service.board_cache
+        if cache.enabled and cache.servable():
+            return await self.executor.run(fn, *args)
+        return await self._run(READ, fn, *args)
+
+    async def get_vehiculos_en_fase_calidad(
+        self, fields: Optional[List[str]] = None
+    ) -> List[Calidad]:
+        return await self._run_tablero(
+            self.service.get_vehiculos_en_fase_calidad, fields
+        )
+
+    async def get_tablero(
+        self, fields: Optional[List[str]] = None
+    ) -> Tuple[Optional[str], List[Calidad]]:
+        return await self._run_tablero(self.service.get_tablero, fields)
+
+    async def get_cambios_tablero(self, since: Optional[str] = None) -> dict:
+        return await self._run_tablero(self.service.get_cambios_tablero, since)
+
+    async def buscar_en_fase(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> dict:
+        return await self._run(
+            READ, self.service.buscar_en_fase, filtros, sort, limit, cursor, fields
+        )
+
+    async def exportar_en_fase(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        sort: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[bytes]:
+        chunks = self._exportar(filtros, sort, fields)
+        # El primer fragmento llega cuando la consulta ya se ejecutó: los
+        # errores de admisión, validación o BD salen aquí, antes de empezar
+        # a responder
+        primero = await chunks.__anext__()
+        return _encadenar(primero, chunks)
+
+    async def _exportar(
+        self,
+        filtros: Optional[Dict[str, Any]],
+        sort: Optional[str],
+        fields: Optional[List[str]],
+    ) -> AsyncIterator[bytes]:
+        # La conexión queda tomada hasta enviar el último fragmento: el cupo
+        # del carril de streams también. Ya iniciado, el generador libera
+        # ambos aunque el cliente se vaya (aclose al descartarlo)
+        await admission.acquire(STREAM)
+        try:
+            chunks = self.executor.iterate(
+                self.service.exportar_en_fase(filtros, sort, fields)
+            )
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+        finally:
+            admission.release(STREAM)
+
+    async def get_vehiculo_por_id(
+        self, id_hd: int, fields: Optional[List[str]] = None
+    ) -> List[Calidad]:
+        return await self._run(
+            READ, self.service.get_vehiculo_por_id, id_hd, fields
+        )
+
+    async def get_calidad_por_id(
+        self, id: int, fields: Optional[List[str]] = None
+    ) -> Calidad:
+        return await self._run(READ, self.service.get_calidad_por_id, id, fields)
+
+    async def get_vehiculo_info(
+        self, id_hd: int, fields: Optional[List[str]] = None
+    ) -> Calidad:
+        return await self._run(READ, self.service.get_vehiculo_info, id_hd, fields)
+
+    async def get_detalle_vehiculo(
+        self, id_hd: int, fields: Optional[List[str]] = None
+    ) -> dict:
+        return await self._run(READ, self.service.get_detalle_vehiculo, id_hd, fields)
+
+    async def get_comentarios(self, id_chip: int) -> List[CalidadComentarioModel]:
+        return await self._run(READ, self.service.get_comentarios, id_chip)
+
+    async def get_comentarios_lote(
+        self, id_chips: List[int], ultimos: Optional[int] = None
+    ) -> Dict[int, List[CalidadComentarioModel]]:
+        return await self._run(
+            READ, self.service.get_comentarios_lote, id_chips, ultimos
+        )
+
+    async def agregar_comentario(
+        self, data: CrearComentario
+    ) -> CalidadComentarioModel:
+        return await self._run(WRITE, self.service.agregar_comentario, data)
+
+    async def iniciar_calidad(self, id: int, usuario: str) -> CalidadModel:
+        return await self._run(WRITE, self.service.iniciar_calidad, id, usuario)
+
+    async def finalizar_calidad(
+        self, id: int, usuario: str, status_os: str
+    ) -> CalidadModel:
+        return await self._run(
+            WRITE, self.service.finalizar_calidad, id, usuario, status_os
+        )
+
+    async def iniciar_calidad_lote(self, ids: List[int], usuario: str) -> List[dict]:
+        return await self._run(
+            WRITE, self.service.iniciar_calidad_lote, ids, usuario
+        )
+
+    async def finalizar_calidad_lote(
+        self, ids: List[int], usuario: str, status_os: str
+    ) -> List[dict]:
+        return await self._run(
+            WRITE, self.service.finalizar_calidad_lote, ids, usuario, status_os
         )
-        self.agregar_comentario(auto_comment)
 
-        # 4. Devolver la calidad actualizada
-        return self.get_calidad_por_id(id)
+    async def calentar(self) -> None:
+        await self.executor.run(_en_fondo, self.service.calentar)
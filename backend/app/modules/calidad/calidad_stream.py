@@ -0,0 +1,208 @@
+# app/modules/calidad/calidad_stream.py
+
+import asyncio
+import logging
+from typing import Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+
+from .calidad_schema_api import CalidadCambiosResponse
+from .calidad_service import AsyncCalidadService
+
+logger = logging.getLogger(__name__)
+
+_cambios_adapter = TypeAdapter(CalidadCambiosResponse)
+
+# Cierre por consumidor lento: el cliente debe reconectar (recibe todo)
+WS_CLOSE_TRY_AGAIN = 1013
+
+
+def _render(cambios: dict) -> str:
+    return _cambios_adapter.dump_json(
+        _cambios_adapter.validate_python(cambios, from_attributes=True)
+    ).decode()
+
+
+class BoardSubscriber:
+    """Cola acotada de mensajes pendientes de una pantalla conectada."""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, message: str) -> bool:
+        """Encola sin esperar. Si la cola está llena deja solo la marca de cierre."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class BoardBroadcaster:
+    """
+    Difunde los cambios del tablero a todas las pantallas conectadas.
+
+    Una sola tarea en segundo plano consulta los cambios del snapshot
+    (`get_cambios_tablero`) cada `poll_interval` segundos, o de inmediato
+    cuando el servicio escribe, y reparte el mismo mensaje serializado a
+    todos los suscriptores. Así la carga sobre la BD no depende del número
+    de pantallas abiertas.
+
+    Cada suscriptor tiene una cola de `queue_size` mensajes; si se llena, la
+    conexión se cierra con 1013 y el cliente vuelve a empezar con el
+    tablero completo. La tarea solo corre mientras haya suscriptores.
+    """
+
+    def __init__(
+        self,
+        service: AsyncCalidadService,
+        poll_interval: float = settings.BOARD_STREAM_POLL_INTERVAL,
+        queue_size: int = settings.BOARD_STREAM_QUEUE_SIZE,
+    ):
+        self.service = service
+        self.board_cache = service.service.board_cache
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+
+        self._subscribers: Set[BoardSubscriber] = set()
+        # Recién conectados: esperan el tablero completo
+        self._pending: Set[BoardSubscriber] = set()
+        self._token: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    # ----------------------------------------
+    # WebSocket
+    # ----------------------------------------
+    async def serve(self, websocket: WebSocket):
+        await websocket.accept()
+        subscriber = self.subscribe()
+
+        sender = asyncio.create_task(self._send_loop(websocket, subscriber))
+        receiver = asyncio.create_task(self._receive_loop(websocket))
+        try:
+            await asyncio.wait(
+                {sender, receiver}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            self.unsubscribe(subscriber)
+
+    async def _send_loop(self, websocket: WebSocket, subscriber: BoardSubscriber):
+        while True:
+            message = await subscriber.queue.get()
+            if message is None:
+                await websocket.close(code=WS_CLOSE_TRY_AGAIN)
+                return
+            await websocket.send_text(message)
+
+    async def _receive_loop(self, websocket: WebSocket):
+        # Los clientes no envían nada; solo se espera la desconexión
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    # ----------------------------------------
+    # Suscripción
+    # ----------------------------------------
+    def subscribe(self) -> BoardSubscriber:
+        subscriber = BoardSubscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        self._pending.add(subscriber)
+        self._ensure_started()
+        self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: BoardSubscriber):
+        self._subscribers.discard(subscriber)
+        self._pending.discard(subscriber)
+
+    async def stop(self):
+        for subscriber in list(self._subscribers):
+            subscriber.offer(None)
+            self.unsubscribe(subscriber)
+
+        task = self._task
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # ----------------------------------------
+    # Sondeo compartido
+    # ----------------------------------------
+    def _ensure_started(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._token = None
+        self.board_cache.add_listener(self._on_change)
+        self._task = asyncio.create_task(self._run())
+
+    def _on_change(self, version: int):
+        # Llamado desde los hilos ODBC cuando el servicio cambia el tablero
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+                try:
+                    await self._broadcast()
+                except Exception:
+                    logger.exception("Error difundiendo cambios del tablero")
+        finally:
+            # Sin awaits desde la última comprobación: un subscribe()
+            # posterior arranca una tarea nueva
+            self.board_cache.remove_listener(self._on_change)
+            self._task = None
+
+    async def _broadcast(self):
+        pending = set(self._pending)
+        self._pending.clear()
+
+        cambios = await self.service.get_cambios_tablero(self._token)
+        self._token = cambios["token"]
+
+        if cambios["completo"]:
+            # Token inválido o primera vuelta: todos reciben el tablero
+            self._fan_out(_render(cambios), self._subscribers)
+            return
+
+        if cambios["actualizados"] or cambios["eliminados"]:
+            self._fan_out(_render(cambios), self._subscribers - pending)
+
+        if pending:
+            # Se calcula después del delta: su versión es igual o posterior
+            completo = await self.service.get_cambios_tablero(None)
+            self._fan_out(_render(completo), pending & self._subscribers)
+
+    def _fan_out(self, message: str, subscribers):
+        for subscriber in list(subscribers):
+            if not subscriber.offer(message):
+                logger.warning("Suscriptor del tablero descartado por lento")
+                self.unsubscribe(subscriber)
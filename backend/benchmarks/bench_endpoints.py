@@ -0,0 +1,392 @@
+"""
+Benchmark de las rutas de /api/calidad contra una BD local.
+
+Levanta la app real (FastAPI + DB + CalidadService) con `odbc_standin` en
+lugar de pyodbc, siembra `v_validad_hyp` y los comentarios, y lanza cada
+ruta con la concurrencia indicada, `--repeat` veces. Reporta por ruta la
+mediana de las corridas: peticiones/s, latencia p50/p95/p99 y sentencias
+SQL por petición.
+
+Con `--save-baseline` guarda el resultado; con `--baseline` lo compara y
+termina con código 1 si alguna ruta empeora más de `--tolerance` (relativo
+a la línea base), hace más consultas por petición, tiene más errores o no
+está en la línea base.
+
+Las rutas de transición consumen un id distinto por petición; la siembra
+agrega los que falten para warmup + repeticiones × peticiones, así
+ninguna se queda sin ids a mitad de la corrida.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_endpoints --rows 2000 --latency-ms 2 -c 20
+    python -m benchmarks.bench_endpoints --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_endpoints --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks import odbc_standin  # noqa: E402
+
+BASE = "/api/calidad"
+CALIDAD_FASE_ID = 5
+PREVIUS_FASE_ID = 4
+
+
+# ============================================================
+# Escenarios: una entrada por ruta de calidad_router.py
+# Cada uno devuelve (método, ruta, cuerpo JSON o None).
+# ============================================================
+# Rutas que consumen ids: pool del que toman y cuántos por petición
+# (None = `--batch`). Cada id se transiciona una sola vez.
+CONSUMES = {
+    "iniciar": ("pendientes", 1),
+    "finalizar": ("iniciados", 1),
+    "iniciar_lote": ("pendientes", None),
+    "finalizar_lote": ("iniciados", None),
+}
+
+
+def ids_needed(routes, rounds: int, batch: int) -> dict:
+    """Ids de cada pool que consumen `rounds` peticiones de cada ruta."""
+    needed = {"pendientes": 0, "iniciados": 0}
+    for name in routes:
+        if name in CONSUMES:
+            pool, per_request = CONSUMES[name]
+            needed[pool] += rounds * (per_request or batch)
+    return needed
+
+
+def scenarios(data: dict, batch: int) -> dict:
+    rnd = random.Random(7)
+    ids = list(data["calidad_ids"])
+    pools = {
+        "pendientes": iter(data["pendientes"]),
+        "iniciados": iter(data["iniciados"]),
+    }
+    chip = data["chip"]
+
+    def some_id():
+        return rnd.choice(ids)
+
+    def take(pool, n):
+        # Los pools se siembran a la medida (ids_needed): quedarse sin ids
+        # es un error del benchmark, no una petición a medir
+        taken = list(itertools.islice(pools[pool], n))
+        if len(taken) < n:
+            raise RuntimeError(f"Sin ids {pool} suficientes para el benchmark")
+        return taken
+
+    return {
+        "auth_me": lambda: ("GET", f"{BASE}/auth/me/", None),
+        "listar": lambda: ("GET", f"{BASE}/", None),
+        "listar_fields": lambda: ("GET", f"{BASE}/?fields=id,no_orden,status", None),
+        "listar_filtrado": lambda: (
+            "GET",
+            f"{BASE}/?status=PENDIENTE&id_tecnico={rnd.randrange(25)}&sort=-fecha&limit=50",
+            None,
+        ),
+        "exportar": lambda: ("GET", f"{BASE}/export/", None),
+        "cambios": lambda: ("GET", f"{BASE}/cambios/", None),
+        "stream": lambda: ("WS", f"{BASE}/stream/", None),
+        "vehiculo": lambda: ("GET", f"{BASE}/vehiculo/{some_id()}/", None),
+        "item": lambda: ("GET", f"{BASE}/item/{some_id()}/", None),
+        "vehiculo_info": lambda: ("GET", f"{BASE}/vehiculo-info/{some_id()}/", None),
+        "vehiculo_detalle": lambda: ("GET", f"{BASE}/vehiculo/{some_id()}/detalle/", None),
+        "comentarios": lambda: ("GET", f"{BASE}/comentarios/{chip(some_id())}/", None),
+        "comentarios_lote": lambda: (
+            "GET",
+            f"{BASE}/comentarios/?ultimos=3&"
+            + "&".join(f"id_chip={chip(some_id())}" for _ in range(batch)),
+            None,
+        ),
+        "agregar_comentario": lambda: (
+            "POST",
+            f"{BASE}/comentarios/",
+            {
+                "id_chip": chip(some_id()),
+                "status": "INICIADA",
+                "cve_usuario": "bench",
+                "comentario": "Comentario de benchmark",
+            },
+        ),
+        "iniciar": lambda: (
+            "POST",
+            f"{BASE}/{take('pendientes', 1)[0]}/iniciar/",
+            {"usuario": "bench", "status_os": None},
+        ),
+        "finalizar": lambda: (
+            "POST",
+            f"{BASE}/{take('iniciados', 1)[0]}/finalizar/",
+            {"usuario": "bench", "status_os": "Aprobado"},
+        ),
+        "iniciar_lote": lambda: (
+            "POST",
+            f"{BASE}/iniciar/lote/",
+            {"ids": take("pendientes", batch), "usuario": "bench", "status_os": None},
+        ),
+        "finalizar_lote": lambda: (
+            "POST",
+            f"{BASE}/finalizar/lote/",
+            {"ids": take("iniciados", batch), "usuario": "bench", "status_os": "Aprobado"},
+        ),
+    }
+
+
+# ============================================================
+# Cliente
+# ============================================================
+async def websocket_roundtrip(app, path: str) -> int:
+    """Conecta por ASGI, espera el primer mensaje (tablero) y desconecta."""
+    incoming: asyncio.Queue = asyncio.Queue()
+    outgoing: asyncio.Queue = asyncio.Queue()
+    await incoming.put({"type": "websocket.connect"})
+
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "scheme": "ws",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+        "subprotocols": [],
+    }
+    task = asyncio.create_task(app(scope, incoming.get, outgoing.put))
+    try:
+        status = 500
+        while True:
+            message = await outgoing.get()
+            if message["type"] == "websocket.accept":
+                continue
+            if message["type"] == "websocket.send":
+                status = 200
+            break
+        await incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(task, 5)
+        return status
+    finally:
+        task.cancel()
+
+
+async def run_scenario(client, app, make, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            method, path, body = make()
+            start = time.perf_counter()
+            if method == "WS":
+                status = await websocket_roundtrip(app, path)
+            else:
+                response = await client.request(method, path, json=body)
+                await response.aread()
+                status = response.status_code
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+    # Que la basura de la ruta anterior no se cobre en esta
+    gc.collect()
+    before = odbc_standin.stats()["statements"]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    statements = odbc_standin.stats()["statements"] - before
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "queries_per_request": statements / requests,
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from app.main import app
+
+    warmup = min(args.warmup, args.requests)
+    # Sin --routes corren todas, también las que consumen ids
+    rounds = warmup + args.repeat * args.requests
+    needed = ids_needed(args.routes or CONSUMES, rounds, args.batch)
+    data = odbc_standin.seed(
+        rows=args.rows,
+        comments_per_chip=args.comments,
+        calidad_fase_id=CALIDAD_FASE_ID,
+        previus_fase_id=PREVIUS_FASE_ID,
+        min_pendientes=needed["pendientes"],
+        min_iniciados=needed["iniciados"],
+    )
+    odbc_standin.configure(
+        latency=args.latency_ms / 1000, row_latency=args.row_latency_us / 1e6
+    )
+    available = scenarios(data, args.batch)
+    selected = args.routes or list(available)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Igual que el balanceador: no se mide hasta que la app está lista
+            for _ in range(300):
+                if (await client.get("/health/ready")).status_code == 200:
+                    break
+                await asyncio.sleep(0.1)
+            for name in selected:
+                make = available[name]
+                # Calentamiento: carga del snapshot, pool, mapeadores
+                await run_scenario(client, app, make, warmup, 1)
+                runs = [
+                    await run_scenario(client, app, make, args.requests, args.concurrency)
+                    for _ in range(args.repeat)
+                ]
+                results[name] = median_run(runs)
+    return results
+
+
+def median_run(runs: list) -> dict:
+    """Mediana de cada métrica entre repeticiones (errores: el total)."""
+    result = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+    result["requests"] = runs[0]["requests"]
+    result["errors"] = sum(r["errors"] for r in runs)
+    return result
+
+
+# ============================================================
+# Reporte y línea base
+# ============================================================
+def report(results: dict):
+    print(
+        f"{'ruta':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'sql/req':>10}{'errores':>9}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<20}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+            f"{r['p99_ms']:>10.2f}{r['queries_per_request']:>10.2f}{r['errors']:>9}"
+        )
+
+
+def compare(results: dict, baseline: dict, tolerance: float, floor_ms: float) -> list:
+    """
+    Regresiones de `results` respecto a `baseline`. p95 y req/s se comparan
+    en relativo (`tolerance`); p95 además debe crecer más de `floor_ms`,
+    para que el ruido de rutas de fracciones de ms no cuente. Una ruta sin
+    línea base también es regresión: la línea base quedó vieja.
+    """
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            regressions.append(f"{name}: sin línea base (regenerar con --save-baseline)")
+            continue
+        if r["queries_per_request"] > base["queries_per_request"] + 0.01:
+            regressions.append(
+                f"{name}: sql/req {base['queries_per_request']:.2f} -> {r['queries_per_request']:.2f}"
+            )
+        if r["p95_ms"] > max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + floor_ms):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {r['p95_ms']:.2f} ms")
+        if r["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: req/s {base['rps']:.1f} -> {r['rps']:.1f}")
+        if r["errors"] > base["errors"]:
+            regressions.append(f"{name}: errores {base['errors']} -> {r['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000, help="registros en fase de calidad")
+    parser.add_argument("--comments", type=int, default=5, help="comentarios por idChip")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="latencia por sentencia")
+    parser.add_argument("--row-latency-us", type=float, default=0.0, help="latencia por fila")
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("-n", "--requests", type=int, default=200, help="peticiones por ruta")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="corridas por ruta (se reporta la mediana)"
+    )
+    parser.add_argument("--batch", type=int, default=20, help="ids por petición en lote")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="BOARD_CACHE_TTL")
+    parser.add_argument("--routes", nargs="*", help="solo estas rutas")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    parser.add_argument("--baseline", help="comparar contra esta línea base")
+    parser.add_argument("--save-baseline", help="guardar resultados como línea base")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="empeoramiento relativo admitido"
+    )
+    parser.add_argument(
+        "--floor-ms", type=float, default=1.0, help="aumento mínimo de p95 que cuenta"
+    )
+    args = parser.parse_args()
+
+    # Settings de la app antes de importarla
+    env = {
+        "DB_SERVER": "bench",
+        "DB_USER": "bench",
+        "DB_PASSWORD": "bench",
+        "DB_NAME": "bench",
+        "CALIDAD_FASE_ID": str(CALIDAD_FASE_ID),
+        "PREVIUS_FASE_ID": str(PREVIUS_FASE_ID),
+        "tracker_url": "https://tracker.example/orden/{no_order}",
+        "BULK_MAX_IDS": str(max(200, args.batch)),
+    }
+    if args.cache_ttl is not None:
+        env["BOARD_CACHE_TTL"] = str(args.cache_ttl)
+    for key, value in env.items():
+        os.environ.setdefault(key, value)
+    odbc_standin.install()
+
+    results = asyncio.run(run(args))
+    report(results)
+
+    output = {
+        "config": {
+            k: getattr(args, k)
+            for k in ("rows", "comments", "latency_ms", "row_latency_us", "concurrency", "requests", "repeat", "batch", "cache_ttl")
+        },
+        "results": results,
+    }
+    for path in filter(None, (args.json, args.save_baseline)):
+        Path(path).write_text(json.dumps(output, indent=2) + "\n")
+        print(f"Resultados guardados en {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("config") != output["config"]:
+            print("Aviso: la línea base se generó con otra configuración")
+        regressions = compare(results, baseline, args.tolerance, args.floor_ms)
+        if regressions:
+            print("Regresiones respecto a la línea base:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("Sin regresiones respecto a la línea base")
+
+
+if __name__ == "__main__":
+    main()
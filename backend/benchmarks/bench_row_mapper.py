@@ -0,0 +1,147 @@
+"""
+Costo por fila del mapeo SQL -> modelo.
+
+Compara el camino anterior (dict por fila + `CalidadModel(**...)` con
+validación y `str.format` del tracker) contra el mapeador precompilado de
+`CalidadSchema` / `ComentarioSchema` (índices por columna, tuplas y
+`model_construct`). No necesita base de datos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_row_mapper --rows 5000 --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Settings mínimos para importar la app sin .env
+for key, value in {
+    "DB_SERVER": "bench",
+    "DB_USER": "bench",
+    "DB_PASSWORD": "bench",
+    "DB_NAME": "bench",
+    "CALIDAD_FASE_ID": "5",
+    "PREVIUS_FASE_ID": "4",
+    "tracker_url": "https://tracker.example/orden/{no_order}",
+}.items():
+    os.environ.setdefault(key, value)
+
+from app.core.config import settings  # noqa: E402
+from app.modules.calidad.calidad_model import (  # noqa: E402
+    CalidadComentarioModel,
+    CalidadModel,
+)
+from app.modules.calidad.calidad_schema import (  # noqa: E402
+    CALIDAD_COLUMNS,
+    COMENTARIO_COLUMNS,
+    CalidadSchema,
+    ComentarioSchema,
+)
+
+CALIDAD_COLS = list(CALIDAD_COLUMNS.values())
+COMENTARIO_COLS = list(COMENTARIO_COLUMNS.values())
+
+
+def calidad_rows(n: int) -> list:
+    fecha = datetime(2026, 1, 1, 8, 30)
+    return [
+        (
+            i, 100 + i, 1000 + i, fecha, "PENDIENTE", "Rojo", "Corolla",
+            f"OS{i}", "ABC123", 7, 8, fecha, None, "ABIERTA", 12000,
+            "Juan Pérez", "5555555555", 10, 20, "Servicio 10,000 km",
+            "Capturado", 5, "Técnico", "Asesor",
+        )
+        for i in range(n)
+    ]
+
+
+def comentario_rows(n: int) -> list:
+    fecha = datetime(2026, 1, 1, 8, 30)
+    return [(100 + i, fecha, "INICIADA", "usuario", i, "Calidad iniciada.") for i in range(n)]
+
+
+# ============================================================
+# Camino anterior (referencia)
+# ============================================================
+def legacy_calidad(columns, rows):
+    result = []
+    for row in [dict(zip(columns, r)) for r in rows]:
+        def calculate_tracker_url(no_orden: str) -> str:
+            from app.core.config import settings
+
+            return settings.TRACKER_URL.format(no_order=no_orden)
+
+        result.append(
+            CalidadModel(
+                **{field: row.get(column) for field, column in CALIDAD_COLUMNS.items()},
+                tracker_url=(
+                    calculate_tracker_url(row.get("noOrden"))
+                    if row.get("noOrden")
+                    else None
+                ),
+            )
+        )
+    return result
+
+
+def legacy_comentario(columns, rows):
+    return [
+        CalidadComentarioModel(
+            **{field: row.get(column) for field, column in COMENTARIO_COLUMNS.items()}
+        )
+        for row in [dict(zip(columns, r)) for r in rows]
+    ]
+
+
+# ============================================================
+# Camino actual
+# ============================================================
+def compiled_calidad(columns, rows):
+    mapper = CalidadSchema.model_mapper(columns)
+    return [mapper(row) for row in rows]
+
+
+def compiled_comentario(columns, rows):
+    mapper = ComentarioSchema.model_mapper(columns)
+    return [mapper(row) for row in rows]
+
+
+def measure(fn, columns, rows, repeat: int) -> float:
+    """Mejor tiempo por fila (µs) de `repeat` corridas."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(columns, rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ("calidad", CALIDAD_COLS, calidad_rows(args.rows), legacy_calidad, compiled_calidad),
+        ("comentario", COMENTARIO_COLS, comentario_rows(args.rows), legacy_comentario, compiled_comentario),
+    ]
+
+    print(f"{args.rows} filas, mejor de {args.repeat} (TRACKER_URL={settings.TRACKER_URL})")
+    print(f"{'mapeo':<12}{'antes µs/fila':>16}{'después µs/fila':>18}{'mejora':>10}")
+    for name, columns, rows, legacy, compiled in cases:
+        # Mismo resultado en ambos caminos
+        assert legacy(columns, rows[:50]) == compiled(columns, rows[:50])
+
+        before = measure(legacy, columns, rows, args.repeat)
+        after = measure(compiled, columns, rows, args.repeat)
+        print(f"{name:<12}{before:>16.2f}{after:>18.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
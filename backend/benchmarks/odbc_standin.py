@@ -0,0 +1,493 @@
+"""
+Base de datos local para benchmarks: un módulo con la interfaz de pyodbc
+que la app usa (connect, cursores, result sets múltiples, errores), sobre
+SQLite en memoria.
+
+- Las tablas `v_validad_hyp` y `TYT_LV_TBL_CONTROL_CITAS_COM` se siembran
+  con `seed()` (número de filas y comentarios configurables).
+- Los SELECT de la app se ejecutan en SQLite tras traducir lo mínimo de
+  T-SQL (TOP, ISNULL, GETDATE, hints de bloqueo).
+- Los batches T-SQL de escritura (transiciones, INSERT ... OUTPUT) se
+  reproducen en Python con la misma semántica.
+- `configure(latency=..., row_latency=...)` simula el viaje a la red por
+  sentencia y el costo por fila; `stats()` cuenta las sentencias.
+  Esa espera respeta `connection.timeout` (HYT00) y `cursor.cancel()`
+  (HY008), como el driver real.
+
+Se instala con `install()` antes de importar la app (reemplaza `pyodbc`
+en `sys.modules`). Solo para benchmarks: no forma parte de la app.
+"""
+
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+# ============================================================
+# Interfaz pyodbc
+# ============================================================
+pooling = True
+
+# Tipos SQL de setinputsizes (mismos valores que ODBC)
+SQL_VARCHAR = 12
+SQL_WVARCHAR = -9
+SQL_INTEGER = 4
+SQL_BIGINT = -5
+SQL_TYPE_TIMESTAMP = 93
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+_settings = {"latency": 0.0, "row_latency": 0.0}
+_stats_lock = threading.Lock()
+_stats = {"connections": 0, "statements": 0, "pings": 0, "rollbacks": 0, "rows": 0}
+
+# Una sola conexión SQLite serializada: el tiempo de "red" se simula fuera
+# del lock, así la concurrencia se parece a la de un servidor remoto
+_db_lock = threading.RLock()
+_db = None
+
+
+def configure(latency: float = 0.0, row_latency: float = 0.0):
+    """`latency`: segundos por sentencia; `row_latency`: segundos por fila."""
+    _settings["latency"] = latency
+    _settings["row_latency"] = row_latency
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def connect(*args, **kwargs):
+    if _db is None:
+        raise OperationalError("odbc_standin: llamar a seed() antes de conectar")
+    _count("connections")
+    return Connection()
+
+
+class Connection:
+    def __init__(self):
+        self.autocommit = True
+        self.timeout = 0
+        self.closed = False
+
+    def cursor(self):
+        if self.closed:
+            raise InterfaceError("Conexión cerrada")
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class Cursor:
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self._sets = []
+        self._rows = []
+        self._cancelled = threading.Event()
+
+    def execute(self, query: str, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = tuple(params[0])
+
+        ping = query.strip().upper() == "SELECT 1"
+        _count("pings" if ping else "statements")
+
+        with _db_lock:
+            sets = _execute(query, list(params))
+
+        rows = sum(len(r) for _, r in sets)
+        _count("rows", rows)
+        delay = _settings["latency"] + _settings["row_latency"] * rows
+        if delay and not ping:
+            self._wait(delay)
+
+        self._sets = sets
+        self._next()
+        return self
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size: int = 1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def nextset(self):
+        return True if self._next() else None
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _wait(self, delay: float):
+        timeout = self.connection.timeout
+        if timeout and delay > timeout:
+            if self._cancelled.wait(timeout):
+                raise OperationalError("HY008", "Operation canceled")
+            raise OperationalError("HYT00", "Query timeout expired")
+        if self._cancelled.wait(delay):
+            raise OperationalError("HY008", "Operation canceled")
+
+    def close(self):
+        self._sets = []
+        self._rows = []
+
+    def _next(self) -> bool:
+        if not self._sets:
+            self.description = None
+            self._rows = []
+            return False
+        columns, rows = self._sets.pop(0)
+        self.description = (
+            [(c, None, None, None, None, None, None) for c in columns]
+            if columns is not None
+            else None
+        )
+        self._rows = list(rows)
+        self.rowcount = len(rows)
+        return True
+
+
+# ============================================================
+# Datos sembrados
+# ============================================================
+VIEW_COLUMNS = [
+    ("id", "INTEGER PRIMARY KEY"),
+    ("idChip", "INTEGER"),
+    ("id_hd", "INTEGER"),
+    ("fecha", "TIMESTAMP"),
+    ("status", "TEXT"),
+    ("color", "TEXT"),
+    ("vehiculo", "TEXT"),
+    ("noOrden", "TEXT"),
+    ("noPlacas", "TEXT"),
+    ("idTecnico", "INTEGER"),
+    ("idAsesor", "INTEGER"),
+    ("fecha_hora_ini_oper", "TIMESTAMP"),
+    ("fecha_hora_fin_oper", "TIMESTAMP"),
+    ("status_os", "TEXT"),
+    ("kilometraje", "INTEGER"),
+    ("contactoNombre", "TEXT"),
+    ("contactoTelefono", "TEXT"),
+    ("tmp_Real", "INTEGER"),
+    ("tmp_original", "INTEGER"),
+    ("servicio", "TEXT"),
+    ("servicioCapturado", "TEXT"),
+    ("idTecnicoAsi", "INTEGER"),
+    ("tecnico", "TEXT"),
+    ("asesor", "TEXT"),
+]
+
+COMMENT_COLUMNS = [
+    ("idChip", "INTEGER"),
+    ("fecha", "TIMESTAMP"),
+    ("Status", "TEXT"),
+    ("cveUsuario", "TEXT"),
+    ("idLinea", "INTEGER"),
+    ("Comentario", "TEXT"),
+]
+
+STATUSES = ["PENDIENTE", "INICIADA", "DETENIDA"]
+STATUS_OS = ["ABIERTA", "EN PROCESO"]
+
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.isoformat(" ")
+
+
+def _convert_timestamp(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+
+def seed(
+    rows: int = 1000,
+    previous_rows: int = None,
+    comments_per_chip: int = 5,
+    calidad_fase_id: int = 5,
+    previus_fase_id: int = 4,
+    min_pendientes: int = 0,
+    min_iniciados: int = 0,
+) -> dict:
+    """
+    Crea y llena las tablas. Ids 1..rows están en la fase de calidad
+    (un tercio sin iniciar, un tercio iniciados, el resto en otros
+    estados) y los siguientes `previous_rows` en la fase previa, con el
+    mismo id_hd que un registro de calidad. Devuelve los rangos de ids.
+
+    Si la fase de calidad no alcanza `min_pendientes` / `min_iniciados`
+    ids para iniciar / finalizar, se agregan los que falten en otra fase
+    (fuera del tablero y de la foto), de modo que ni el listado ni el
+    costo de los parches cambian con el número de transiciones.
+    """
+    global _db
+    previous_rows = rows // 2 if previous_rows is None else previous_rows
+    pendientes = [i for i in range(1, rows + 1) if i % 3 != 2]
+    iniciados = [i for i in range(1, rows + 1) if i % 3 == 2]
+    spare_start = rows + previous_rows + 1
+    spare_pendientes = max(0, min_pendientes - len(pendientes))
+    spare_iniciados = max(0, min_iniciados - len(iniciados))
+    spare_fase_id = max(calidad_fase_id, previus_fase_id) + 1
+
+    db = sqlite3.connect(
+        ":memory:", check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+    )
+    db.execute(
+        "CREATE TABLE v_validad_hyp ("
+        + ", ".join(f"{name} {kind}" for name, kind in VIEW_COLUMNS)
+        + ")"
+    )
+    db.execute("CREATE INDEX ix_fase ON v_validad_hyp (idTecnicoAsi)")
+    db.execute("CREATE INDEX ix_hd ON v_validad_hyp (id_hd)")
+    db.execute(
+        "CREATE TABLE TYT_LV_TBL_CONTROL_CITAS_COM ("
+        + ", ".join(f"{name} {kind}" for name, kind in COMMENT_COLUMNS)
+        + ")"
+    )
+    db.execute(
+        "CREATE INDEX ix_chip ON TYT_LV_TBL_CONTROL_CITAS_COM (idChip, idLinea)"
+    )
+
+    base = datetime(2026, 1, 1, 8, 0)
+    view_rows = []
+
+    def add_row(i: int, id_hd: int, status: str, started: bool, fase_id: int):
+        fecha = base + timedelta(minutes=i)
+        view_rows.append(
+            (
+                i,
+                100000 + i,
+                id_hd,
+                fecha,
+                status,
+                "Rojo",
+                f"Vehículo {i % 40}",
+                f"OS{i:07d}",
+                f"ABC{i % 1000:03d}",
+                i % 25,
+                i % 12,
+                fecha + timedelta(minutes=5) if started else None,
+                None,
+                STATUS_OS[i % 2],
+                10000 + i,
+                f"Contacto {i}",
+                "5555555555",
+                30,
+                45,
+                "Servicio de mantenimiento",
+                "Capturado",
+                fase_id,
+                f"Técnico {i % 25}",
+                f"Asesor {i % 12}",
+            )
+        )
+
+    for i in range(1, rows + previous_rows + 1):
+        if i <= rows:
+            add_row(i, i, STATUSES[i % 3], i % 3 == 2, calidad_fase_id)
+        else:
+            add_row(i, i - rows, STATUSES[i % 3], False, previus_fase_id)
+    for n in range(spare_pendientes + spare_iniciados):
+        i = spare_start + n
+        started = n >= spare_pendientes
+        add_row(i, i, STATUSES[i % 3], started, spare_fase_id)
+        (iniciados if started else pendientes).append(i)
+    db.executemany(
+        f"INSERT INTO v_validad_hyp VALUES ({', '.join('?' for _ in VIEW_COLUMNS)})",
+        view_rows,
+    )
+
+    comments = [
+        (100000 + i, base + timedelta(minutes=i, seconds=n), "INICIADA", "bench", n, f"Comentario {n}")
+        for i in range(1, rows + 1)
+        for n in range(1, comments_per_chip + 1)
+    ]
+    db.executemany(
+        "INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM VALUES (?, ?, ?, ?, ?, ?)", comments
+    )
+    db.commit()
+
+    with _db_lock:
+        _db = db
+
+    return {
+        "calidad_ids": range(1, rows + 1),
+        # Sin iniciar / iniciados y sin terminar (para iniciar / finalizar)
+        "pendientes": pendientes,
+        "iniciados": iniciados,
+        "previous_ids": range(rows + 1, rows + previous_rows + 1),
+        "chip": lambda id: 100000 + id,
+    }
+
+
+def install():
+    """Reemplaza `pyodbc` por este módulo (antes de importar la app)."""
+    sys.modules["pyodbc"] = sys.modules[__name__]
+
+
+# ============================================================
+# Ejecución
+# ============================================================
+_TOP_PARAM = re.compile(r"\bSELECT\s+TOP\s*\(\s*\?\s*\)", re.IGNORECASE)
+_TOP_LITERAL = re.compile(r"\bSELECT\s+TOP\s*\(?\s*(\d+)\s*\)?", re.IGNORECASE)
+_LOCK_HINTS = re.compile(r"WITH\s*\(\s*UPDLOCK\s*,\s*HOLDLOCK\s*\)", re.IGNORECASE)
+
+
+def _execute(query: str, params: list) -> list:
+    if "@@TRANCOUNT" in query and "DECLARE" not in query:
+        # Limpieza del pool tras un error: aquí nunca quedan transacciones
+        _count("rollbacks")
+        return []
+    if "DECLARE @ids TABLE" in query:
+        return _transition(query, params)
+    if re.search(r"INSERT\s+INTO\s+TYT_LV_TBL_CONTROL_CITAS_COM", query) and "OUTPUT" in query:
+        return [_insert_comment(params)]
+
+    sets = []
+    for statement in (s.strip() for s in query.split(";")):
+        if not statement:
+            continue
+        count = statement.count("?")
+        sets.append(_select(statement, params[:count]))
+        params = params[count:]
+    return sets
+
+
+def _select(statement: str, params: list):
+    if not statement.upper().startswith("SELECT"):
+        raise ProgrammingError(f"odbc_standin: sentencia no soportada: {statement[:80]}")
+
+    statement = _LOCK_HINTS.sub("", statement)
+    statement = re.sub(r"\bISNULL\(", "IFNULL(", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\bGETDATE\(\)", "CURRENT_TIMESTAMP", statement, flags=re.IGNORECASE)
+
+    match = _TOP_PARAM.search(statement)
+    if match:
+        # TOP (?) -> LIMIT ?: el parámetro pasa al final
+        index = statement[: match.start()].count("?")
+        limit = params.pop(index)
+        statement = statement[: match.start()] + "SELECT" + statement[match.end():]
+        statement += " LIMIT ?"
+        params.append(limit)
+    else:
+        match = _TOP_LITERAL.search(statement)
+        if match:
+            statement = (
+                statement[: match.start()] + "SELECT" + statement[match.end():]
+                + f" LIMIT {match.group(1)}"
+            )
+
+    try:
+        cursor = _db.execute(statement, params)
+    except sqlite3.Error as e:
+        raise ProgrammingError(f"odbc_standin: {e}: {statement[:200]}")
+    columns = [column[0] for column in cursor.description]
+    return columns, cursor.fetchall()
+
+
+def _next_line(id_chip: int) -> int:
+    (current,) = _db.execute(
+        "SELECT IFNULL(MAX(idLinea), 0) FROM TYT_LV_TBL_CONTROL_CITAS_COM WHERE idChip = ?",
+        (id_chip,),
+    ).fetchone()
+    return current + 1
+
+
+def _insert_comment(params: list):
+    id_chip, status, usuario, comentario = params[:4]
+    row = (id_chip, datetime.now(), status, usuario, _next_line(id_chip), comentario)
+    _db.execute("INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM VALUES (?, ?, ?, ?, ?, ?)", row)
+    return [name for name, _ in COMMENT_COLUMNS], [row]
+
+
+def _transition(query: str, params: list) -> list:
+    """Batch de iniciar/finalizar (`CalidadService._transicionar`)."""
+    usuario, comentario, status_os, *ids = params
+    # La lista de ids viene rellenada con NULL hasta su escalón
+    ids = [id for id in ids if id is not None]
+    iniciar = "Status = 'INICIADA'" in query
+    now = datetime.now()
+
+    done = []
+    for id in dict.fromkeys(ids):
+        row = _db.execute(
+            "SELECT idChip, fecha_hora_ini_oper, fecha_hora_fin_oper "
+            "FROM v_validad_hyp WHERE id = ?",
+            (id,),
+        ).fetchone()
+        if row is None or row[0] is None:
+            continue
+        id_chip, ini, fin = row
+
+        if iniciar and ini is None:
+            _db.execute(
+                "UPDATE v_validad_hyp SET fecha_hora_ini_oper = ?, status = 'INICIADA' WHERE id = ?",
+                (now, id),
+            )
+            estado = "INICIADA"
+        elif not iniciar and ini is not None and fin is None:
+            _db.execute(
+                "UPDATE v_validad_hyp SET fecha_hora_fin_oper = ?, status = 'TERMINADO', "
+                "status_os = ? WHERE id = ?",
+                (now, status_os, id),
+            )
+            estado = "TERMINADO"
+        else:
+            continue
+
+        _db.execute(
+            "INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM VALUES (?, ?, ?, ?, ?, ?)",
+            (id_chip, now, estado, usuario, _next_line(id_chip), comentario),
+        )
+        done.append((id,))
+
+    # Último SELECT del batch: los registros finales de @ids
+    final = query[query.rindex("SELECT id FROM @done"):].split(";", 1)[1]
+    final = final.replace(
+        "(SELECT id FROM @ids)", "(" + ", ".join("?" for _ in ids) + ")"
+    )
+    return [(["id"], done), _select(final.strip().rstrip(";"), list(ids))]
@@ -0,0 +1,40 @@
+"""
+Las pruebas corren sin SQL Server: `benchmarks/odbc_standin.py` reemplaza
+a pyodbc (SQLite en memoria) antes de importar la app, igual que en los
+benchmarks.
+"""
+
+import os
+
+import pytest
+
+from benchmarks import odbc_standin
+
+CALIDAD_FASE_ID = 5
+PREVIUS_FASE_ID = 4
+
+for key, value in {
+    "DB_SERVER": "test",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_NAME": "test",
+    "CALIDAD_FASE_ID": str(CALIDAD_FASE_ID),
+    "PREVIUS_FASE_ID": str(PREVIUS_FASE_ID),
+    "tracker_url": "https://tracker.example/orden/{no_order}",
+    "STARTUP_WARMUP": "false",
+}.items():
+    os.environ.setdefault(key, value)
+
+odbc_standin.install()
+
+
+@pytest.fixture
+def seeded():
+    """BD local nueva por prueba: 30 registros en calidad y 15 en fase previa."""
+    odbc_standin.configure()
+    return odbc_standin.seed(
+        rows=30,
+        comments_per_chip=2,
+        calidad_fase_id=CALIDAD_FASE_ID,
+        previus_fase_id=PREVIUS_FASE_ID,
+    )
@@ -0,0 +1,178 @@
+import asyncio
+import gc
+import threading
+
+import pytest
+
+from app.core import admission as admission_module
+from app.core.admission import (
+    READ,
+    STREAM,
+    WRITE,
+    AdmissionController,
+    admission,
+)
+from app.core.config import Settings
+from app.errors.errors import ServiceUnavailableError
+from app.modules.calidad.calidad_service import AsyncCalidadService
+
+
+def controller(**kwargs):
+    options = dict(limit=3, read_queue=5, write_queue=5, write_reserved=1, max_wait=0.2)
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+async def queued(ctrl, lane):
+    """Tarea que espera cupo en `lane` (ya encolada al volver)."""
+    task = asyncio.create_task(ctrl.acquire(lane))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_las_lecturas_no_ocupan_los_cupos_reservados():
+    async def scenario():
+        ctrl = controller()
+        await ctrl.acquire(READ)
+        await ctrl.acquire(READ)
+        waiting = await queued(ctrl, READ)
+        assert not waiting.done()
+
+        await ctrl.acquire(WRITE)
+        assert ctrl.stats()["active"] == {READ: 2, WRITE: 1, STREAM: 0, "background": 0}
+        waiting.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_al_liberar_pasan_primero_las_escrituras():
+    async def scenario():
+        ctrl = controller(limit=2, write_reserved=0)
+        await ctrl.acquire(READ)
+        await ctrl.acquire(WRITE)
+        read = await queued(ctrl, READ)
+        write = await queued(ctrl, WRITE)
+
+        ctrl.release(READ)
+        await asyncio.wait_for(write, 1)
+        assert not read.done()
+        assert ctrl.stats()["active"][WRITE] == 2
+        read.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_cola_llena_o_espera_agotada_responden_503():
+    async def scenario():
+        ctrl = controller(limit=1, write_reserved=0, read_queue=1)
+        await ctrl.acquire(READ)
+        waiting = await queued(ctrl, READ)
+
+        with pytest.raises(ServiceUnavailableError):
+            await ctrl.acquire(READ)
+        with pytest.raises(ServiceUnavailableError) as timeout:
+            await waiting
+        assert timeout.value.retry_after >= 1
+        assert ctrl.stats()["queued"][READ] == 0
+
+    asyncio.run(scenario())
+
+
+def test_los_streams_tienen_tope_propio_dentro_de_las_lecturas():
+    async def scenario():
+        ctrl = controller(limit=4, write_reserved=1, stream_limit=1, stream_queue=2)
+        await ctrl.acquire(STREAM)
+        second = await queued(ctrl, STREAM)
+        assert not second.done()
+
+        # Las lecturas siguen entrando hasta completar los cupos de lectura
+        await ctrl.acquire(READ)
+        await ctrl.acquire(READ)
+        blocked = await queued(ctrl, READ)
+        assert not blocked.done()
+
+        # Un cupo libre va a la lectura en espera antes que al stream
+        ctrl.release(STREAM)
+        await asyncio.wait_for(blocked, 1)
+        assert not second.done()
+        assert ctrl.stats()["active"][STREAM] == 0
+        second.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_el_carril_de_fondo_es_reentrante_y_acotado():
+    ctrl = controller(background_limit=1)
+    with ctrl.background():
+        with ctrl.background():
+            assert ctrl.stats()["active"]["background"] == 1
+
+        # Otro hilo sin cupo espera y, con plazo agotado, recibe 503
+        outcome = []
+
+        def other():
+            token = admission_module.deadline._current.set(
+                admission_module.deadline.RequestDeadline(0.05)
+            )
+            try:
+                with ctrl.background():
+                    outcome.append("ran")
+            except ServiceUnavailableError:
+                outcome.append("rejected")
+            finally:
+                admission_module.deadline._current.reset(token)
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join(2)
+        assert outcome == ["rejected"]
+    assert ctrl.stats()["active"]["background"] == 0
+
+
+def test_con_cupo_de_peticion_no_toma_el_de_fondo_salvo_detached():
+    async def scenario():
+        ctrl = controller(background_limit=1)
+        async with ctrl.slot(READ):
+            with ctrl.background():
+                assert ctrl.stats()["active"]["background"] == 0
+            with ctrl.background(detached=True):
+                assert ctrl.stats()["active"]["background"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_la_exportacion_retiene_el_cupo_hasta_terminar(seeded):
+    async def scenario():
+        service = AsyncCalidadService()
+        chunks = await service.exportar_en_fase()
+        assert admission.stats()["active"][STREAM] == 1
+
+        body = b"".join([chunk async for chunk in chunks])
+        assert body.startswith(b"[") and body.endswith(b"]")
+        assert admission.stats()["active"][STREAM] == 0
+
+        # El cliente se va a mitad de la respuesta: el cupo se libera igual
+        chunks = await service.exportar_en_fase()
+        await chunks.__anext__()
+        await chunks.aclose()
+        assert admission.stats()["active"][STREAM] == 0
+
+        # ... o antes de empezar: al descartar la respuesta
+        chunks = await service.exportar_en_fase()
+        del chunks
+        gc.collect()
+        await asyncio.sleep(0.05)
+        assert admission.stats()["active"][STREAM] == 0
+
+    asyncio.run(scenario())
+
+
+def test_el_pool_y_el_executor_alcanzan_para_la_admision():
+    settings = Settings(DB_ADMISSION_LIMIT=6, DB_ADMISSION_BACKGROUND_LIMIT=2)
+    # 6 admitidas + 2 de fondo + ping de /health/ready (DB_POOL_HEADROOM=2)
+    assert settings.DB_POOL_MAX_SIZE == settings.DB_EXECUTOR_WORKERS == 10
+
+    with pytest.raises(ValueError, match="DB_EXECUTOR_WORKERS=8"):
+        Settings(DB_ADMISSION_LIMIT=6, DB_EXECUTOR_WORKERS=8)
+    assert Settings(DB_ADMISSION_LIMIT=6, DB_POOL_MAX_SIZE=20).DB_POOL_MAX_SIZE == 20
+    assert Settings(DB_ADMISSION_LIMIT=0).DB_POOL_MAX_SIZE == 10
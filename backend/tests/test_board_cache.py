@@ -0,0 +1,170 @@
+import time
+
+from app.core import read_pin
+from app.modules.calidad.calidad_cache import CalidadBoardCache
+from app.modules.calidad.calidad_model import CalidadModel
+
+BOARD = 5
+PREVIA = 4
+
+
+def calidad(id: int, fase: int = BOARD, status: str = "PENDIENTE") -> CalidadModel:
+    values = dict.fromkeys(CalidadModel.model_fields)
+    values.update(id=id, id_chip=100000 + id, id_hd=id, id_fase=fase, status=status)
+    return CalidadModel(**values)
+
+
+class InlineExecutor:
+    """Ejecuta el refresco en segundo plano en el acto."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        fn(*args)
+
+
+class Loader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return list(self.rows)
+
+
+def make_cache(rows, ttl=60.0, stale_ttl=60.0, max_rows=1000, **kwargs):
+    loader = Loader(rows)
+    executor = InlineExecutor()
+    cache = CalidadBoardCache(
+        loader=loader,
+        board_fase_id=BOARD,
+        ttl=ttl,
+        stale_ttl=stale_ttl,
+        max_rows=max_rows,
+        executor=executor,
+        **kwargs,
+    )
+    return cache, loader, executor
+
+
+def test_dentro_del_ttl_no_recarga():
+    cache, loader, _ = make_cache([calidad(1), calidad(2, PREVIA)])
+
+    first = cache.get()
+    second = cache.get()
+
+    assert first is second
+    assert loader.calls == 1
+    assert [row.id for row in first.board] == [1]
+    assert set(first.by_id) == {1, 2}
+
+
+def test_vencida_sirve_la_foto_y_refresca_en_segundo_plano():
+    cache, loader, executor = make_cache([calidad(1)], ttl=0.01, stale_ttl=60)
+    old = cache.get()
+    time.sleep(0.02)
+
+    served = cache.get()
+
+    assert served is old
+    assert executor.submitted == 1
+    assert loader.calls == 2
+    assert cache.get() is not old
+
+
+def test_fuera_del_stale_recarga_de_forma_sincrona():
+    cache, loader, executor = make_cache([calidad(1)], ttl=0.01, stale_ttl=0.01)
+    old = cache.get()
+    time.sleep(0.03)
+
+    assert cache.get() is not old
+    assert loader.calls == 2
+    assert executor.submitted == 0
+
+
+def test_patch_many_reemplaza_agrega_y_quita_filas():
+    cache, loader, _ = make_cache([calidad(1), calidad(2), calidad(3)])
+    cache.get()
+
+    cache.patch_many(
+        [
+            (calidad(1, status="INICIADA"), True),
+            (calidad(2), False),
+            (calidad(4), True),
+        ]
+    )
+
+    snapshot = cache.get()
+    assert loader.calls == 1
+    assert snapshot.by_id[1].status == "INICIADA"
+    assert 2 not in snapshot.by_id
+    assert [row.id for row in snapshot.by_hd[4]] == [4]
+    assert sorted(row.id for row in snapshot.board) == [1, 3, 4]
+
+
+def test_una_escritura_durante_la_carga_descarta_esa_carga():
+    rows = [calidad(1)]
+    cache, _, _ = make_cache(rows)
+
+    def loader():
+        # Llega una escritura mientras la consulta está en curso
+        cache.patch_many([(calidad(1, status="INICIADA"), True)])
+        return list(rows)
+
+    cache._loader = loader
+    loaded = cache.get()
+
+    assert loaded.by_id[1].status == "PENDIENTE"
+    assert not cache.servable()
+
+
+def test_recarga_si_la_foto_es_anterior_a_la_escritura_del_cliente():
+    # La escritura pudo ocurrir en otro worker: esta foto no la tiene
+    cache, loader, _ = make_cache([calidad(1)])
+    cache.get()
+    loader.rows = [calidad(1, status="INICIADA")]
+
+    pin = read_pin.ReadPin()
+    pin.mark_write()
+    token = read_pin._current.set(pin)
+    try:
+        assert not cache.servable()
+        assert cache.get().by_id[1].status == "INICIADA"
+        assert cache.servable()
+        cache.get()
+    finally:
+        read_pin._current.reset(token)
+
+    assert loader.calls == 2
+    cache.get()
+    assert loader.calls == 2
+
+
+def test_invalidate_obliga_a_recargar():
+    cache, loader, _ = make_cache([calidad(1)])
+    cache.get()
+
+    cache.invalidate()
+
+    assert not cache.servable()
+    cache.get()
+    assert loader.calls == 2
+
+
+def test_no_guarda_tableros_mayores_a_max_rows():
+    cache, loader, _ = make_cache([calidad(i) for i in range(1, 6)], max_rows=3)
+
+    assert len(cache.get().board) == 5
+    cache.get()
+
+    assert loader.calls == 2
+    assert not cache.servable()
+
+
+def test_ttl_cero_desactiva_el_cache():
+    cache, _, _ = make_cache([calidad(1)], ttl=0)
+
+    assert not cache.enabled
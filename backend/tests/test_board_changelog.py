@@ -0,0 +1,129 @@
+from test_board_cache import BOARD, PREVIA, calidad, make_cache
+
+
+def test_sin_token_responde_el_tablero_completo():
+    cache, _, _ = make_cache([calidad(1), calidad(2), calidad(3, PREVIA)])
+
+    version, completo, rows, removed = cache.changes_since(None)
+
+    assert completo
+    assert sorted(row.id for row in rows) == [1, 2]
+    assert removed == []
+    assert version == cache.version
+
+
+def test_delta_con_filas_cambiadas_y_eliminadas():
+    cache, _, _ = make_cache([calidad(1), calidad(2), calidad(3)])
+    since, *_ = cache.changes_since(None)
+
+    cache.patch_many(
+        [
+            (calidad(1, status="INICIADA"), True),
+            # Pasa a la fase previa: sale del tablero
+            (calidad(2, PREVIA), True),
+            (calidad(3), False),
+        ]
+    )
+    version, completo, rows, removed = cache.changes_since(since)
+
+    assert not completo
+    assert version == since + 1
+    assert [(row.id, row.status) for row in rows] == [(1, "INICIADA")]
+    assert removed == [2, 3]
+
+
+def test_un_parche_sin_cambios_no_avanza_la_version():
+    cache, _, _ = make_cache([calidad(1)])
+    since, *_ = cache.changes_since(None)
+
+    cache.patch_many([(calidad(1), True), (calidad(9, PREVIA), True)])
+
+    assert cache.version == since
+    assert cache.changes_since(since)[1:] == (False, [], [])
+
+
+def test_una_recarga_anota_lo_que_cambio_en_la_bd():
+    cache, loader, _ = make_cache([calidad(1), calidad(2)])
+    since, *_ = cache.changes_since(None)
+
+    loader.rows = [calidad(1), calidad(3)]
+    cache.invalidate()
+    _, completo, rows, removed = cache.changes_since(since)
+
+    assert not completo
+    assert [row.id for row in rows] == [3]
+    assert removed == [2]
+
+
+def test_token_fuera_de_la_bitacora_responde_completo():
+    cache, _, _ = make_cache([calidad(i) for i in range(1, 6)], max_changes=2)
+    since, *_ = cache.changes_since(None)
+
+    cache.patch_many([(calidad(1, status="INICIADA"), True)])
+    cache.patch_many([(calidad(2, status="INICIADA"), True)])
+    cache.patch_many([(calidad(3, status="INICIADA"), True)])
+
+    _, completo, rows, _ = cache.changes_since(since)
+    assert completo
+    assert len(rows) == 5
+    # Las versiones que siguen en la bitácora aún dan delta
+    _, completo, rows, _ = cache.changes_since(cache.version - 1)
+    assert not completo
+    assert [row.id for row in rows] == [3]
+
+
+def test_token_de_una_version_futura_responde_completo():
+    cache, _, _ = make_cache([calidad(1)])
+    version, *_ = cache.changes_since(None)
+
+    assert cache.changes_since(version + 10)[1]
+
+
+def test_avisa_a_los_listeners_con_la_nueva_version():
+    cache, _, _ = make_cache([calidad(1)])
+    cache.get()
+    seen = []
+    cache.add_listener(seen.append)
+
+    cache.patch_many([(calidad(1, status="INICIADA"), True)])
+    cache.remove_listener(seen.append)
+    cache.patch_many([(calidad(1, status="TERMINADO"), True)])
+
+    assert seen == [cache.version - 1]
+    assert all(row.id_fase == BOARD for row in cache.get().board)
+
+
+def test_la_huella_depende_solo_del_contenido():
+    # Dos workers con el mismo tablero, leído en distinto orden
+    a, _, _ = make_cache([calidad(1), calidad(2)])
+    b, _, _ = make_cache([calidad(2), calidad(1)])
+
+    token = a.token(*a.get_versioned())
+
+    assert token == b.token(*b.get_versioned())
+    assert b.changes_since_token(token) == (token, False, [], [])
+
+
+def test_delta_desde_la_huella_de_otro_worker():
+    a, _, _ = make_cache([calidad(1), calidad(2)])
+    b, _, _ = make_cache([calidad(1), calidad(2)])
+    token, *_ = a.changes_since_token(None)
+    b.changes_since_token(None)
+
+    b.patch_many([(calidad(2, status="INICIADA"), True)])
+    _, completo, rows, _ = b.changes_since_token(token)
+
+    assert not completo
+    assert [(row.id, row.status) for row in rows] == [(2, "INICIADA")]
+
+
+def test_huella_de_un_estado_desconocido_responde_completo():
+    a, _, _ = make_cache([calidad(1), calidad(2)])
+    b, _, _ = make_cache([calidad(1), calidad(3)])
+    token, *_ = a.changes_since_token(None)
+
+    new_token, completo, rows, _ = b.changes_since_token(token)
+
+    assert completo
+    assert new_token != token
+    assert [row.id for row in rows] == [1, 3]
@@ -0,0 +1,54 @@
+import asyncio
+
+from app.core.compression import CompressionMiddleware
+
+
+def respond(status, headers, body=b""):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def call(app, accept_encoding="gzip"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=10)(scope, None, send))
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+
+def test_compressed_200_suffixes_etag_and_varies_on_encoding():
+    app = respond(
+        200,
+        [(b"content-type", b"application/json"), (b"etag", b'"abc"'), (b"vary", b"Accept")],
+        b"x" * 100,
+    )
+    status, headers = call(app)
+    assert status == 200
+    assert headers[b"etag"] == b'"abc-gzip"'
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept, Accept-Encoding"
+
+
+def test_304_with_suffixed_etag_varies_on_encoding():
+    app = respond(304, [(b"etag", b'"abc"'), (b"vary", b"Accept")])
+    status, headers = call(app)
+    assert status == 304
+    assert headers[b"etag"] == b'"abc-gzip"'
+    assert headers[b"vary"] == b"Accept, Accept-Encoding"
+
+
+def test_304_without_vary_gets_one():
+    status, headers = call(respond(304, [(b"etag", b'"abc"')]))
+    assert headers[b"vary"] == b"Accept-Encoding"
+
+
+def test_identity_leaves_etag_alone():
+    status, headers = call(respond(304, [(b"etag", b'"abc"')]), accept_encoding="identity")
+    assert headers[b"etag"] == b'"abc"'
+    assert b"vary" not in headers
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks import odbc_standin
+from app.core import deadline
+from app.core.db import DB
+from app.core.queries import in_list_size, pad_in_list
+from app.errors.errors import QueryTimeoutError
+from app.modules.calidad import calidad_queries  # noqa: F401 (registra las sentencias)
+
+
+def _run_and_disconnect(fn, after: float = 0.05):
+    """Corre `fn` en una petición con plazo y la cancela a los `after` segundos."""
+    request = deadline.RequestDeadline(10)
+    outcome = {}
+
+    def target():
+        deadline._current.set(request)
+        try:
+            outcome["result"] = fn()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    time.sleep(after)
+    request.cancel("Cliente desconectado")
+    thread.join(5)
+    return outcome
+
+
+def test_la_desconexion_cancela_una_lectura(seeded):
+    odbc_standin.configure(latency=0.5)
+    start = time.monotonic()
+
+    outcome = _run_and_disconnect(
+        lambda: DB.select("SELECT id FROM v_validad_hyp", name="test.lectura", readonly=True)
+    )
+
+    assert isinstance(outcome.get("error"), QueryTimeoutError)
+    assert time.monotonic() - start < 0.4
+
+
+def test_la_desconexion_no_corta_una_escritura_en_curso(seeded):
+    id = next(iter(seeded["pendientes"]))
+    odbc_standin.configure(latency=0.3)
+
+    outcome = _run_and_disconnect(
+        lambda: DB.run(
+            "calidad.iniciar",
+            ("tester", "Calidad iniciada.", None, *pad_in_list([id])),
+            (in_list_size(1),),
+            raw=True,
+        )
+    )
+
+    assert "error" not in outcome
+    (_, aplicados), _ = outcome["result"]
+    assert [row[0] for row in aplicados] == [id]
+
+
+def test_tras_la_desconexion_no_se_envian_mas_sentencias(seeded):
+    request = deadline.RequestDeadline(10)
+    request.cancel("Cliente desconectado")
+    token = deadline._current.set(request)
+    try:
+        with pytest.raises(QueryTimeoutError):
+            DB.select("SELECT id FROM v_validad_hyp", name="test.lectura")
+    finally:
+        deadline._current.reset(token)
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor, keyset_clause, keyset_order
+from app.errors.errors import ValidationError
+from app.modules.calidad.calidad_service import CalidadService
+
+
+def test_el_cursor_conserva_tipos():
+    fecha = datetime(2026, 1, 1, 8, 30, 15)
+    token = encode_cursor(sort="-fecha", v=fecha, id=7)
+    assert "=" not in token
+    assert decode_cursor(token) == {"sort": "-fecha", "v": fecha, "id": 7}
+
+
+@pytest.mark.parametrize("token", ["basura", encode_cursor()[:-1] + "[", "WzFd"])
+def test_cursor_invalido(token):
+    with pytest.raises(ValidationError):
+        decode_cursor(token)
+
+
+def test_orden_y_condicion_del_keyset():
+    assert keyset_order("id", True) == "id DESC"
+    assert keyset_order("status", False) == (
+        "CASE WHEN status IS NULL THEN 1 ELSE 0 END, status ASC, id ASC"
+    )
+    assert keyset_clause("id", False, None, 9) == ("id > ?", (9,))
+    assert keyset_clause("status", True, None, 9) == ("(status IS NULL AND id < ?)", (9,))
+    sql, params = keyset_clause("status", False, "A", 9)
+    assert sql == "(status > ? OR (status = ? AND id > ?) OR status IS NULL)"
+    assert params == ("A", "A", 9)
+
+
+def _esperado(filas, campo: str, descendente: bool):
+    """Orden de `keyset_order`: NULL al final, empates por id."""
+    con_valor = [f for f in filas if getattr(f, campo) is not None]
+    nulos = [f for f in filas if getattr(f, campo) is None]
+    con_valor.sort(key=lambda f: (getattr(f, campo), f.id), reverse=descendente)
+    nulos.sort(key=lambda f: f.id, reverse=descendente)
+    return [f.id for f in con_valor + nulos]
+
+
+@pytest.mark.parametrize(
+    "sort", ["id", "-id", "status", "-status", "fecha_hora_ini_oper", "-fecha_hora_ini_oper"]
+)
+def test_recorrer_todas_las_paginas(seeded, sort):
+    service = CalidadService()
+    todas = service.buscar_en_fase(limit=100)["data"]
+    campo = sort.lstrip("-")
+
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        pagina = service.buscar_en_fase(sort=sort, limit=4, cursor=cursor)
+        assert pagina["total"] == len(todas)
+        assert len(pagina["data"]) <= 4
+        vistos += [fila.id for fila in pagina["data"]]
+        paginas += 1
+        cursor = pagina["next_cursor"]
+        assert pagina["has_more"] == (cursor is not None)
+        if cursor is None:
+            break
+
+    assert vistos == _esperado(todas, campo, sort.startswith("-"))
+    assert paginas == -(-len(todas) // 4)
+
+
+def test_filtros_y_paginas(seeded):
+    service = CalidadService()
+    primera = service.buscar_en_fase({"status": "INICIADA"}, limit=3)
+    segunda = service.buscar_en_fase({"status": "INICIADA"}, limit=3, cursor=primera["next_cursor"])
+
+    assert primera["data"] and segunda["data"]
+    ids = [f.id for f in primera["data"] + segunda["data"]]
+    assert all(f.status == "INICIADA" for f in primera["data"] + segunda["data"])
+    assert ids == sorted(set(ids))
+
+
+def test_el_cursor_de_otro_orden_se_rechaza(seeded):
+    service = CalidadService()
+    cursor = service.buscar_en_fase(sort="status", limit=2)["next_cursor"]
+    with pytest.raises(ValidationError):
+        service.buscar_en_fase(sort="-status", limit=2, cursor=cursor)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks import odbc_standin
+from app.core.db import ConnectionPool, PoolTimeoutError
+
+
+def _pool(seeded, **kwargs):
+    return ConnectionPool(odbc_standin.connect, **kwargs)
+
+
+def test_reusa_la_conexion_devuelta(seeded):
+    pool = _pool(seeded, max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert pool.stats()["created"] == 1
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_no_supera_max_size_y_agota_el_timeout(seeded):
+    pool = _pool(seeded, max_size=2, timeout=0.1)
+    a = pool.acquire()
+    b = pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    assert pool.stats()["size"] == 2
+    assert pool.stats()["timeouts"] == 1
+    pool.release(a)
+    pool.release(b)
+
+
+def test_el_timeout_de_la_llamada_acota_la_espera(seeded):
+    pool = _pool(seeded, max_size=1, timeout=10)
+    held = pool.acquire()
+    start = time.monotonic()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0.05)
+
+    assert time.monotonic() - start < 1
+    pool.release(held)
+
+
+def test_entrega_la_conexion_liberada_a_quien_espera(seeded):
+    pool = _pool(seeded, max_size=1, timeout=2)
+    held = pool.acquire()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(held)
+    waiter.join(1)
+
+    assert got and got[0] is held
+    assert pool.stats()["created"] == 1
+
+
+def test_descarta_la_conexion_tras_un_error_de_conexion(seeded):
+    pool = _pool(seeded, max_size=1)
+
+    with pytest.raises(odbc_standin.OperationalError):
+        with pool.connection():
+            raise odbc_standin.OperationalError("08S01", "enlace caído")
+
+    stats = pool.stats()
+    assert stats["size"] == 0
+    assert stats["closed"] == 1
+
+
+def test_recicla_conexiones_que_superan_max_lifetime(seeded):
+    pool = _pool(seeded, max_size=1, max_lifetime=0.01)
+    with pool.connection() as first:
+        pass
+    time.sleep(0.02)
+    with pool.connection() as second:
+        pass
+
+    assert first is not second
+    assert pool.stats()["recycled"] >= 1
+
+
+def test_valida_con_ping_las_conexiones_inactivas(seeded):
+    pool = _pool(seeded, max_size=1, ping_interval=0)
+    with pool.connection() as first:
+        pass
+    first.close()  # el ping falla: se abre otra
+
+    with pool.connection() as second:
+        pass
+
+    assert second is not first
+    assert pool.stats()["ping_failures"] == 1
+
+
+def test_fill_abre_hasta_min_size(seeded):
+    pool = _pool(seeded, min_size=3, max_size=5)
+    pool.fill()
+
+    assert pool.stats()["idle"] == 3
+    pool.close()
+    assert pool.stats()["size"] == 0
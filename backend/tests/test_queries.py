@@ -0,0 +1,131 @@
+import pytest
+
+from app.core.db import DB
+from app.core.queries import (
+    INT,
+    VARCHAR,
+    QueryCatalog,
+    in_list_size,
+    pad_in_list,
+)
+from app.modules.calidad import calidad_queries
+from app.errors.errors import ValidationError
+from app.modules.calidad.calidad_model import CrearComentario
+from app.modules.calidad.calidad_schema import CALIDAD_TYPES
+from app.modules.calidad.calidad_service import CalidadService
+
+
+def _catalogo():
+    catalog = QueryCatalog()
+    builds = []
+
+    @catalog.statement("prueba.item", readonly=True)
+    def item(tabla: str):
+        builds.append(tabla)
+        return f"SELECT id FROM {tabla} WHERE id = ?", [INT]
+
+    return catalog, builds
+
+
+@pytest.mark.parametrize(
+    "count, size", [(0, 1), (1, 1), (2, 2), (3, 4), (5, 8), (1000, 1024), (1500, 1500)]
+)
+def test_escalones_de_listas_in(count, size):
+    assert in_list_size(count) == size
+
+
+def test_pad_in_list_rellena_con_null():
+    assert pad_in_list([1, 2, 3]) == [1, 2, 3, None]
+    assert pad_in_list([1, 2]) == [1, 2]
+
+
+def test_cada_combinacion_de_partes_se_arma_una_vez():
+    catalog, builds = _catalogo()
+    statement = catalog.get("prueba.item")
+
+    first = statement.render("v_validad_hyp")
+    again = statement.render("v_validad_hyp")
+    other = statement.render("otra")
+
+    assert first is again
+    assert builds == ["v_validad_hyp", "otra"]
+    assert first.variant != other.variant
+    assert first.input_sizes == [INT.input_size]
+
+
+def test_marcadores_y_tipos_deben_coincidir():
+    catalog = QueryCatalog()
+
+    @catalog.statement("prueba.mal")
+    def mal():
+        return "SELECT ? , ?", [INT]
+
+    with pytest.raises(ValueError, match="2 marcadores y 1 tipos"):
+        catalog.get("prueba.mal").render()
+
+
+def test_check_valida_la_cantidad_de_parametros():
+    catalog, _ = _catalogo()
+    rendered = catalog.get("prueba.item").render("t")
+    with pytest.raises(ValueError):
+        rendered.check((1, 2))
+    rendered.check((1,))
+
+
+def test_registro_duplicado_o_tipo_desconocido():
+    catalog, _ = _catalogo()
+    with pytest.raises(ValueError):
+        catalog.statement("prueba.item")(lambda: ("SELECT 1", []))
+    with pytest.raises(ValueError):
+        catalog.statement("prueba.otro", kind="merge")
+    with pytest.raises(KeyError):
+        catalog.get("prueba.nada")
+
+
+def test_los_filtros_usan_el_tipo_de_su_columna():
+    rendered = calidad_queries.catalog.get("calidad.buscar").render(
+        None, ("status", "id_tecnico"), "no_orden", False, "value"
+    )
+    # fase, status, id_tecnico | TOP, fase, status, id_tecnico, keyset
+    assert rendered.types[:3] == (INT, CALIDAD_TYPES["status"], INT)
+    assert CALIDAD_TYPES["status"] == VARCHAR(20)
+    assert rendered.types[-3:] == (CALIDAD_TYPES["no_orden"],) * 2 + (INT,)
+
+
+def _llamadas(*names):
+    return sum(
+        row["calls"] for row in calidad_queries.catalog.stats() if row["name"] in names
+    )
+
+
+def test_un_texto_largo_no_se_rechaza_antes_de_la_bd(seeded):
+    before = _llamadas("calidad.buscar", "calidad.exportar")
+    resultado = CalidadService().buscar_en_fase({"status": "x" * 5000}, limit=5)
+    assert resultado["total"] == 0
+    export = b"".join(CalidadService().exportar_en_fase({"status": "x" * 5000}))
+    assert export == b"[]"
+    # Más largo que la columna: no puede coincidir, no se consulta
+    assert _llamadas("calidad.buscar", "calidad.exportar") == before
+
+
+def test_una_escritura_mas_larga_que_su_columna_responde_422(seeded):
+    data = CrearComentario(
+        id_chip=100001, status="INICIADA", cve_usuario="x" * 51, comentario="hola"
+    )
+    with pytest.raises(ValidationError) as error:
+        CalidadService().agregar_comentario(data)
+    assert "50 caracteres" in error.value.detail
+
+
+def test_db_run_ejecuta_y_registra_estadisticas(seeded):
+    id = next(iter(seeded["calidad_ids"]))
+    rendered = calidad_queries.catalog.get("calidad.item").render(None)
+    calls = rendered.stats.calls
+
+    columns, rows = DB.run("calidad.item", (id,), (None,), raw=True)
+
+    assert rows and rows[0][columns.index("id")] == id
+    assert rendered.stats.calls == calls + 1
+    assert rendered.stats.rows >= 1
+    names = {row["name"] for row in calidad_queries.catalog.stats()}
+    assert "calidad.item" in names
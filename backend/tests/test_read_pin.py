@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import read_pin
+from app.core.db import _al_escribir, _routing
+
+
+@pytest.fixture(autouse=True)
+def sin_escrituras_previas():
+    _routing.last_write = float("-inf")
+    yield
+    _routing.last_write = float("-inf")
+
+
+def call(app, headers=()):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": list(headers)}
+    asyncio.run(read_pin.ReadPinMiddleware(app)(scope, None, send))
+    return dict(sent[0]["headers"])
+
+
+def route(write: bool, seen: list = None):
+    async def app(scope, receive, send):
+        if seen is not None:
+            seen.append(_routing.use_replica())
+        if write:
+            _al_escribir()
+            if seen is not None:
+                seen.append(_routing.use_replica())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return app
+
+
+def test_la_escritura_fija_la_cookie():
+    headers = call(route(write=True))
+    cookie = headers[b"set-cookie"].decode()
+    assert cookie.startswith("db_pin=")
+    assert "Max-Age=5" in cookie and "HttpOnly" in cookie
+    assert float(headers[b"x-db-pin"]) > time.time()
+
+
+def test_una_lectura_no_fija_la_cookie():
+    assert b"set-cookie" not in call(route(write=False))
+
+
+def test_el_que_escribe_lee_de_la_primaria_y_los_demas_de_la_replica():
+    seen = []
+    call(route(write=True, seen=seen))
+    # La escritura de otro cliente del proceso no afecta a este
+    call(route(write=False, seen=seen))
+    assert seen == [True, False, True]
+
+
+def test_la_cookie_vigente_fija_la_primaria():
+    until = f"{time.time() + 3:.3f}"
+    seen = []
+    call(route(write=False, seen=seen), [(b"cookie", f"a=1; db_pin={until}".encode())])
+    call(route(write=False, seen=seen), [(b"x-db-pin", until.encode())])
+    assert seen == [False, False]
+
+
+def test_cookie_vencida_o_invalida_usa_la_replica():
+    seen = []
+    call(route(write=False, seen=seen), [(b"cookie", f"db_pin={time.time() - 1}".encode())])
+    call(route(write=False, seen=seen), [(b"cookie", b"db_pin=basura")])
+    assert seen == [True, True]
+
+
+def test_el_pin_se_acota_a_db_read_pin_seconds():
+    pin = read_pin.ReadPin(read_pin._parse(str(time.time() + 3600)))
+    assert pin.until <= time.time() + 5
+
+
+def test_sin_peticion_o_compartido_se_usa_el_pin_global():
+    assert _routing.use_replica()
+    _al_escribir()
+    assert not _routing.use_replica()
+
+    token = read_pin._current.set(read_pin.ReadPin())
+    try:
+        assert _routing.use_replica()
+        with read_pin.shared():
+            assert not _routing.use_replica()
+    finally:
+        read_pin._current.reset(token)
@@ -0,0 +1,170 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks import odbc_standin
+from app.core import db as db_module
+from app.core import read_pin
+from app.core.db import DB, _SingleFlight, _routing
+from app.errors.errors import QueryTimeoutError
+
+
+class SlowCall:
+    """`execute` que tarda hasta que se libera y cuenta sus llamadas."""
+
+    def __init__(self, result="filas", error=None):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.result = result
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(2)
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return self.result
+
+
+def _concurrent(flights, call, n=4, readonly=True, params=(1,)):
+    """Lanza una llamada líder y `n - 1` que llegan mientras está en curso."""
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(flights.run("test", readonly, "SELECT ?", params, call))
+        except Exception as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    call.started.wait(2)
+    others = [threading.Thread(target=run) for _ in range(n - 1)]
+    for thread in others:
+        thread.start()
+    time.sleep(0.05)
+    call.release.set()
+    for thread in [leader, *others]:
+        thread.join(2)
+    return results, errors
+
+
+def test_lecturas_identicas_comparten_una_ejecucion():
+    call = SlowCall()
+    results, errors = _concurrent(_SingleFlight(), call)
+    assert call.calls == 1
+    assert results == ["filas"] * 4 and not errors
+
+
+def test_las_escrituras_no_se_agrupan():
+    call = SlowCall()
+    call.release.set()
+    flights = _SingleFlight()
+    for _ in range(3):
+        flights.run("test", False, "UPDATE t SET x = ?", (1,), call)
+    assert call.calls == 3
+
+
+def test_una_escritura_corta_el_grupo_en_curso():
+    flights = _SingleFlight()
+    first = SlowCall("antes")
+    leader = threading.Thread(target=lambda: flights.run("test", True, "SELECT ?", (1,), first))
+    leader.start()
+    first.started.wait(2)
+
+    flights.wrote()
+    second = SlowCall("despues")
+    second.release.set()
+    assert flights.run("test", True, "SELECT ?", (1,), second) == "despues"
+    assert second.calls == 1
+
+    first.release.set()
+    leader.join(2)
+
+
+def test_un_cliente_fijado_no_se_une_a_un_lider_de_la_replica(monkeypatch):
+    # Con réplica configurada: el líder sin pin lee de ella
+    monkeypatch.setattr(DB, "read_pool", object())
+    monkeypatch.setattr(_routing, "last_write", float("-inf"))
+    monkeypatch.setattr(_routing, "down_until", 0.0)
+    flights = _SingleFlight()
+    replica = SlowCall("replica")
+    leader = threading.Thread(target=lambda: flights.run("test", True, "SELECT ?", (1,), replica))
+    leader.start()
+    replica.started.wait(2)
+
+    # Otro cliente acaba de escribir: su pin lo manda a la primaria
+    pin = read_pin.ReadPin()
+    pin.mark_write()
+    token = read_pin._current.set(pin)
+    try:
+        primary = SlowCall("primaria")
+        primary.release.set()
+        assert flights.run("test", True, "SELECT ?", (1,), primary) == "primaria"
+        assert primary.calls == 1
+    finally:
+        read_pin._current.reset(token)
+
+    replica.release.set()
+    leader.join(2)
+    assert replica.calls == 1
+
+
+def test_el_error_del_lider_llega_a_todos():
+    call = SlowCall(error=RuntimeError("falla"))
+    results, errors = _concurrent(_SingleFlight(), call)
+    assert call.calls == 1
+    assert len(errors) == 4 and all(isinstance(e, RuntimeError) for e in errors)
+
+
+def test_el_plazo_del_lider_no_corta_a_los_demas():
+    call = SlowCall(error=QueryTimeoutError(detail="plazo del líder"))
+    results, errors = _concurrent(_SingleFlight(), call, n=3)
+    # El líder falla con su plazo; cada seguidor vuelve a ejecutar
+    assert len(errors) == 1 and isinstance(errors[0], QueryTimeoutError)
+    assert results == ["filas", "filas"]
+    assert call.calls == 3
+
+
+def test_parametros_no_hashables_o_desactivado(monkeypatch):
+    call = SlowCall()
+    call.release.set()
+    flights = _SingleFlight()
+    flights.run("test", True, "SELECT ?", ([1],), call)
+    assert call.calls == 1
+
+    monkeypatch.setattr(db_module.settings, "DB_COALESCE_READS", False)
+    call = SlowCall()
+    results, _ = _concurrent(flights, call, n=2)
+    assert results == ["filas"] * 2
+    assert call.calls == 2
+
+
+def test_db_select_readonly_va_una_sola_vez_a_la_bd(seeded):
+    odbc_standin.configure(latency=0.1)
+    before = odbc_standin.stats()["statements"]
+    results = []
+
+    def read():
+        results.append(
+            DB.select(
+                "SELECT id FROM v_validad_hyp WHERE id = ?",
+                (1,),
+                name="test.coalesce",
+                readonly=True,
+            )
+        )
+
+    threads = [threading.Thread(target=read) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join(2)
+
+    assert results == [[{"id": 1}]] * 5
+    assert odbc_standin.stats()["statements"] - before == 1
@@ -0,0 +1,77 @@
+from app.core import db as db_module
+from app.core import slow_query
+from app.core.db import DB
+from app.core.queries import INT, NVARCHAR, QueryCatalog
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+        self.description = None
+
+    def setinputsizes(self, sizes):
+        self.log.append(("sizes", sizes))
+
+    def execute(self, query, *params):
+        self.log.append(("execute", query))
+        self.description = None
+        return self
+
+    def nextset(self):
+        return None
+
+
+class FakePool:
+    """Pool de una conexión que anota lo que se ejecuta en ella."""
+
+    def __init__(self):
+        self.log = []
+        self.released = []
+
+    def acquire(self, timeout=None):
+        pool = self
+
+        class Conn:
+            timeout = 0
+
+            def cursor(self):
+                return FakeCursor(pool.log)
+
+        class Pooled:
+            conn = Conn()
+
+        return Pooled()
+
+    def release(self, pooled, discard=False, dirty=False):
+        self.released.append(discard)
+
+
+def test_el_plan_usa_el_pool_y_los_tipos_de_la_consulta_lenta(monkeypatch):
+    catalog = QueryCatalog()
+
+    @catalog.statement("prueba.lenta", readonly=True)
+    def lenta():
+        return "SELECT id FROM t WHERE id = ? AND status = ?", [INT, NVARCHAR(40)]
+
+    rendered = catalog.get("prueba.lenta").render()
+    replica = FakePool()
+    planes = []
+    monkeypatch.setattr(db_module.settings, "DB_SLOW_QUERY_PLAN", "estimated")
+    monkeypatch.setattr(slow_query, "should_capture_plan", lambda: True)
+    monkeypatch.setattr(slow_query, "log_slow", lambda *args: "e1")
+    monkeypatch.setattr(slow_query, "log_plan", lambda *args: planes.append(args))
+    # El executor corre la captura en el momento
+    monkeypatch.setattr(db_module.db_executor, "submit", lambda fn, *args: fn(*args))
+
+    timer = slow_query.QueryTimer("prueba.lenta")
+    timer.pool = replica
+    DB._registrar_lenta(timer, rendered.sql, (1, "x"), None, rendered)
+
+    assert replica.log == [
+        ("execute", "SET SHOWPLAN_XML ON"),
+        ("sizes", rendered.input_sizes),
+        ("execute", rendered.sql),
+        ("execute", "SET SHOWPLAN_XML OFF"),
+    ]
+    assert replica.released == [False]
+    assert planes == [("e1", "prueba.lenta", "estimated", [])]
@@ -0,0 +1,95 @@
+import re
+
+import pytest
+
+from benchmarks import odbc_standin
+from app.core.db import ConnectionPool
+from app.core.queries import VARCHAR, catalog
+from app.modules.calidad import calidad_queries  # noqa: F401 (registra las sentencias)
+
+
+def _statements(sql: str):
+    """Sentencias T-SQL del batch, sin espacios de sobra, en orden."""
+    return [" ".join(s.split()) for s in sql.split(";") if s.strip()]
+
+
+def _index(statements, pattern: str) -> int:
+    for i, statement in enumerate(statements):
+        if re.search(pattern, statement):
+            return i
+    raise AssertionError(f"no se encontró {pattern!r}")
+
+
+@pytest.mark.parametrize("accion", ["iniciar", "finalizar"])
+def test_el_batch_es_atomico(accion):
+    rendered = catalog.get(f"calidad.{accion}").render(4)
+    statements = _statements(rendered.sql)
+
+    # XACT_ABORT antes que nada: un corte del cliente revierte todo
+    assert statements[0] == "SET XACT_ABORT ON"
+
+    begin = _index(statements, r"BEGIN TRY BEGIN TRAN$")
+    update = _index(statements, r"^UPDATE c SET ")
+    comments = _index(statements, r"^INSERT INTO TYT_LV_TBL_CONTROL_CITAS_COM\b")
+    commit = _index(statements, r"^COMMIT$")
+    rollback = _index(statements, r"IF @@TRANCOUNT > 0 ROLLBACK$")
+    throw = _index(statements, r"^THROW$")
+    assert begin < update < comments < commit < rollback < throw
+
+    # Las filas aplicadas salen del OUTPUT del UPDATE condicional
+    assert "OUTPUT INSERTED.id, ch.idChip INTO @done" in statements[update]
+    where = calidad_queries.TRANSICIONES[accion]["where"]
+    assert statements[update].endswith(f"AND {where}")
+
+
+def test_los_ids_de_relleno_no_entran_al_batch():
+    statements = _statements(catalog.get("calidad.iniciar").render(4).sql)
+    ids = statements[_index(statements, r"^INSERT INTO @ids")]
+    assert ids.endswith("WHERE v.id IS NOT NULL")
+    assert ids.count("(?)") == 4
+
+
+@pytest.mark.parametrize("bucket", [1, 8, 64])
+def test_marcadores_y_tipos_coinciden(bucket):
+    rendered = catalog.get("calidad.finalizar").render(bucket)
+    assert rendered.sql.count("?") == len(rendered.types) == 3 + bucket
+    # usuario, comentario y status_os con el tipo de la columna que reciben
+    assert rendered.types[:3] == (VARCHAR(50), VARCHAR(), VARCHAR(20))
+    assert "DECLARE @status_os VARCHAR(20) = ?;" in rendered.sql
+
+
+def test_la_conexion_vuelve_sin_transaccion_tras_un_error(seeded):
+    pool = ConnectionPool(odbc_standin.connect, max_size=1)
+    before = odbc_standin.stats()["rollbacks"]
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("error a mitad del batch")
+
+    assert odbc_standin.stats()["rollbacks"] == before + 1
+    with pool.connection() as again:
+        pass
+    assert again is conn
+    assert pool.stats()["rollbacks"] == 1
+
+
+def test_sin_error_no_hay_rollback(seeded):
+    pool = ConnectionPool(odbc_standin.connect, max_size=1)
+    with pool.connection():
+        pass
+    assert pool.stats()["rollbacks"] == 0
+
+
+def test_se_descarta_si_no_se_puede_revertir(seeded, monkeypatch):
+    pool = ConnectionPool(odbc_standin.connect, max_size=1)
+
+    def falla(query, params):
+        raise odbc_standin.ProgrammingError("sin conexión")
+
+    with pytest.raises(ValueError):
+        with pool.connection():
+            monkeypatch.setattr(odbc_standin, "_execute", falla)
+            raise ValueError("error a mitad del batch")
+
+    assert pool.stats()["size"] == 0
+    assert pool.stats()["closed"] == 1